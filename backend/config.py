@@ -12,9 +12,84 @@ class Settings(BaseSettings):
     tts_rate: str = "+25%"  # скорость: +20% быстрее, -50% медленнее
     tts_volume: str = "+0%"  # громкость: +50% громче, -50% тише
     tts_pitch: str = "+0Hz"  # тон: +50Hz выше, -50Hz ниже
+    tts_chunk_chars: int = 600  # длинные тексты режутся по предложениям на куски до N символов
+    tts_max_parallel: int = 4  # сколько кусков синтезировать одновременно
+    job_workers: int = 2  # воркеры фоновых задач в процессе API (0 — только отдельный worker.py)
+    job_poll_interval: float = 5.0  # как часто воркер проверяет очередь, сек
+    job_lease_seconds: float = 60.0  # running-задача без heartbeat дольше — владелец умер, задача снова в очереди
+    production_time: str = "20:00"  # когда (МСК) готовить контент на завтра; пусто — планировщик выключен
+    production_news_count: int = 1  # сколько выпусков новостей озвучивать на день
+    production_weather_count: int = 1
+    production_retries: int = 3  # попыток на каждый шаг (RSS/LLM/TTS)
+    production_retry_delay: float = 300.0  # пауза между попытками, сек
+    dj_mode: str = "eager"  # eager — DJ только для уже озвученных песен; lazy — озвучка по мере приближения эфира
+    dj_lookahead_hours: float = 48  # lazy: на сколько часов вперёд озвучивать DJ
+    dj_lookahead_interval: float = 3600  # lazy: как часто проверять ближайшие эфиры, сек
+    station_sample_rate: int = 44100  # профиль станции: все файлы приводятся к нему один раз при загрузке
+    station_bitrate: str = "128k"
+    station_channels: int = 2
+    stream_variants: str = "64k"  # доп. битрейты для /stream?bitrate= (через запятую), рендерятся один раз на файл
+    loudness_target_lufs: float = -16.0  # громкость эфира (EBU R128, LUFS); 0 — не выравнивать
+    loudness_true_peak: float = -1.0  # потолок true peak после усиления, dBTP
+    loudness_max_gain_db: float = 12.0  # максимум усиления/ослабления одного файла
+    normalize_workers: int = 2  # одновременных ffmpeg при нормализации
+    normalize_interval: float = 600  # как часто искать ненормализованные файлы, сек (0 — только вручную)
+    ffmpeg_max_processes: int = 32  # общий лимит одновременных ffmpeg (эфир + нормализация)
+    stream_max_listeners: int = 500  # общий лимит подключений к /stream и /stream/timeshift
+    stream_max_per_ip: int = 5  # подключений с одного IP (0 — без лимита)
+    stream_admin_reserved: int = 5  # из общего лимита — только для превью админки (заголовок X-Admin-Key)
+    stream_admin_key: str = ""  # ключ превью; пусто — резерв никому не доступен
+    stream_queue_seconds: float = 0  # сколько ждать свободного места перед 503/429 (0 — отказ сразу)
+    stream_retry_after: int = 10  # Retry-After в ответах 503/429, сек
+    stream_buffer_seconds: float = 10  # буфер на слушателя, секунд аудио
+    stream_prebuffer_seconds: float = 5  # сколько отдать сразу при подключении (быстрый старт плеера)
+    stream_slow_policy: str = "skip"  # skip — догнать эфир; throttle — ждать слушателя; drop — отключить отставшего
+    stream_stall_timeout: float = 30  # слушатель не забирает данные столько секунд — отключаем
+    icy_metaint: int = 16000  # байт аудио между ICY-метаданными (Icy-MetaData: 1); 0 — не отдавать
+    station_name: str = "NAVO RADIO"  # icy-name в заголовках потока
+    events_keepalive: float = 20  # SSE /broadcast/events: комментарий-пинг в тишине, сек (таймауты прокси)
+    events_peer_poll: float = 5  # как часто сверять отслеживаемые даты сетки с БД (правки других процессов), сек; 0 — выкл
+    timeline_ttl: float = 300  # кэш таймлайна дня, сек: страховка от правок сетки из другого процесса (worker.py)
+    live_ring: bool = False  # uvicorn --workers N: живой эфир пишет один воркер в общий mmap-буфер, остальные читают
+    live_ring_dir: str = ""  # где лежат кольца и live.lock (по умолчанию /dev/shm/navo)
+    live_ring_seconds: float = 60  # ёмкость кольца, секунд аудио на битрейт
+    live_ring_wait: float = 10  # сколько слушатель ждёт появления кольца после старта, сек
+    relay_upstream: str = ""  # ретранслятор: URL /stream вышестоящего NAVO; без БД, медиатеки и рендера
+    relay_buffer_seconds: float = 15  # общий буфер ретранслятора на битрейт, секунд аудио
+    relay_reconnect_max: float = 30  # максимум паузы между переподключениями к апстриму, сек
+    relay_read_timeout: float = 15  # апстрим молчит столько секунд — переподключаемся
+    icecast_url: str = ""  # выход на Icecast: http://host:8000/navo.mp3 (mount); пусто — выключено
+    icecast_user: str = "source"
+    icecast_password: str = ""
+    icecast_protocol: str = "put"  # put — Icecast ≥ 2.4; source — старые Icecast/SHOUTcast-совместимые
+    icecast_public: bool = False  # Ice-Public: публиковать в каталоге (yp)
+    icecast_public_url: str = ""  # адрес для слушателей (GET /broadcast/stream-url); пусто — /stream этого backend
+    icecast_reconnect_max: float = 60  # максимум паузы между переподключениями, сек
+    icecast_send_timeout: float = 15  # Icecast не принимает данные столько секунд — переподключаемся
+    stream_mode: str = "hours"  # hours — /stream из пререндеренных часовых блоков; files — ffmpeg по файлам
+    hour_render_interval: float = 600  # как часто перепроверять ближайшие блоки, сек (0 — только по запросу)
+    render_ahead_hours: int = 6  # на сколько часов вперёд пререндеривать блоки (дальше — следующими проходами)
+    archive_days: int = 2  # сколько дней хранить отзвучавшие часовые блоки (архив для /stream/timeshift)
+    archive_max_gb: float = 8.0  # потолок uploads/hours, ГБ: сверх него удаляются самые старые дни (0 — без потолка)
+    library_scan_workers: int = 0  # процессы для чтения тегов при импорте библиотеки (0 — по числу ядер)
+    library_import_batch: int = 500  # сколько песен вставлять за один commit
+    gc_mode: str = "quarantine"  # quarantine — перенос в uploads/.quarantine; delete — удаление сразу
+    gc_batch_size: int = 2000  # сколько файлов проверять за проход
+    gc_interval: float = 3600  # пауза между проходами, сек (0 — только вручную)
+    gc_min_age_seconds: int = 3600  # свежие файлы не трогаем (загрузка ещё может быть не закоммичена)
+    gc_quarantine_days: int = 7  # через сколько дней карантин удаляется
     elevenlabs_api_key: str | None = None
     database_url: str = "sqlite:///./navo.db"
     upload_dir: str = "uploads"
+    cache_dir: str = "cache"  # служебные кэши (RSS и т.п.), переживают рестарт
+    weather_cache_ttl: int = 3 * 3600  # сколько секунд прогноз считается свежим
+    weather_cache_max_age: int = 24 * 3600  # старше — прогноз из кэша не отдаётся, только свежий из API
+    media_offload: str = ""  # "" — файлы отдаёт Python; x-accel — nginx X-Accel-Redirect; x-sendfile — Apache/lighttpd
+    media_offload_prefix: str = "/protected-media/"  # internal location в nginx, указывающий на media_offload_root
+    media_offload_root: str = ""  # корень файлов для X-Accel-Redirect (по умолчанию upload_dir)
+    rss_feed_timeout: float = 8.0  # таймаут одной RSS-ленты, сек
+    rss_deadline_seconds: float = 10.0  # общий дедлайн на опрос всех лент, сек
+    rss_cache_max_age: int = 24 * 3600  # записи ленты, не обновлявшейся дольше, в новости не идут, сек
 
     class Config:
         env_file = str(_env_path)
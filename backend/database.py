@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
 
@@ -16,3 +16,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _run_migrations():
+    """Add columns introduced after the first release if missing."""
+    for table, col, col_type in [
+        ("news", "broadcast_date", "DATE"),
+        ("weather", "broadcast_date", "DATE"),
+        ("news", "duration_seconds", "FLOAT DEFAULT 0"),
+        ("weather", "duration_seconds", "FLOAT DEFAULT 0"),
+        ("songs", "dj_duration_seconds", "FLOAT DEFAULT 0"),
+        ("media_blobs", "profile", "VARCHAR(64) DEFAULT ''"),
+        ("media_blobs", "loudness_lufs", "FLOAT"),
+        ("media_blobs", "true_peak_db", "FLOAT"),
+        ("media_blobs", "gain_db", "FLOAT DEFAULT 0"),
+        ("jobs", "owner", "VARCHAR(128) DEFAULT ''"),
+        ("jobs", "heartbeat_at", "DATETIME"),
+    ]:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
+                conn.commit()
+        except Exception:
+            pass  # column already exists
+
+
+def init_db():
+    """Create tables and apply column migrations (API и worker.py)."""
+    import models  # noqa: F401 — таблицы для create_all
+
+    Base.metadata.create_all(bind=engine)
+    _run_migrations()
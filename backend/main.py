@@ -1,16 +1,17 @@
+import asyncio
 from contextlib import asynccontextmanager
-from datetime import date
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from database import get_db
 from services.streamer_service import get_playlist_with_times, stream_broadcast, stream_broadcast_ffmpeg
 
-from database import engine, Base, get_db
+from database import get_db, init_db
 from routes import (
     admin_router,
     songs_router,
@@ -19,29 +20,76 @@ from routes import (
     podcasts_router,
     intros_router,
     broadcast_router,
+    jobs_router,
 )
 from config import settings
 from services.tts_service import list_voices
+from services.media import media_response
+from services.weather_service import start_weather_refresher, stop_weather_refresher
+from services.job_queue import start_job_workers, stop_job_workers
+from services.scheduler import start_scheduler, stop_scheduler
+from services.dj_voicing import start_dj_lookahead, stop_dj_lookahead
+from services.media_gc import start_media_gc, stop_media_gc
+from services.normalizer import start_media_normalizer, stop_media_normalizer, stream_variants
+from services.hour_blocks import (
+    start_hour_renderer, stop_hour_renderer, stream_hour_blocks, archive_block, archived_hours, load_meta,
+)
+from services.streamer_service import MOSCOW_TZ, _moscow_now
+from services.process_supervisor import at_capacity
+from services.admission import admit, admitted_stream
+from services.listener_buffer import buffered_stream
+from services.icy import icy_headers, icy_stream, schedule_title, wants_icy
+from services.timeline import day_playlist, is_compiled, playlist_ready, timeline
+from services.broadcast_events import start_broadcast_events, stop_broadcast_events
+from services.live_ring import host_lock, release_host_lock, ring_stream, start_live_ring, stop_live_ring
+from services.relay import relay_listener, start_relay, stop_relay
+from services.icecast import start_icecast_output, stop_icecast_output
 
 
-def _run_migrations():
-    """Add broadcast_date to news/weather if missing."""
-    from sqlalchemy import text
-    for table, col in [("news", "broadcast_date"), ("weather", "broadcast_date")]:
-        try:
-            with engine.connect() as conn:
-                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} DATE"))
-                conn.commit()
-        except Exception:
-            pass  # column already exists
+async def _host_singletons() -> None:
+    """Production, GC, normalizer, hour renderer, DJ lookahead, weather — один процесс на хост.
+    При uvicorn --workers N их запускает воркер, взявший background.lock; упал — берёт другой."""
+    while (fd := host_lock("background")) is None:
+        await asyncio.sleep(5.0)
+    start_weather_refresher()
+    start_scheduler()
+    start_dj_lookahead()
+    start_media_gc()
+    start_media_normalizer()
+    start_hour_renderer()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_hour_renderer()
+        await stop_media_normalizer()
+        await stop_media_gc()
+        await stop_dj_lookahead()
+        await stop_scheduler()
+        await stop_weather_refresher()
+        release_host_lock(fd)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
-    _run_migrations()
+    if settings.relay_upstream:
+        start_relay()  # ретранслятор: только живой эфир с апстрима — без БД, фоновых задач и ffmpeg
+        yield
+        await stop_relay()
+        return
+    init_db()
     Path(settings.upload_dir).mkdir(parents=True, exist_ok=True)
+    start_job_workers()
+    singletons = asyncio.create_task(_host_singletons())
+    start_broadcast_events()
+    start_live_ring()
+    start_icecast_output()
     yield
+    await stop_icecast_output()
+    await stop_live_ring()
+    await stop_broadcast_events()
+    singletons.cancel()
+    await asyncio.gather(singletons, return_exceptions=True)
+    await stop_job_workers()
 
 
 app = FastAPI(title="NAVO RADIO API", lifespan=lifespan)
@@ -61,6 +109,7 @@ app.include_router(weather_router, prefix="/api")
 app.include_router(podcasts_router, prefix="/api")
 app.include_router(intros_router, prefix="/api")
 app.include_router(broadcast_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
 
 
 @app.get("/api/tts/voices")
@@ -70,7 +119,16 @@ async def get_tts_voices():
 
 # Serve uploaded files
 uploads_path = Path(settings.upload_dir)
-if uploads_path.exists():
+if settings.media_offload:
+    @app.get("/uploads/{file_path:path}")
+    def get_upload(file_path: str, request: Request):
+        """Uploads через X-Accel-Redirect/X-Sendfile: Python проверяет путь, байты отдаёт прокси."""
+        root = uploads_path.resolve()
+        path = (root / file_path).resolve()
+        if not path.is_relative_to(root) or not path.is_file():
+            raise HTTPException(404, "File not found")
+        return media_response(request, path)
+elif uploads_path.exists():
     app.mount("/uploads", StaticFiles(directory=str(uploads_path)), name="uploads")
 
 
@@ -81,12 +139,11 @@ def root():
 
 @app.get("/stream-test")
 def stream_test(
+    request: Request,
     d: date | None = Query(None, description="Date YYYY-MM-DD"),
 ):
     """Тест: один файл. Открой /stream-test?d=2026-02-17 — если играет, проблема в мульти-стриме."""
-    from datetime import date as dt
-
-    broadcast_date = d or dt.today()
+    broadcast_date = d or _moscow_now().date()
     db = next(get_db())
     try:
         playlist = get_playlist_with_times(db, broadcast_date)
@@ -97,34 +154,129 @@ def stream_test(
     path = playlist[0][0]
     if not path.exists():
         raise HTTPException(404, f"Файл не найден: {path}")
-    return FileResponse(path, media_type="audio/mpeg")
+    return media_response(request, path)
+
+
+_STREAM_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Accept-Ranges": "none",
+}
+
+
+def _stream_variant(bitrate: int | None) -> str:
+    variant = f"{bitrate}k" if bitrate is not None else settings.station_bitrate
+    available = [settings.station_bitrate, *stream_variants()]
+    if variant not in available:
+        raise HTTPException(400, f"Доступные битрейты: {', '.join(available)}")
+    return variant
+
+
+async def _listener_response(request: Request, body, title_at, variant: str) -> StreamingResponse:
+    """Admission + per-listener buffer + ICY metadata (если клиент просил Icy-MetaData: 1).
+    title_at(seconds played) -> название для StreamTitle; variant — битрейт потока."""
+    ticket = await admit(request)
+    body = buffered_stream(body, variant=variant)
+    headers = dict(_STREAM_HEADERS)
+    if wants_icy(request):
+        body = icy_stream(body, title_at)
+        headers.update(icy_headers(variant))
+    return StreamingResponse(admitted_stream(body, ticket), media_type="audio/mpeg", headers=headers)
 
 
 @app.get("/stream")
 async def stream_audio(
+    request: Request,
     d: date | None = Query(None, description="Date YYYY-MM-DD, default today"),
     from_start: bool = Query(False, description="С начала дня (иначе — с текущего времени по Москве)"),
+    bitrate: int | None = Query(None, description="Битрейт, кбит/с (например 64 или 128); по умолчанию — профиль станции"),
 ):
-    """Stream broadcast as continuous MP3. FFmpeg subprocess — надёжный chunked encoding. Синхронизация по Москве (UTC+3)."""
+    """Stream broadcast as continuous MP3. Синхронизация по Москве (UTC+3).
+    stream_mode=hours — чтение часовых блоков; files — FFmpeg subprocess по файлам сетки.
+    live_ring — живой эфир из общего для воркеров кольцевого буфера (производится один раз на хост);
+    relay_upstream — ретрансляция /stream вышестоящего NAVO."""
     import shutil
-    from datetime import date as dt
 
-    if not shutil.which("ffmpeg"):
+    if settings.relay_upstream:
+        if d is not None or from_start:
+            raise HTTPException(400, "Ретранслятор отдаёт только живой эфир")
+        variant = _stream_variant(bitrate)
+        body, title_at = relay_listener(variant)
+        return await _listener_response(request, body, title_at, variant)
+    now = _moscow_now()
+    broadcast_date = d or now.date()  # день сетки — по Москве, как и позиция в нём
+    live = settings.live_ring and not from_start and broadcast_date == now.date()
+    hours_mode = settings.stream_mode == "hours"
+    if not live and not hours_mode and not shutil.which("ffmpeg"):
         raise HTTPException(503, "FFmpeg не установлен. Установите: https://ffmpeg.org/download.html")
-    broadcast_date = d or dt.today()
-    db = next(get_db())
-    try:
-        playlist = get_playlist_with_times(db, broadcast_date)
-    finally:
-        db.close()
+    if not live and not hours_mode and at_capacity():
+        raise HTTPException(503, "Сервер перегружен, попробуйте позже", headers={"Retry-After": "10"})
+    variant = _stream_variant(bitrate)
+    # кэш процесса — без запроса к БД на каждого слушателя; промах кэша — в потоке, не в event loop
+    if hours_mode or live:
+        ready, load = is_compiled(broadcast_date), lambda: timeline(broadcast_date)
+    else:
+        ready, load = playlist_ready(broadcast_date, variant), lambda: day_playlist(broadcast_date, variant)
+    playlist = load() if ready else await asyncio.to_thread(load)
     if not playlist:
         raise HTTPException(404, "Нет эфира на эту дату. Сгенерируйте сетку в админке.")
-    return StreamingResponse(
-        stream_broadcast_ffmpeg(playlist, sync_to_moscow=not from_start),
-        media_type="audio/mpeg",
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Accept-Ranges": "none",
-        },
+    start_sec = 0 if from_start else now.hour * 3600 + now.minute * 60 + now.second
+    if live:
+        body = ring_stream(variant)
+        start_sec = max(0, start_sec - int(settings.stream_prebuffer_seconds))  # кольцо отдаёт с предбуфером
+    elif hours_mode:
+        body = stream_hour_blocks(broadcast_date, variant, sync_to_moscow=not from_start)
+    else:
+        body = stream_broadcast_ffmpeg(
+            playlist,
+            sync_to_moscow=not from_start,
+            d=broadcast_date,
+            load_day=lambda day: day_playlist(day, variant),
+        )
+    return await _listener_response(
+        request, body, lambda played: schedule_title(broadcast_date, start_sec + played), variant,
+    )
+
+
+@app.get("/stream/timeshift")
+async def stream_timeshift(
+    request: Request,
+    at: datetime | None = Query(None, description="Момент эфира ISO 8601; без зоны — Москва"),
+    delay: int | None = Query(None, ge=0, description="Или: сколько секунд назад"),
+    bitrate: int | None = Query(None, description="Битрейт, кбит/с"),
+):
+    """Catch-up: непрерывный поток из архива часовых блоков начиная с момента at (или now - delay)."""
+    variant = _stream_variant(bitrate)
+    now = _moscow_now()
+    if at is None:
+        if delay is None:
+            raise HTTPException(400, "Укажите at или delay")
+        at = now - timedelta(seconds=delay)
+    at = at.replace(tzinfo=MOSCOW_TZ) if at.tzinfo is None else at.astimezone(MOSCOW_TZ)
+    if at > now:
+        raise HTTPException(400, "Этот момент ещё не вышел в эфир")
+    if at.date() < now.date() - timedelta(days=settings.archive_days) or load_meta(at.date(), at.hour, variant) is None:
+        raise HTTPException(404, "Этого часа нет в архиве")
+    start_sec = at.hour * 3600 + at.minute * 60 + at.second
+    body = stream_hour_blocks(at.date(), variant, start_sec=start_sec)
+    return await _listener_response(
+        request, body, lambda played: schedule_title(at.date(), start_sec + played), variant,
     )
+
+
+@app.get("/stream/archive")
+def get_stream_archive(
+    d: date = Query(..., description="Date YYYY-MM-DD"),
+    bitrate: int | None = Query(None, description="Битрейт, кбит/с"),
+):
+    """Какие часы дня есть в архиве и что в них звучало."""
+    return {"date": str(d), "hours": archived_hours(d, _stream_variant(bitrate))}
+
+
+@app.get("/stream/archive/{d}/{hour}")
+def get_stream_archive_hour(d: date, hour: int, request: Request, bitrate: int | None = Query(None)):
+    """Один отзвучавший час целиком: ETag, Range (смещения — из индекса), immutable по ?v=."""
+    found = archive_block(d, hour, _stream_variant(bitrate))
+    if found is None:
+        raise HTTPException(404, "Этого часа нет в архиве")
+    return media_response(request, found[0])
@@ -25,6 +25,7 @@ class Song(Base):
     duration_seconds = Column(Float, default=0)
     dj_text = Column(Text, default="")
     dj_audio_path = Column(String(1024), default="")
+    dj_duration_seconds = Column(Float, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -34,6 +35,7 @@ class News(Base):
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text, nullable=False)
     audio_path = Column(String(1024), default="")
+    duration_seconds = Column(Float, default=0)
     broadcast_date = Column(Date, nullable=True, index=True)  # для какого дня — фильтр по дате
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -44,6 +46,7 @@ class Weather(Base):
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text, nullable=False)
     audio_path = Column(String(1024), default="")
+    duration_seconds = Column(Float, default=0)
     broadcast_date = Column(Date, nullable=True, index=True)  # для какого дня — фильтр по дате
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -80,3 +83,39 @@ class BroadcastItem(Base):
     duration_seconds = Column(Float, default=0)
     sort_order = Column(Integer, default=0)
     metadata_json = Column(Text, default="{}")  # title, artist, etc. for display
+
+
+class Job(Base):
+    """Фоновая задача (очередь в SQLite). status: queued | running | done | failed | cancelled."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(64), nullable=False)
+    params_json = Column(Text, default="{}")
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    progress = Column(Float, default=0)  # 0..100
+    message = Column(String(512), default="")
+    result_json = Column(Text, default="")
+    error = Column(Text, default="")
+    attempts = Column(Integer, default=0)
+    cancel_requested = Column(Integer, default=0)
+    owner = Column(String(128), default="")  # host:pid процесса, выполняющего задачу
+    heartbeat_at = Column(DateTime, nullable=True)  # продлевается владельцем, пока задача running
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class MediaBlob(Base):
+    """Файл в content-addressed хранилище (uploads/media/ab/cd/<sha256>.mp3) и число ссылок на него."""
+    __tablename__ = "media_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    path = Column(String(1024), nullable=False)
+    size = Column(Integer, default=0)
+    ref_count = Column(Integer, default=0)
+    profile = Column(String(64), default="")  # профиль станции, если файл уже нормализован
+    loudness_lufs = Column(Float, nullable=True)  # интегральная громкость после нормализации
+    true_peak_db = Column(Float, nullable=True)
+    gain_db = Column(Float, default=0)  # усиление, применённое при нормализации
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -5,3 +5,4 @@ from .podcasts import router as podcasts_router
 from .intros import router as intros_router
 from .broadcast import router as broadcast_router
 from .admin import router as admin_router
+from .jobs import router as jobs_router
@@ -2,7 +2,18 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from database import get_db
-from models import Song, News, Weather, Podcast, Intro
+from config import settings
+from models import Song, News, Weather, Podcast, Intro, MediaBlob
+from services.job_queue import job_to_dict
+from services.media_gc import load_gc_state, schedule_media_gc
+from services.process_supervisor import process_stats
+from services.admission import admission_stats
+from services.listener_buffer import buffer_stats
+from services.broadcast_events import events_stats
+from services.live_ring import live_ring_stats
+from services.relay import relay_stats
+from services.icecast import icecast_stats
+from services.normalizer import pending_media, schedule_media_normalize, station_profile
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -17,3 +28,56 @@ def get_stats(db: Session = Depends(get_db)):
         "podcasts": db.query(Podcast).count(),
         "intros": db.query(Intro).count(),
     }
+
+
+@router.get("/media-gc")
+def get_media_gc_status():
+    """Состояние сборщика осиротевших файлов: курсор, последний проход, освобождено всего."""
+    return load_gc_state()
+
+
+@router.post("/media-gc")
+def run_media_gc():
+    """Поставить проход GC в очередь (если ещё не стоит)."""
+    job = schedule_media_gc()
+    return job_to_dict(job) if job else {"message": "GC уже в очереди"}
+
+
+@router.get("/media-normalize")
+def get_media_normalize_status(db: Session = Depends(get_db)):
+    """Сколько файлов ещё не приведено к профилю станции; громкость уже нормализованных."""
+    profile = station_profile()
+    col = MediaBlob.loudness_lufs
+    lufs = db.query(func.avg(col), func.min(col), func.max(col)).filter(MediaBlob.profile == profile).one()
+    return {
+        "profile": profile,
+        "pending_files": len(pending_media(db)),
+        "loudness_target_lufs": settings.loudness_target_lufs,
+        "loudness_lufs": {"avg": lufs[0], "min": lufs[1], "max": lufs[2]},
+    }
+
+
+@router.post("/media-normalize")
+def run_media_normalize():
+    """Поставить нормализацию в очередь (если есть что нормализовать и задача ещё не стоит)."""
+    job = schedule_media_normalize()
+    return job_to_dict(job) if job else {"message": "Нормализация уже в очереди или не требуется"}
+
+
+@router.get("/processes")
+def get_processes():
+    """Живые ffmpeg-процессы по назначению и счётчики запусков/убийств/отказов."""
+    return process_stats()
+
+
+@router.get("/listeners")
+def get_listeners():
+    """Слушатели /stream: занято мест, лимиты, счётчики допусков и отказов, медленные клиенты;
+    events — подписчики SSE /broadcast/events; live_ring — общий буфер живого эфира (несколько воркеров);
+    relay / icecast — ретрансляция с апстрима и выход на Icecast, если включены."""
+    stats = {**admission_stats(), **buffer_stats(), "events": events_stats(), "live_ring": live_ring_stats()}
+    if settings.relay_upstream:
+        stats["relay"] = relay_stats()
+    if settings.icecast_url:
+        stats["icecast"] = icecast_stats()
+    return stats
@@ -1,12 +1,18 @@
 import json
 from datetime import date
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+from config import settings
 from database import get_db
-from models import BroadcastItem, Song, News, Weather
+from models import BroadcastItem
 from services.broadcast_generator import generate_broadcast
-from services.broadcast_service import recalc_times, get_entity_duration, get_entity_meta
+from services.broadcast_events import subscribe
+from services.broadcast_service import recalc_times, get_entity_duration, get_entity_meta, grid_record
+from services.media import get_media_path, media_version
+from services.streamer_service import _moscow_now, collapse_silent_dj
+from services.timeline import item_at
 
 router = APIRouter(prefix="/broadcast", tags=["broadcast"])
 
@@ -27,9 +33,8 @@ def get_playlist_urls(
     sync: bool = Query(True, description="Синхронизация по Москве"),
     db: Session = Depends(get_db),
 ):
-    """Плейлист для последовательного воспроизведения на фронте. Возвращает {items, startIndex}."""
-    from datetime import datetime, timezone, timedelta
-
+    """Плейлист для последовательного воспроизведения на фронте. Возвращает {items, startIndex}.
+    start — секунда дня, как в таймлайне (по ней плеер сопоставляет now-playing)."""
     items = (
         db.query(BroadcastItem)
         .filter(
@@ -39,13 +44,17 @@ def get_playlist_urls(
         .order_by(BroadcastItem.sort_order)
         .all()
     )
+    paths = {id(it): get_media_path(db, it.entity_type, it.entity_id) for it in items}
+    silent_dj = {it.entity_id for it in items if it.entity_type == "dj" and paths[id(it)] is None}
     base = "http://localhost:8000/api"
     result = []
-    for it in items:
+    ends = []
+    for it, start_sec in collapse_silent_dj(items, silent_dj):
         rec = {
             "url": "",
             "type": it.entity_type,
             "entity_id": it.entity_id,
+            "start": start_sec,
             "title": get_entity_meta(db, it.entity_type, it.entity_id),
         }
         if it.entity_type == "song":
@@ -61,69 +70,48 @@ def get_playlist_urls(
         elif it.entity_type == "intro":
             rec["url"] = f"{base}/intros/{it.entity_id}/audio"
         if rec["url"]:
+            # ?v= — версия файла: такие ссылки кэшируются браузером как immutable
+            path = paths[id(it)]
+            if path:
+                rec["url"] += f"?v={media_version(path)}"
             result.append(rec)
+            ends.append(start_sec + int(it.duration_seconds or 0))
     start_index = 0
     if sync and result:
-        moscow_tz = timezone(timedelta(hours=3))
-        now = datetime.now(moscow_tz)
+        now = _moscow_now()
         now_sec = now.hour * 3600 + now.minute * 60 + now.second
-        for i, it in enumerate(items):
-            parts = (it.start_time or "00:00:00").split(":")
-            start_sec = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2]) if len(parts) == 3 else 0
-            end_sec = start_sec + int(it.duration_seconds or 0)
-            if start_sec <= now_sec < end_sec:
-                start_index = i
-                break
-            if now_sec < start_sec:
+        for i, rec in enumerate(result):
+            if now_sec < ends[i]:
                 start_index = i
                 break
         else:
-            start_index = len(result) - 1 if result else 0
+            start_index = len(result) - 1
     return {"date": str(d), "items": result, "startIndex": start_index}
 
 
 @router.get("/now-playing")
 def get_now_playing(
     d: date = Query(..., description="Date YYYY-MM-DD"),
-    db: Session = Depends(get_db),
 ):
-    """Текущий трек по расписанию (Москва UTC+3). Для подсветки в сетке эфира."""
-    from datetime import datetime, timezone, timedelta
-
-    items = (
-        db.query(BroadcastItem)
-        .filter(
-            BroadcastItem.broadcast_date == d,
-            BroadcastItem.entity_type != "empty",
-        )
-        .order_by(BroadcastItem.sort_order)
-        .all()
-    )
-    if not items:
+    """Текущий трек по расписанию (Москва UTC+3). Для подсветки в сетке эфира.
+    Из кэшированного таймлайна дня — без запроса к БД на каждый опрос."""
+    now = _moscow_now()
+    it = item_at(d, now.hour * 3600 + now.minute * 60 + now.second)
+    if it is None:
         return {"entityType": None, "entityId": None}
-    now = datetime.now(timezone(timedelta(hours=3)))
-    now_sec = now.hour * 3600 + now.minute * 60 + now.second
-    for it in items:
-        parts = (it.start_time or "00:00:00").split(":")
-        start_sec = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2]) if len(parts) == 3 else 0
-        end_sec = start_sec + int(it.duration_seconds or 0)
-        if start_sec <= now_sec < end_sec:
-            return {"entityType": it.entity_type, "entityId": it.entity_id}
-    return {"entityType": None, "entityId": None}
+    return {"entityType": it["type"], "entityId": it["id"], "title": it["title"]}
 
 
-def _get_entity_text(db: Session, entity_type: str, entity_id: int) -> str | None:
-    """Текст для DJ, новостей, погоды."""
-    if entity_type == "dj":
-        s = db.query(Song).filter(Song.id == entity_id).first()
-        return s.dj_text if s else None
-    if entity_type == "news":
-        n = db.query(News).filter(News.id == entity_id).first()
-        return n.text if n else None
-    if entity_type == "weather":
-        w = db.query(Weather).filter(Weather.id == entity_id).first()
-        return w.text if w else None
-    return None
+@router.get("/events")
+async def broadcast_events(
+    d: date | None = Query(None, description="Дата сетки для grid-диффов (YYYY-MM-DD)"),
+):
+    """SSE: now-playing на границах элементов и диффы сетки даты d после правок."""
+    return StreamingResponse(
+        subscribe(d),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("")
@@ -137,24 +125,7 @@ def get_broadcast(
         .order_by(BroadcastItem.sort_order)
         .all()
     )
-    result = []
-    for it in items:
-        rec = {
-            "id": it.id,
-            "entity_type": it.entity_type,
-            "entity_id": it.entity_id,
-            "start_time": it.start_time,
-            "end_time": it.end_time,
-            "duration_seconds": it.duration_seconds,
-            "sort_order": it.sort_order,
-            "metadata_json": it.metadata_json,
-        }
-        if it.entity_type in ("dj", "news", "weather"):
-            rec["text"] = _get_entity_text(db, it.entity_type, it.entity_id) or ""
-        else:
-            rec["text"] = None
-        result.append(rec)
-    return {"date": str(d), "items": result}
+    return {"date": str(d), "items": [grid_record(db, it) for it in items]}
 
 
 @router.delete("")
@@ -289,5 +260,5 @@ def move_item(
 
 @router.get("/stream-url")
 def get_stream_url():
-    """Return Icecast stream URL for frontend player."""
-    return {"url": "http://localhost:8000/stream"}  # TODO: configure Icecast URL
+    """Return the stream URL for frontend player: Icecast mount (ICECAST_PUBLIC_URL) или /stream этого backend."""
+    return {"url": settings.icecast_public_url or "http://localhost:8000/stream"}
@@ -1,29 +1,16 @@
-import uuid
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Form, Request
 from sqlalchemy.orm import Session
 from database import get_db
+from services.media import entity_media_response
 from models import Intro
-from config import settings
+from services.media_store import assign_media, release_row_media, store_bytes
 
 router = APIRouter(prefix="/intros", tags=["intros"])
 
-UPLOAD_DIR = Path(settings.upload_dir) / "intros"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @router.get("/{intro_id}/audio")
-def get_intro_audio(intro_id: int, db: Session = Depends(get_db)):
-    i = db.query(Intro).get(intro_id)
-    if not i or not i.file_path:
-        raise HTTPException(404, "Intro audio not found")
-    path = Path(i.file_path)
-    if not path.exists():
-        path = UPLOAD_DIR / Path(i.file_path).name
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_intro_audio(intro_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "intro", intro_id)
 
 
 @router.get("")
@@ -33,12 +20,8 @@ def list_intros(db: Session = Depends(get_db)):
 
 @router.post("")
 async def create_intro(title: str = Form(...), file: UploadFile = UploadFile(...), db: Session = Depends(get_db)):
-    ext = Path(file.filename or "").suffix or ".mp3"
-    if ext.lower() != ".mp3":
-        ext = ".mp3"
-    path = UPLOAD_DIR / f"{uuid.uuid4().hex}{ext}"
-    path.write_bytes(await file.read())
-    i = Intro(title=title, file_path=str(path), duration_seconds=0)
+    i = Intro(title=title, file_path="", duration_seconds=0)
+    assign_media(db, i, "file_path", store_bytes(db, await file.read()))
     db.add(i)
     db.commit()
     db.refresh(i)
@@ -50,6 +33,7 @@ def delete_intro(intro_id: int, db: Session = Depends(get_db)):
     i = db.query(Intro).get(intro_id)
     if not i:
         raise HTTPException(404, "Intro not found")
+    release_row_media(db, i)
     db.delete(i)
     db.commit()
     return {"ok": True}
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from database import get_db
+from models import Job
+from services.job_queue import enqueue_job, cancel_job, job_to_dict
+import services.jobs  # noqa: F401 — регистрирует обработчики
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+class JobCreate(BaseModel):
+    kind: str
+    params: dict = {}
+
+
+@router.get("")
+def list_jobs(
+    status: str | None = Query(None, description="queued | running | done | failed | cancelled"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    q = db.query(Job).order_by(Job.id.desc())
+    if status:
+        q = q.filter(Job.status == status)
+    return [job_to_dict(j) for j in q.limit(limit).all()]
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(Job).get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_to_dict(job)
+
+
+@router.post("")
+def create_job(data: JobCreate, db: Session = Depends(get_db)):
+    try:
+        job = enqueue_job(db, data.kind, data.params)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return job_to_dict(job)
+
+
+@router.post("/{job_id}/cancel")
+def cancel(job_id: int, db: Session = Depends(get_db)):
+    job = cancel_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_to_dict(job)
@@ -1,15 +1,14 @@
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from database import get_db
+from services.media import entity_media_response
+from services.media_store import assign_media, release_row_media
 from models import News, BroadcastItem
-from config import settings
-from pathlib import Path
-from services.news_service import fetch_news_from_rss
-from services.groq_service import generate_news_text
-from services.tts_service import text_to_speech
+from services.job_queue import enqueue_job, job_to_dict
+from services.production import generate_news_script, voice_news
+from services.tts_service import DEFAULT_VOICE
 
 router = APIRouter(prefix="/news", tags=["news"])
 
@@ -44,14 +43,8 @@ def list_news(
 
 
 @router.get("/{news_id}/audio")
-def get_news_audio(news_id: int, db: Session = Depends(get_db)):
-    n = db.query(News).get(news_id)
-    if not n or not n.audio_path:
-        raise HTTPException(404, "Audio not found")
-    path = Path(n.audio_path)
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_news_audio(news_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "news", news_id)
 
 
 @router.post("")
@@ -68,14 +61,13 @@ def create_news(data: NewsCreate, db: Session = Depends(get_db)):
 @router.post("/generate")
 async def generate_news(
     d: date | None = Query(None, description="Дата для новой записи YYYY-MM-DD"),
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
     db: Session = Depends(get_db),
 ):
-    items = await fetch_news_from_rss(limit=15)
-    if not items:
-        raise HTTPException(500, "Не удалось получить новости из RSS. Проверьте доступность источников.")
-    news_texts = [f"{x['title']}. {x['summary']}" for x in items]
+    if background:
+        return job_to_dict(enqueue_job(db, "news_generate", {"date": d}))
     try:
-        text = await generate_news_text(news_texts)
+        text = await generate_news_script(limit=15)
     except ValueError as e:
         raise HTTPException(500, str(e))
     n = News(text=text, broadcast_date=d)
@@ -93,12 +85,8 @@ async def regenerate_news(
     db: Session = Depends(get_db),
 ):
     """Перегенерировать: создаёт НОВУЮ запись на дату d, обновляет слот. Иначе — перезаписывает текущую."""
-    items = await fetch_news_from_rss(limit=10)
-    if not items:
-        raise HTTPException(500, "Не удалось получить новости из RSS. Проверьте доступность источников.")
-    news_texts = [f"{x['title']}. {x['summary']}" for x in items]
     try:
-        text = await generate_news_text(news_texts)
+        text = await generate_news_script(limit=10)
     except ValueError as e:
         raise HTTPException(500, str(e))
 
@@ -123,23 +111,25 @@ async def regenerate_news(
         if not n:
             raise HTTPException(404, "News not found")
         n.text = text
-        n.audio_path = ""
+        assign_media(db, n, "audio_path", "")
         db.commit()
         db.refresh(n)
         return n
 
 
 @router.post("/{news_id}/tts")
-async def generate_news_audio(news_id: int, voice: str = "ru-RU-DmitryNeural", db: Session = Depends(get_db)):
+async def generate_news_audio(
+    news_id: int,
+    voice: str = DEFAULT_VOICE,
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
+    db: Session = Depends(get_db),
+):
     n = db.query(News).get(news_id)
     if not n or not n.text:
         raise HTTPException(400, "News or text not found")
-    audio_dir = Path(settings.upload_dir) / "news"
-    audio_dir.mkdir(parents=True, exist_ok=True)
-    path = audio_dir / f"news_{news_id}.mp3"
-    await text_to_speech(n.text, path, voice)
-    n.audio_path = str(path)
-    db.commit()
+    if background:
+        return job_to_dict(enqueue_job(db, "tts", {"entity_type": "news", "entity_id": news_id, "voice": voice}))
+    await voice_news(db, n, voice)
     return {"audio_path": n.audio_path}
 
 
@@ -160,6 +150,7 @@ def delete_news(news_id: int, db: Session = Depends(get_db)):
     n = db.query(News).get(news_id)
     if not n:
         raise HTTPException(404, "News not found")
+    release_row_media(db, n)
     db.delete(n)
     db.commit()
     return {"ok": True}
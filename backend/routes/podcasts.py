@@ -1,29 +1,16 @@
-import uuid
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Form, Request
 from sqlalchemy.orm import Session
 from database import get_db
+from services.media import entity_media_response
 from models import Podcast
-from config import settings
+from services.media_store import assign_media, release_row_media, store_bytes
 
 router = APIRouter(prefix="/podcasts", tags=["podcasts"])
 
-UPLOAD_DIR = Path(settings.upload_dir) / "podcasts"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @router.get("/{podcast_id}/audio")
-def get_podcast_audio(podcast_id: int, db: Session = Depends(get_db)):
-    p = db.query(Podcast).get(podcast_id)
-    if not p or not p.file_path:
-        raise HTTPException(404, "Podcast audio not found")
-    path = Path(p.file_path)
-    if not path.exists():
-        path = UPLOAD_DIR / Path(p.file_path).name
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_podcast_audio(podcast_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "podcast", podcast_id)
 
 
 @router.get("")
@@ -33,12 +20,8 @@ def list_podcasts(db: Session = Depends(get_db)):
 
 @router.post("")
 async def create_podcast(title: str = Form(...), file: UploadFile = UploadFile(...), db: Session = Depends(get_db)):
-    ext = Path(file.filename or "").suffix or ".mp3"
-    if ext.lower() != ".mp3":
-        ext = ".mp3"
-    path = UPLOAD_DIR / f"{uuid.uuid4().hex}{ext}"
-    path.write_bytes(await file.read())
-    p = Podcast(title=title, file_path=str(path), duration_seconds=0)
+    p = Podcast(title=title, file_path="", duration_seconds=0)
+    assign_media(db, p, "file_path", store_bytes(db, await file.read()))
     db.add(p)
     db.commit()
     db.refresh(p)
@@ -50,6 +33,7 @@ def delete_podcast(podcast_id: int, db: Session = Depends(get_db)):
     p = db.query(Podcast).get(podcast_id)
     if not p:
         raise HTTPException(404, "Podcast not found")
+    release_row_media(db, p)
     db.delete(p)
     db.commit()
     return {"ok": True}
@@ -1,30 +1,31 @@
 import json
-import random
-import uuid
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Query
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from database import get_db
 from models import Song
-from config import settings
-from services.jamendo import JamendoService, search_tracks, download_track
-from services.groq_service import generate_dj_text
-from services.tts_service import text_to_speech
+from services.jamendo import JamendoService
+from services.media import entity_media_response
+from services.media_store import assign_media, release_row_media, store_bytes
+from services.job_queue import enqueue_job, job_to_dict
+from services.production import import_jamendo_track, write_dj_text, voice_dj
+from services.tts_service import DEFAULT_VOICE
 
 router = APIRouter(prefix="/songs", tags=["songs"])
 
-UPLOAD_DIR = Path(settings.upload_dir) / "songs"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
-
 class SongCreate(BaseModel):
     title: str
     artist: str
     album: str = ""
 
 
+class LibraryImport(BaseModel):
+    directory: str
+    move: bool = False  # True — файлы переносятся в хранилище, а не копируются
+
+
 class SongUpdate(BaseModel):
     title: str | None = None
     artist: str | None = None
@@ -38,27 +39,13 @@ def list_songs(db: Session = Depends(get_db)):
 
 
 @router.get("/{song_id}/audio")
-def get_song_audio(song_id: int, db: Session = Depends(get_db)):
-    song = db.query(Song).get(song_id)
-    if not song or not song.file_path:
-        raise HTTPException(404, "Audio not found")
-    path = Path(song.file_path)
-    if not path.exists():
-        path = UPLOAD_DIR / path.name
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_song_audio(song_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "song", song_id)
 
 
 @router.get("/{song_id}/dj-audio")
-def get_song_dj_audio(song_id: int, db: Session = Depends(get_db)):
-    song = db.query(Song).get(song_id)
-    if not song or not song.dj_audio_path:
-        raise HTTPException(404, "DJ audio not found")
-    path = Path(song.dj_audio_path)
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_song_dj_audio(song_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "dj", song_id)
 
 
 @router.post("")
@@ -76,47 +63,34 @@ async def upload_song_file(song_id: int, file: UploadFile, db: Session = Depends
     song = db.query(Song).get(song_id)
     if not song:
         raise HTTPException(404, "Song not found")
-    ext = Path(file.filename or "").suffix or ".mp3"
-    if ext.lower() != ".mp3":
-        ext = ".mp3"
-    path = UPLOAD_DIR / f"{song_id}_{uuid.uuid4().hex}{ext}"
-    path.write_bytes(await file.read())
-    song.file_path = str(path)
+    assign_media(db, song, "file_path", store_bytes(db, await file.read()))
     db.commit()
     return {"file_path": song.file_path}
 
 
+@router.post("/import-local")
+def import_local_library(data: LibraryImport, db: Session = Depends(get_db)):
+    """Импорт локального каталога MP3 (фоновая задача library_import)."""
+    if not Path(data.directory).is_dir():
+        raise HTTPException(400, "Каталог не найден на сервере")
+    return job_to_dict(enqueue_job(db, "library_import", {"directory": data.directory, "move": data.move}))
+
+
 @router.post("/jamendo/generate")
-async def generate_from_jamendo(db: Session = Depends(get_db)):
+async def generate_from_jamendo(
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
+    db: Session = Depends(get_db),
+):
+    if background:
+        return job_to_dict(enqueue_job(db, "jamendo_import", {"limit_per_query": 20}))
     tracks = await JamendoService.search_and_get_tracks(limit_per_query=20)
     if not tracks:
         raise HTTPException(502, "Jamendo API не вернул треки. Проверьте запрос или попробуйте позже.")
     created = []
     for t in tracks:
-        tid = t.get("id")
-        if not tid:
-            continue
-        tid = str(tid)
-        url = t.get("audiodownload") or t.get("audio") or f"https://prod-1.storage.jamendo.com/download/track/{tid}/mp32/"
-        title = t.get("name", "Unknown")
-        artist = t.get("artist_name", "Unknown")
-        album = t.get("album_name", "")
-        song = Song(title=title, artist=artist, album=album, file_path="")
-        db.add(song)
-        db.commit()
-        db.refresh(song)
-        try:
-            path = UPLOAD_DIR / f"{song.id}_{uuid.uuid4().hex}.mp3"
-            await download_track(url, path)
-            song.file_path = str(path)
-            song.duration_seconds = float(t.get("duration", 0))
-            db.commit()
-            created.append({"id": song.id, "title": title, "artist": artist})
-        except Exception as e:
-            db.delete(song)
-            db.commit()
-            import logging
-            logging.warning(f"Jamendo download failed for {tid}: {e}")
+        song = await import_jamendo_track(db, t)
+        if song:
+            created.append({"id": song.id, "title": song.title, "artist": song.artist})
     return {"created": len(created), "songs": created}
 
 
@@ -134,28 +108,8 @@ async def generate_from_jamendo_stream(db: Session = Depends(get_db)):
             yield f"data: {json.dumps({'progress': 0, 'current': 0, 'total': total, 'created': 0})}\n\n"
             created = 0
             for i, t in enumerate(tracks):
-                tid = t.get("id")
-                if not tid:
-                    continue
-                tid = str(tid)
-                url = t.get("audiodownload") or t.get("audio") or f"https://prod-1.storage.jamendo.com/download/track/{tid}/mp32/"
-                title = t.get("name", "Unknown")
-                artist = t.get("artist_name", "Unknown")
-                album = t.get("album_name", "")
-                song = Song(title=title, artist=artist, album=album, file_path="")
-                db.add(song)
-                db.commit()
-                db.refresh(song)
-                try:
-                    path = UPLOAD_DIR / f"{song.id}_{uuid.uuid4().hex}.mp3"
-                    await download_track(url, path)
-                    song.file_path = str(path)
-                    song.duration_seconds = float(t.get("duration", 0))
-                    db.commit()
+                if await import_jamendo_track(db, t):
                     created += 1
-                except Exception:
-                    db.delete(song)
-                    db.commit()
                 progress = int((i + 1) / total * 100)
                 yield f"data: {json.dumps({'progress': progress, 'current': i + 1, 'total': total, 'created': created})}\n\n"
             yield f"data: {json.dumps({'progress': 100, 'done': True, 'created': created})}\n\n"
@@ -174,40 +128,40 @@ async def generate_dj(song_id: int, db: Session = Depends(get_db)):
     song = db.query(Song).get(song_id)
     if not song:
         raise HTTPException(404, "Song not found")
-    greeting_allowed = random.random() < 0.1
-    text = await generate_dj_text(song.artist, song.title, song.album, greeting_allowed)
-    song.dj_text = text
-    song.dj_audio_path = ""  # сброс озвучки при смене текста
-    db.commit()
+    text = await write_dj_text(db, song)
     return {"dj_text": text}
 
 
 @router.post("/{song_id}/tts")
-async def generate_dj_audio(song_id: int, voice: str = "ru-RU-DmitryNeural", db: Session = Depends(get_db)):
+async def generate_dj_audio(
+    song_id: int,
+    voice: str = DEFAULT_VOICE,
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
+    db: Session = Depends(get_db),
+):
     song = db.query(Song).get(song_id)
     if not song or not song.dj_text:
         raise HTTPException(400, "Song or DJ text not found")
-    audio_dir = Path(settings.upload_dir) / "dj"
-    audio_dir.mkdir(parents=True, exist_ok=True)
-    path = audio_dir / f"dj_{song_id}.mp3"
-    await text_to_speech(song.dj_text, path, voice)
-    song.dj_audio_path = str(path)
-    db.commit()
+    if background:
+        return job_to_dict(enqueue_job(db, "tts", {"entity_type": "dj", "entity_id": song_id, "voice": voice}))
+    await voice_dj(db, song, voice)
     return {"audio_path": song.dj_audio_path}
 
 
 @router.post("/generate-dj-batch")
-async def generate_dj_batch(song_ids: list[int] = Query(..., alias="song_ids"), db: Session = Depends(get_db)):
+async def generate_dj_batch(
+    song_ids: list[int] = Query(..., alias="song_ids"),
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
+    db: Session = Depends(get_db),
+):
+    if background:
+        return job_to_dict(enqueue_job(db, "dj_batch", {"song_ids": song_ids}))
     results = []
     for sid in song_ids:
         song = db.query(Song).get(sid)
         if song:
             try:
-                greeting_allowed = random.random() < 0.1
-                text = await generate_dj_text(song.artist, song.title, song.album, greeting_allowed)
-                song.dj_text = text
-                song.dj_audio_path = ""
-                db.commit()
+                text = await write_dj_text(db, song)
                 results.append({"id": sid, "dj_text": text})
             except Exception as e:
                 results.append({"id": sid, "error": str(e)})
@@ -237,6 +191,7 @@ def delete_song(song_id: int, db: Session = Depends(get_db)):
     song = db.query(Song).get(song_id)
     if not song:
         raise HTTPException(404, "Song not found")
+    release_row_media(db, song)
     db.delete(song)
     db.commit()
     return {"ok": True}
@@ -1,16 +1,15 @@
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from database import get_db
+from services.media import entity_media_response
+from services.media_store import assign_media, release_row_media
 from models import Weather, BroadcastItem
-from config import settings
-from pathlib import Path
-from services.weather_service import fetch_weather_forecast
-from services.groq_service import generate_weather_text
-from services.tts_service import text_to_speech
+from services.job_queue import enqueue_job, job_to_dict
+from services.production import generate_weather_script, voice_weather
+from services.tts_service import DEFAULT_VOICE
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 
@@ -36,14 +35,8 @@ def list_weather(
 
 
 @router.get("/{weather_id}/audio")
-def get_weather_audio(weather_id: int, db: Session = Depends(get_db)):
-    w = db.query(Weather).get(weather_id)
-    if not w or not w.audio_path:
-        raise HTTPException(404, "Audio not found")
-    path = Path(w.audio_path)
-    if not path.exists():
-        raise HTTPException(404, "File not found")
-    return FileResponse(path, media_type="audio/mpeg")
+def get_weather_audio(weather_id: int, request: Request, db: Session = Depends(get_db)):
+    return entity_media_response(request, db, "weather", weather_id)
 
 
 @router.post("")
@@ -58,10 +51,12 @@ def create_weather(data: WeatherCreate, db: Session = Depends(get_db)):
 @router.post("/generate")
 async def generate_weather(
     d: date | None = Query(None, description="Дата для новой записи YYYY-MM-DD"),
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
     db: Session = Depends(get_db),
 ):
-    raw = await fetch_weather_forecast()
-    text = await generate_weather_text(raw)
+    if background:
+        return job_to_dict(enqueue_job(db, "weather_generate", {"date": d}))
+    text = await generate_weather_script()
     w = Weather(text=text, broadcast_date=d)
     db.add(w)
     db.commit()
@@ -77,8 +72,7 @@ async def regenerate_weather(
     db: Session = Depends(get_db),
 ):
     """Перегенерировать: создаёт НОВУЮ запись на дату d, обновляет слот. Иначе — перезаписывает текущую."""
-    raw = await fetch_weather_forecast()
-    text = await generate_weather_text(raw)
+    text = await generate_weather_script()
 
     if d is not None:
         w = Weather(text=text, broadcast_date=d)
@@ -99,23 +93,25 @@ async def regenerate_weather(
         if not w:
             raise HTTPException(404, "Weather not found")
         w.text = text
-        w.audio_path = ""
+        assign_media(db, w, "audio_path", "")
         db.commit()
         db.refresh(w)
         return w
 
 
 @router.post("/{weather_id}/tts")
-async def generate_weather_audio(weather_id: int, voice: str = "ru-RU-DmitryNeural", db: Session = Depends(get_db)):
+async def generate_weather_audio(
+    weather_id: int,
+    voice: str = DEFAULT_VOICE,
+    background: bool = Query(False, description="Поставить в очередь фоновых задач и сразу вернуть job"),
+    db: Session = Depends(get_db),
+):
     w = db.query(Weather).get(weather_id)
     if not w or not w.text:
         raise HTTPException(400, "Weather or text not found")
-    audio_dir = Path(settings.upload_dir) / "weather"
-    audio_dir.mkdir(parents=True, exist_ok=True)
-    path = audio_dir / f"weather_{weather_id}.mp3"
-    await text_to_speech(w.text, path, voice)
-    w.audio_path = str(path)
-    db.commit()
+    if background:
+        return job_to_dict(enqueue_job(db, "tts", {"entity_type": "weather", "entity_id": weather_id, "voice": voice}))
+    await voice_weather(db, w, voice)
     return {"audio_path": w.audio_path}
 
 
@@ -136,6 +132,7 @@ def delete_weather(weather_id: int, db: Session = Depends(get_db)):
     w = db.query(Weather).get(weather_id)
     if not w:
         raise HTTPException(404, "Weather not found")
+    release_row_media(db, w)
     db.delete(w)
     db.commit()
     return {"ok": True}
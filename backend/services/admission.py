@@ -0,0 +1,200 @@
+"""
+Admission control for long-lived listener connections (/stream, /stream/timeshift).
+Общий лимит stream_max_listeners, из них stream_admin_reserved мест — только для запросов
+с ключом stream_admin_key (превью из админки); лимит на IP — stream_max_per_ip.
+Если мест нет, запрос ждёт до stream_queue_seconds, затем 503 (перегрузка) или 429 (лимит IP)
+с Retry-After.
+При нескольких воркерах uvicorn (settings.live_ring) лимиты общие на хост: каждый воркер
+публикует свои счётчики в admission-<pid>.json в live_ring_dir и учитывает счётчики остальных.
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import time
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+
+from config import settings
+from services.live_ring import ring_dir
+
+_QUEUE_POLL = 0.25
+
+
+@dataclass
+class Ticket:
+    ip: str
+    admin: bool
+    released: bool = False
+
+
+_by_ip: Counter = Counter()
+_counts = Counter(total=0, admin=0)
+_stats = Counter(admitted=0, rejected_busy=0, rejected_ip=0, queued=0)
+
+
+def client_ip(request: Request) -> str:
+    """Peer address; X-Real-IP is trusted only from a loopback proxy (nginx на той же машине)."""
+    peer = request.client.host if request.client else ""
+    try:
+        loopback = ipaddress.ip_address(peer).is_loopback
+    except ValueError:
+        loopback = False
+    if loopback:
+        real = request.headers.get("x-real-ip", "").strip()
+        if real:
+            return real
+    return peer
+
+
+def is_admin(request: Request) -> bool:
+    key = settings.stream_admin_key
+    given = request.headers.get("x-admin-key") or request.query_params.get("admin_key") or ""
+    return bool(key) and hmac.compare_digest(given, key)
+
+
+def _counts_path(pid: int) -> Path:
+    return ring_dir() / f"admission-{pid}.json"
+
+
+def _publish() -> None:
+    """Write this worker's counters for the other workers (tmp + replace)."""
+    if not settings.live_ring:
+        return
+    path = _counts_path(os.getpid())
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"total": _counts["total"], "admin": _counts["admin"], "by_ip": _by_ip}))
+        tmp.replace(path)
+    except OSError as e:
+        logging.warning(f"Admission counters publish failed: {e}")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _peer_counts() -> tuple[Counter, Counter]:
+    """Sum of the other workers' counters (total/admin, by IP); files of dead workers are removed."""
+    counts, by_ip = Counter(total=0, admin=0), Counter()
+    if not settings.live_ring:
+        return counts, by_ip
+    own = os.getpid()
+    for path in ring_dir().glob("admission-*.json"):
+        try:
+            pid = int(path.stem.split("-", 1)[1])
+        except ValueError:
+            continue
+        if pid == own:
+            continue
+        if not _alive(pid):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        counts["total"] += int(data.get("total", 0))
+        counts["admin"] += int(data.get("admin", 0))
+        by_ip.update(data.get("by_ip") or {})
+    return counts, by_ip
+
+
+def _refusal(ip: str, admin: bool) -> tuple[int, str] | None:
+    """None if a slot is free, else (status, message). Считаются слушатели всех воркеров хоста."""
+    peers, peers_by_ip = _peer_counts()
+    total = _counts["total"] + peers["total"]
+    admins = _counts["admin"] + peers["admin"]
+    public_cap = max(0, settings.stream_max_listeners - settings.stream_admin_reserved)
+    if admin:
+        if total >= settings.stream_max_listeners:
+            return 503, "Все слоты эфира заняты"
+        return None
+    if settings.stream_max_per_ip and _by_ip[ip] + peers_by_ip[ip] >= settings.stream_max_per_ip:
+        return 429, "Слишком много подключений с вашего адреса"
+    if total - admins >= public_cap:
+        return 503, "Сервер перегружен, попробуйте позже"
+    return None
+
+
+def _take(ip: str, admin: bool) -> Ticket:
+    ticket = Ticket(ip=ip, admin=admin)
+    _by_ip[ip] += 1
+    _counts["total"] += 1
+    _counts["admin"] += int(admin)
+    _stats["admitted"] += 1
+    _publish()
+    return ticket
+
+
+def release(ticket: Ticket) -> None:
+    if ticket.released:
+        return
+    ticket.released = True
+    _by_ip[ticket.ip] -= 1
+    if _by_ip[ticket.ip] <= 0:
+        del _by_ip[ticket.ip]
+    _counts["total"] -= 1
+    _counts["admin"] -= int(ticket.admin)
+    _publish()
+
+
+async def admit(request: Request) -> Ticket:
+    """Reserve a listener slot or raise HTTPException(503/429) with Retry-After."""
+    ip, admin = client_ip(request), is_admin(request)
+    deadline = time.monotonic() + max(0.0, settings.stream_queue_seconds)
+    refusal = _refusal(ip, admin)
+    if refusal is not None and settings.stream_queue_seconds > 0:
+        _stats["queued"] += 1
+        while refusal is not None and time.monotonic() < deadline:
+            await asyncio.sleep(_QUEUE_POLL)
+            refusal = _refusal(ip, admin)
+    if refusal is not None:
+        status, message = refusal
+        _stats["rejected_ip" if status == 429 else "rejected_busy"] += 1
+        raise HTTPException(status, message, headers={"Retry-After": str(settings.stream_retry_after)})
+    return _take(ip, admin)
+
+
+async def _guarded(body, ticket: Ticket):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        release(ticket)
+        await body.aclose()
+
+
+def admitted_stream(body, ticket: Ticket):
+    """Wrap a streaming body so the slot is released however the stream ends
+    (в том числе если клиент ушёл до первого байта и генератор так и не стартовал)."""
+    gen = _guarded(body, ticket)
+    weakref.finalize(gen, release, ticket)
+    return gen
+
+
+def admission_stats() -> dict:
+    peers, _ = _peer_counts()
+    return {
+        "listeners": _counts["total"],
+        "host_listeners": _counts["total"] + peers["total"],
+        "admin_listeners": _counts["admin"],
+        "max_listeners": settings.stream_max_listeners,
+        "admin_reserved": settings.stream_admin_reserved,
+        "max_per_ip": settings.stream_max_per_ip,
+        "unique_ips": len(_by_ip),
+        **_stats,
+    }
@@ -0,0 +1,187 @@
+"""
+MP3 duration probing and ID3 tag reading without external tools.
+Длительность — по заголовкам MPEG-фреймов (VBR, склейки TTS); теги — ID3v2.2–2.4 и ID3v1.
+"""
+import hashlib
+from pathlib import Path
+
+# bitrate kbps: [version_group][layer][index]; version_group 0 = MPEG1, 1 = MPEG2/2.5
+_BITRATES = {
+    (0, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (0, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (0, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (1, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (1, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (1, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def id3_size(data: bytes) -> int:
+    """Length of a leading ID3v2 tag (0 if none)."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def parse_frame_header(data: bytes, pos: int) -> tuple[int, int, int, int] | None:
+    """Parse header at pos. Returns (frame_len, samples_per_frame, sample_rate, bitrate_kbps) or None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2 = data[pos + 1], data[pos + 2]
+    version = (b1 >> 3) & 0x03  # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    layer_bits = (b1 >> 1) & 0x03
+    if version == 1 or layer_bits == 0:
+        return None
+    layer = 4 - layer_bits
+    br_idx = (b2 >> 4) & 0x0F
+    sr_idx = (b2 >> 2) & 0x03
+    if br_idx in (0, 15) or sr_idx == 3:
+        return None
+    vgroup = 0 if version == 3 else 1
+    bitrate = _BITRATES[(vgroup, layer)][br_idx]
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        samples = 384
+        frame_len = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or vgroup == 0) else 576
+        frame_len = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return frame_len, samples, sample_rate, bitrate
+
+
+def frame_header(sample_rate: int, bitrate_kbps: int, channels: int = 2) -> bytes:
+    """4-byte Layer III header without CRC/padding. Raises ValueError for unsupported combinations."""
+    version = next((v for v, rates in _SAMPLE_RATES.items() if sample_rate in rates), None)
+    if version is None:
+        raise ValueError(f"Unsupported sample rate: {sample_rate}")
+    br_idx = _BITRATES[(0 if version == 3 else 1, 3)].index(bitrate_kbps)
+    sr_idx = _SAMPLE_RATES[version].index(sample_rate)
+    return bytes([0xFF, 0xE0 | version << 3 | 0x03, br_idx << 4 | sr_idx << 2, 0xC0 if channels == 1 else 0x00])
+
+
+def silent_frame(header: bytes) -> bytes:
+    """Silent frame with the same format as header: zero side info decodes to silence."""
+    h = bytes([header[0], header[1] | 0x01, header[2] & 0xFD, header[3]])  # без CRC и padding
+    frame_len = parse_frame_header(h, 0)[0]
+    return h + bytes(frame_len - 4)
+
+
+def iter_frames(data: bytes, start: int = 0):
+    """Yield (offset, frame_len, samples, sample_rate, bitrate) for consecutive frames, resyncing on junk."""
+    pos = start
+    n = len(data)
+    while pos + 4 <= n:
+        hdr = parse_frame_header(data, pos)
+        if hdr is None or hdr[0] <= 0:
+            pos += 1
+            continue
+        yield (pos, *hdr)
+        pos += hdr[0]
+
+
+def frame_sync(data: bytes) -> int:
+    """Offset of the first frame followed by another valid frame (вход в поток с произвольного байта)."""
+    for pos in range(len(data) - 4):
+        hdr = parse_frame_header(data, pos)
+        if hdr and hdr[0] > 0 and (pos + hdr[0] + 4 > len(data) or parse_frame_header(data, pos + hdr[0])):
+            return pos
+    return len(data)
+
+
+def probe_duration(path: Path) -> float:
+    """Duration of an MP3 file in seconds (0.0 if unreadable)."""
+    try:
+        data = Path(path).read_bytes()
+    except OSError:
+        return 0.0
+    total = 0.0
+    for _, _, samples, sample_rate, _ in iter_frames(data, id3_size(data)):
+        total += samples / sample_rate
+    return round(total, 2)
+
+
+# ID3v2 frame ids: (v2.3/2.4, v2.2) -> поле
+_TAG_FRAMES = {"TIT2": "title", "TPE1": "artist", "TALB": "album", "TT2": "title", "TP1": "artist", "TAL": "album"}
+
+
+def _decode_legacy(raw: bytes) -> str:
+    """Latin-1 field that is very often cp1251 in Russian-language libraries."""
+    high = [b for b in raw if b >= 0x80]
+    if high and all(b >= 0xC0 or b in (0xA8, 0xB8) for b in high):
+        return raw.decode("cp1251", errors="replace")
+    return raw.decode("latin-1", errors="replace")
+
+
+def _decode_text_frame(body: bytes) -> str:
+    if not body:
+        return ""
+    enc, raw = body[0], body[1:]
+    if enc == 1:
+        text = raw.decode("utf-16", errors="replace")
+    elif enc == 2:
+        text = raw.decode("utf-16-be", errors="replace")
+    elif enc == 3:
+        text = raw.decode("utf-8", errors="replace")
+    else:
+        text = _decode_legacy(raw)
+    return text.split("\x00")[0].strip()
+
+
+def _syncsafe(b: bytes) -> int:
+    return (b[0] & 0x7F) << 21 | (b[1] & 0x7F) << 14 | (b[2] & 0x7F) << 7 | (b[3] & 0x7F)
+
+
+def read_tags(data: bytes) -> dict[str, str]:
+    """title/artist/album from ID3v2 (preferred) or ID3v1. Missing fields are omitted."""
+    tags: dict[str, str] = {}
+    end = id3_size(data)
+    if end:
+        major = data[3]
+        pos = 10
+        if data[5] & 0x40 and major >= 3:  # extended header
+            pos += _syncsafe(data[10:14]) if major == 4 else int.from_bytes(data[10:14], "big") + 4
+        hdr_len = 6 if major == 2 else 10
+        while pos + hdr_len <= end and len(tags) < 3:
+            if major == 2:
+                fid = data[pos:pos + 3].decode("latin-1")
+                size = int.from_bytes(data[pos + 3:pos + 6], "big")
+            else:
+                fid = data[pos:pos + 4].decode("latin-1")
+                size = _syncsafe(data[pos + 4:pos + 8]) if major == 4 else int.from_bytes(data[pos + 4:pos + 8], "big")
+            if not fid.strip("\x00") or size <= 0:
+                break
+            key = _TAG_FRAMES.get(fid)
+            if key and key not in tags:
+                value = _decode_text_frame(data[pos + hdr_len:pos + hdr_len + size])
+                if value:
+                    tags[key] = value
+            pos += hdr_len + size
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        v1 = data[-128:]
+        for key, start in (("title", 3), ("artist", 33), ("album", 63)):
+            if key not in tags:
+                value = _decode_legacy(v1[start:start + 30].split(b"\x00")[0]).strip()
+                if value:
+                    tags[key] = value
+    return tags
+
+
+def scan_file(path: str) -> dict:
+    """Tags, duration and sha256 of one file. Top-level for ProcessPoolExecutor."""
+    try:
+        data = Path(path).read_bytes()
+    except OSError as e:
+        return {"path": path, "error": str(e)}
+    duration = 0.0
+    for _, _, samples, sample_rate, _ in iter_frames(data, id3_size(data)):
+        duration += samples / sample_rate
+    return {
+        "path": path,
+        "tags": read_tags(data),
+        "duration": round(duration, 2),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+    }
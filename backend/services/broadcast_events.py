@@ -0,0 +1,227 @@
+"""
+Server push for the broadcast page and player (SSE, GET /api/broadcast/events).
+now-playing — одна задача на процесс спит до следующей границы элемента по таймлайну и
+рассылает событие только при смене элемента; grid — после commit'а, изменившего сетку,
+строки даты читаются один раз и подписчикам уходит только разница (upsert / removed).
+Работа сервера пропорциональна числу изменений, а не числу вкладок × частоте опроса.
+Правки из другого процесса (воркеры uvicorn, worker.py) commit-хук этого процесса не видит:
+отслеживаемые даты дополнительно сверяются с БД раз в events_peer_poll секунд.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from datetime import date, datetime
+
+from config import settings
+from database import SessionLocal
+from models import BroadcastItem
+from services.broadcast_service import grid_record
+from services.streamer_service import _moscow_now
+from services.timeline import ALL_DATES, invalidate_timeline, is_compiled, on_grid_change, timeline
+
+_QUEUE_SIZE = 100
+
+_subscribers: dict[asyncio.Queue, date | None] = {}  # очередь слушателя -> дата сетки, за которой он следит
+_snapshots: dict[date, dict[int, dict]] = {}  # строки сетки отслеживаемых дат: id -> запись без text
+_now_playing: dict = {}
+_stats = Counter(published=0, dropped=0)
+
+_loop: asyncio.AbstractEventLoop | None = None
+_changes: asyncio.Queue | None = None
+_wake: asyncio.Event | None = None
+_tasks: list[asyncio.Task] = []
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def publish(event: str, data: dict, d: date | None = None) -> None:
+    """Send to every subscriber (или только следящим за датой d). Slow subscribers are dropped."""
+    message = _sse(event, data)
+    for queue, watched in list(_subscribers.items()):
+        if d is not None and watched != d:
+            continue
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            _subscribers.pop(queue, None)
+            _stats["dropped"] += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)  # отстающий подписчик закрывается
+        else:
+            _stats["published"] += 1
+
+
+# --- now-playing по границам элементов ---
+
+def _day_sec(now: datetime) -> float:
+    return now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+
+
+def _current(items: list[dict], sec: float) -> tuple[dict | None, float]:
+    """(item airing at sec, second of the next boundary) — границы: start и end элементов."""
+    current, boundary = None, 24 * 3600.0
+    for it in items:
+        if it["start"] > sec:
+            boundary = min(boundary, it["start"])
+            break
+        if sec < it["end"]:
+            current = it
+            boundary = it["end"]
+    return current, boundary
+
+
+def _now_playing_event(d: date, it: dict | None) -> dict:
+    if it is None:
+        return {"date": str(d), "entityType": None, "entityId": None}
+    return {
+        "date": str(d), "entityType": it["type"], "entityId": it["id"],
+        "title": it["title"], "start": it["start"], "end": it["end"],
+    }
+
+
+async def _boundary_loop() -> None:
+    global _now_playing
+    while True:
+        try:
+            now = _moscow_now()
+            d = now.date()
+            items = timeline(d) if is_compiled(d) else await asyncio.to_thread(timeline, d)
+            current, boundary = _current(items, _day_sec(now))
+            event = _now_playing_event(d, current)
+            if event != _now_playing:
+                _now_playing = event
+                publish("now-playing", event)
+            wait = boundary - _day_sec(_moscow_now())
+        except Exception as e:
+            logging.warning(f"Now-playing events failed: {e}")
+            wait = 60.0
+        _wake.clear()
+        try:
+            await asyncio.wait_for(_wake.wait(), max(0.05, wait))  # проснуться раньше, если сетку правили
+        except asyncio.TimeoutError:
+            pass
+
+
+# --- grid-диффы ---
+
+_FIELDS = ("id", "entity_type", "entity_id", "start_time", "end_time", "duration_seconds", "sort_order", "metadata_json")
+
+
+def _diff(d: date, old: dict[int, dict]) -> tuple[dict[int, dict], list[dict], list[int]]:
+    """Compare the date's rows with the snapshot. Returns (new snapshot, upsert, removed);
+    text (запрос к сущности) читается только для изменившихся строк."""
+    db = SessionLocal()
+    try:
+        new, upsert = {}, []
+        for it in db.query(BroadcastItem).filter(BroadcastItem.broadcast_date == d).all():
+            new[it.id] = {k: getattr(it, k) for k in _FIELDS}
+            if new[it.id] != old.get(it.id):
+                upsert.append(grid_record(db, it))
+    finally:
+        db.close()
+    upsert.sort(key=lambda r: r["sort_order"])
+    return new, upsert, [i for i in old if i not in new]
+
+
+async def _next_changes() -> tuple[set, bool]:
+    """Dates from local commits, or ({ALL_DATES}, True) when it is time to check for other processes' edits."""
+    if settings.events_peer_poll <= 0:
+        return await _changes.get(), False
+    try:
+        return await asyncio.wait_for(_changes.get(), settings.events_peer_poll), False
+    except asyncio.TimeoutError:
+        return {ALL_DATES}, True
+
+
+async def _diff_loop() -> None:
+    while True:
+        dates, peer = await _next_changes()
+        while not _changes.empty():
+            dates |= _changes.get_nowait()  # серия commit'ов — один дифф
+            peer = False
+        if not peer:
+            _wake.set()
+        targets = list(_snapshots) if ALL_DATES in dates else [d for d in dates if d in _snapshots]
+        for d in targets:
+            old = _snapshots.get(d)
+            if old is None:
+                continue
+            try:
+                new, upsert, removed = await asyncio.to_thread(_diff, d, old)
+            except Exception as e:
+                logging.warning(f"Grid diff {d} failed: {e}")
+                continue
+            if d in _snapshots:  # подписчики могли уйти, пока считали
+                _snapshots[d] = new
+            if upsert or removed:
+                if peer:  # правка другого процесса: таймлайн этого процесса устарел
+                    invalidate_timeline(d)
+                    _wake.set()
+                publish("grid", {"date": str(d), "upsert": upsert, "removed": removed}, d)
+
+
+def _grid_changed(dates: set) -> None:
+    """Called from the committing thread."""
+    if _loop is not None and _changes is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_changes.put_nowait, set(dates))
+
+
+on_grid_change(_grid_changed)
+
+
+# --- подписка ---
+
+async def subscribe(d: date | None):
+    """Async generator of SSE messages: текущий now-playing сразу, затем события и keep-alive."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+    if d is not None and d not in _snapshots:
+        _snapshots[d] = (await asyncio.to_thread(_diff, d, {}))[0]
+    _subscribers[queue] = d
+    try:
+        if _now_playing:
+            yield _sse("now-playing", _now_playing)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), settings.events_keepalive)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"  # чтобы прокси не закрыл тихое соединение
+                continue
+            if message is None:
+                return  # не успевал забирать события — клиент переподключится и перечитает сетку
+            yield message
+    finally:
+        _subscribers.pop(queue, None)
+        if d is not None and d not in _subscribers.values():
+            _snapshots.pop(d, None)
+
+
+def events_stats() -> dict:
+    return {
+        "subscribers": len(_subscribers),
+        "watched_dates": sorted(str(d) for d in _snapshots),
+        **_stats,
+    }
+
+
+def start_broadcast_events() -> None:
+    """Start the boundary and diff tasks (call from app lifespan)."""
+    global _loop, _changes, _wake
+    if _tasks:
+        return
+    _loop = asyncio.get_running_loop()
+    _changes = asyncio.Queue()
+    _wake = asyncio.Event()
+    _tasks.extend([asyncio.create_task(_boundary_loop()), asyncio.create_task(_diff_loop())])
+
+
+async def stop_broadcast_events() -> None:
+    global _loop
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _loop = None
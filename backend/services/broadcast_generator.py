@@ -6,11 +6,13 @@ Slots:
 - Podcasts: 11, 14, 17, 20, 23
 - INTRO: at XX:55 every hour
 - Songs + DJ: fill the rest
+DJ_MODE=lazy: DJ-блок ставится перед каждой песней, озвучка делается позже (services/dj_voicing).
 """
 from datetime import date
 import random
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
+from config import settings
 from models import Song, News, Weather, Podcast, Intro, BroadcastItem
 
 
@@ -95,10 +97,10 @@ def generate_broadcast(db: Session, broadcast_date: date) -> list[BroadcastItem]
         t_sec = h * 3600 + m * 60
         if et == "news" and news_list:
             n = next(news_it)
-            timed_events.append((t_sec, "news", n.id, 120, "Новости"))
+            timed_events.append((t_sec, "news", n.id, int(n.duration_seconds or 120), "Новости"))
         elif et == "weather" and weather_list:
             w = next(weather_it)
-            timed_events.append((t_sec, "weather", w.id, 90, "Погода"))
+            timed_events.append((t_sec, "weather", w.id, int(w.duration_seconds or 90), "Погода"))
         elif et == "podcast" and podcasts:
             p = next(podcast_it)
             dur = int(p.duration_seconds or 1800)
@@ -124,17 +126,19 @@ def generate_broadcast(db: Session, broadcast_date: date) -> list[BroadcastItem]
 
     current_sec = 0
     day_end = 24 * 3600
+    lazy_dj = settings.dj_mode == "lazy"
 
     def try_add_song(remaining_sec: int) -> bool:
         """Add a song that fits in remaining_sec. Returns True if added."""
         nonlocal current_sec
         for _ in range(len(songs)):
             s = next_song()
-            dj = 45 if s.dj_audio_path else 0
+            with_dj = bool(s.dj_audio_path) or lazy_dj
+            dj = int(s.dj_duration_seconds or 45) if with_dj else 0
             dur = int(s.duration_seconds or 180)
             total = dj + dur
             if total <= remaining_sec:
-                if s.dj_audio_path:
+                if with_dj:
                     blocks.append((current_sec, "dj", s.id, dj, f"DJ: {s.artist} - {s.title}"))
                     current_sec += dj
                 blocks.append((current_sec, "song", s.id, dur, f"{s.artist} - {s.title}"))
@@ -27,11 +27,15 @@ def _sec_to_hms(sec: int) -> tuple[int, int, int]:
     return h, m, s
 
 
-def recalc_times(db: Session, broadcast_date, items: list[BroadcastItem]) -> None:
-    """Recalculate start_time/end_time for all items. Anchors keep start_time."""
+def recalc_times(db: Session, broadcast_date, items: list[BroadcastItem], from_sec: int = 0) -> None:
+    """Recalculate start_time/end_time for all items. Anchors keep start_time.
+    from_sec — элементы, начинающиеся раньше, не трогаются (уже в эфире), цепочка продолжается от их конца."""
     items = sorted(items, key=lambda x: x.sort_order)
     prev_end_sec = 0
     for item in items:
+        if from_sec and _parse_time(item.start_time) < from_sec:
+            prev_end_sec = _parse_time(item.end_time)
+            continue
         dur = float(item.duration_seconds or 0)
         if item.entity_type in ANCHOR_TYPES:
             start_sec = _parse_time(item.start_time)
@@ -56,17 +60,17 @@ def get_entity_duration(db: Session, entity_type: str, entity_id: int) -> float:
         s = db.query(Song).filter(Song.id == entity_id, Song.dj_audio_path != "").first()
         if not s:
             raise ValueError("Song with DJ audio not found")
-        return 45.0
+        return float(s.dj_duration_seconds or 45)
     if entity_type == "news":
         n = db.query(News).filter(News.id == entity_id, News.audio_path != "").first()
         if not n:
             raise ValueError("News with audio not found")
-        return 120.0
+        return float(n.duration_seconds or 120)
     if entity_type == "weather":
         w = db.query(Weather).filter(Weather.id == entity_id, Weather.audio_path != "").first()
         if not w:
             raise ValueError("Weather with audio not found")
-        return 90.0
+        return float(w.duration_seconds or 90)
     if entity_type == "podcast":
         p = db.query(Podcast).get(entity_id)
         if not p:
@@ -99,3 +103,36 @@ def get_entity_meta(db: Session, entity_type: str, entity_id: int) -> str:
         i = db.query(Intro).get(entity_id)
         return i.title if i else "—"
     return "—"
+
+
+def get_entity_text(db: Session, entity_type: str, entity_id: int) -> str | None:
+    """Текст для DJ, новостей, погоды."""
+    if entity_type == "dj":
+        s = db.query(Song).filter(Song.id == entity_id).first()
+        return s.dj_text if s else None
+    if entity_type == "news":
+        n = db.query(News).filter(News.id == entity_id).first()
+        return n.text if n else None
+    if entity_type == "weather":
+        w = db.query(Weather).filter(Weather.id == entity_id).first()
+        return w.text if w else None
+    return None
+
+
+def grid_record(db: Session, it: BroadcastItem) -> dict:
+    """Grid row as returned by GET /broadcast (and pushed in grid diffs)."""
+    rec = {
+        "id": it.id,
+        "entity_type": it.entity_type,
+        "entity_id": it.entity_id,
+        "start_time": it.start_time,
+        "end_time": it.end_time,
+        "duration_seconds": it.duration_seconds,
+        "sort_order": it.sort_order,
+        "metadata_json": it.metadata_json,
+    }
+    if it.entity_type in ("dj", "news", "weather"):
+        rec["text"] = get_entity_text(db, it.entity_type, it.entity_id) or ""
+    else:
+        rec["text"] = None
+    return rec
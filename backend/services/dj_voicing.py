@@ -0,0 +1,151 @@
+"""
+Lazy just-in-time DJ voicing (settings.dj_mode = "lazy").
+Сетка ставит DJ-блок перед каждой песней, а текст и TTS делаются только для песен,
+которые выходят в эфир в ближайшие dj_lookahead_hours. Озвучка кэшируется в Song
+(dj_text / dj_audio_path) и переиспользуется в следующие дни.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from config import settings
+from database import SessionLocal
+from models import Job, Song, BroadcastItem
+from services.broadcast_service import recalc_times
+from services.job_queue import job_handler, enqueue_job, JobContext
+from services import production
+from services.streamer_service import MOSCOW_TZ, _moscow_now, _parse_time
+from services.tts_service import DEFAULT_VOICE
+
+_lookahead_task: asyncio.Task | None = None
+
+
+def upcoming_dj_song_ids(db, hours: float) -> list[int]:
+    """Song ids of unvoiced dj items airing within the next `hours` (Moscow), in airtime order."""
+    now = _moscow_now()
+    until = now + timedelta(hours=hours)
+    items = (
+        db.query(BroadcastItem)
+        .filter(
+            BroadcastItem.entity_type == "dj",
+            BroadcastItem.broadcast_date >= now.date(),
+            BroadcastItem.broadcast_date <= until.date(),
+        )
+        .order_by(BroadcastItem.broadcast_date, BroadcastItem.sort_order)
+        .all()
+    )
+    seen: set[int] = set()
+    result = []
+    for it in items:
+        start = datetime.combine(it.broadcast_date, datetime.min.time(), MOSCOW_TZ) + timedelta(seconds=_parse_time(it.start_time))
+        if start + timedelta(seconds=it.duration_seconds or 0) < now or start > until or it.entity_id in seen:
+            continue
+        seen.add(it.entity_id)
+        result.append(it.entity_id)
+    if not result:
+        return []
+    voiced = {
+        s.id for s in db.query(Song.id).filter(Song.id.in_(result), Song.dj_audio_path != "").all()
+    }
+    return [sid for sid in result if sid not in voiced]
+
+
+def _apply_real_durations(db, song_ids: list[int]) -> None:
+    """Put the voiced clip length into dj items of those songs and re-time affected days.
+    Трогаем только элементы после текущего часа: идущий час уже отрендерен и звучит,
+    и перецепляем время только от этой границы."""
+    durations = {s.id: s.dj_duration_seconds for s in db.query(Song).filter(Song.id.in_(song_ids)).all()}
+    now = _moscow_now()
+    frozen_until = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    items = (
+        db.query(BroadcastItem)
+        .filter(
+            BroadcastItem.entity_type == "dj",
+            BroadcastItem.entity_id.in_(song_ids),
+            BroadcastItem.broadcast_date >= frozen_until.date(),
+        )
+        .all()
+    )
+
+    def cutoff(d) -> int:
+        """Second of day d from which items may change."""
+        midnight = datetime.combine(d, datetime.min.time(), MOSCOW_TZ)
+        return max(0, int((frozen_until - midnight).total_seconds()))
+
+    dates = set()
+    for it in items:
+        if _parse_time(it.start_time) < cutoff(it.broadcast_date):
+            continue
+        dur = durations.get(it.entity_id)
+        if dur and abs(float(it.duration_seconds or 0) - dur) >= 1:
+            it.duration_seconds = dur
+            dates.add(it.broadcast_date)
+    for d in dates:
+        day = db.query(BroadcastItem).filter(BroadcastItem.broadcast_date == d).order_by(BroadcastItem.sort_order).all()
+        recalc_times(db, d, day, from_sec=cutoff(d))
+    db.commit()
+
+
+@job_handler("dj_lookahead")
+async def dj_lookahead(ctx: JobContext, params: dict) -> dict:
+    hours = float(params.get("hours") or settings.dj_lookahead_hours)
+    voice = params.get("voice") or DEFAULT_VOICE
+    db = SessionLocal()
+    try:
+        song_ids = upcoming_dj_song_ids(db, hours)
+        voiced, failed = [], []
+        for i, sid in enumerate(song_ids):
+            song = db.query(Song).get(sid)
+            if song is None:
+                continue
+            try:
+                if not song.dj_text:
+                    await production.write_dj_text(db, song)
+                await production.voice_dj(db, song, voice)
+                voiced.append(sid)
+            except Exception as e:
+                logging.warning(f"DJ voicing failed for song {sid}: {e}")
+                failed.append(sid)
+            ctx.progress((i + 1) / len(song_ids) * 100, f"{i + 1}/{len(song_ids)}")
+        if voiced:
+            _apply_real_durations(db, voiced)
+        return {"voiced": voiced, "failed": failed}
+    finally:
+        db.close()
+
+
+def schedule_dj_lookahead() -> Job | None:
+    """Enqueue a lookahead pass unless one is already queued or running."""
+    db = SessionLocal()
+    try:
+        pending = db.query(Job).filter(Job.kind == "dj_lookahead", Job.status.in_(["queued", "running"])).count()
+        if pending:
+            return None
+        return enqueue_job(db, "dj_lookahead", {"hours": settings.dj_lookahead_hours})
+    finally:
+        db.close()
+
+
+async def _lookahead_loop() -> None:
+    while True:
+        try:
+            schedule_dj_lookahead()
+        except Exception as e:
+            logging.warning(f"DJ lookahead scheduling failed: {e}")
+        await asyncio.sleep(max(60.0, settings.dj_lookahead_interval))
+
+
+def start_dj_lookahead() -> None:
+    """Start periodic lookahead passes in lazy mode (call from app lifespan)."""
+    global _lookahead_task
+    if settings.dj_mode != "lazy" or (_lookahead_task and not _lookahead_task.done()):
+        return
+    _lookahead_task = asyncio.create_task(_lookahead_loop())
+
+
+async def stop_dj_lookahead() -> None:
+    global _lookahead_task
+    if _lookahead_task:
+        _lookahead_task.cancel()
+        await asyncio.gather(_lookahead_task, return_exceptions=True)
+        _lookahead_task = None
@@ -0,0 +1,428 @@
+"""
+Hour-block pre-rendering of the broadcast day (settings.stream_mode = "hours").
+Каждый час сетки склеивается из MP3-фреймов элементов в один непрерывный файл
+uploads/hours/<дата>/<битрейт>/<HH>.mp3 ровно на 3600 с: паузы заполняются тихими фреймами,
+хвосты обрезаются по началу следующего элемента. Рядом <HH>.json — индекс «секунда → байт»,
+список элементов и отпечаток исходников; час перерендеривается, только если отпечаток изменился
+и час ещё не начался — слушатели уже идущего часа не получают другой файл посреди эфира.
+Уже отзвучавшие часы не трогаем — это то, что реально было в эфире: они хранятся
+archive_days дней (и не больше archive_max_gb на диске) и служат архивом для catch-up (/stream/timeshift). Позиция в архиве —
+прямая адресация: дата/час → файл, секунда → байт по индексу.
+Живой поток — последовательное чтение 24 файлов без ffmpeg; слушатель только открывает готовый
+блок и рендерит его сам лишь при отсутствии файла.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import shutil
+import threading
+from datetime import date, datetime, time as dtime, timedelta
+from pathlib import Path
+
+from config import settings
+from database import SessionLocal
+from models import BroadcastItem, Job
+from services.audio_probe import frame_header, id3_size, iter_frames, parse_frame_header, silent_frame
+from services.job_queue import job_handler, enqueue_job, JobContext
+from services.normalizer import stream_variants, variant_for
+from services.streamer_service import MOSCOW_TZ, CHUNK_SIZE, _get_audio_path, _moscow_now, collapse_silent_dj
+
+HOURS_DIR = "hours"
+HOUR = 3600
+_READ_AHEAD = 4  # кусков CHUNK_SIZE за одно чтение в потоке
+
+_render_locks: dict[tuple[date, int, str], threading.Lock] = {}  # один рендер на (дата, час, битрейт)
+_locks_guard = threading.Lock()
+_render_task: asyncio.Task | None = None
+
+
+def block_paths(d: date, hour: int, variant: str) -> tuple[Path, Path]:
+    base = Path(settings.upload_dir) / HOURS_DIR / d.isoformat() / variant
+    return base / f"{hour:02d}.mp3", base / f"{hour:02d}.json"
+
+
+def all_variants() -> list[str]:
+    return [settings.station_bitrate, *stream_variants()]
+
+
+def _hour_started(d: date, hour: int) -> bool:
+    return datetime.combine(d, dtime(hour), MOSCOW_TZ) <= _moscow_now()
+
+
+def _hour_ended(d: date, hour: int) -> bool:
+    return datetime.combine(d, dtime(hour), MOSCOW_TZ) + timedelta(seconds=HOUR) <= _moscow_now()
+
+
+def _render_lock(d: date, hour: int, variant: str) -> threading.Lock:
+    with _locks_guard:
+        return _render_locks.setdefault((d, hour, variant), threading.Lock())
+
+
+def day_items(db, d: date, variant: str) -> list[dict]:
+    """Grid items of a day with resolved files; end is clipped to the next item's start."""
+    rows = (
+        db.query(BroadcastItem)
+        .filter(BroadcastItem.broadcast_date == d, BroadcastItem.entity_type != "empty")
+        .order_by(BroadcastItem.sort_order)
+        .all()
+    )
+    paths = {id(it): _get_audio_path(db, it.entity_type, it.entity_id) for it in rows}
+    silent_dj = {it.entity_id for it in rows if it.entity_type == "dj" and paths[id(it)] is None}
+    items = []
+    for it, start in collapse_silent_dj(rows, silent_dj):  # неозвученный DJ не звучит тишиной
+        path = paths[id(it)]
+        file = variant_for(path, variant) if path else None
+        items.append({
+            "type": it.entity_type,
+            "id": it.entity_id,
+            "start": start,
+            "end": start + float(it.duration_seconds or 0),
+            "path": str(file) if file else "",
+            "pending": path is not None and file is None,  # вариант битрейта ещё не готов
+        })
+    for cur, nxt in zip(items, items[1:]):
+        cur["end"] = min(cur["end"], max(cur["start"], nxt["start"]))
+    return items
+
+
+def hour_items(items: list[dict], hour: int) -> list[dict]:
+    lo, hi = hour * HOUR, (hour + 1) * HOUR
+    return [it for it in items if it["start"] < hi and it["end"] > lo]
+
+
+def fingerprint(items: list[dict]) -> str:
+    h = hashlib.sha1()
+    for it in items:
+        try:
+            st = Path(it["path"]).stat() if it["path"] else None
+        except OSError:
+            st = None
+        sig = (it["type"], it["id"], it["start"], it["end"], it["path"], st and st.st_size, st and st.st_mtime_ns)
+        h.update(repr(sig).encode())
+    return h.hexdigest()
+
+
+def _silence_for(items: list[dict], variant: str) -> bytes:
+    """Silent frame matching the first real frame of the hour (or the station profile)."""
+    for it in items:
+        try:
+            with open(it["path"], "rb") as f:
+                head = f.read(256 * 1024)
+        except OSError:
+            continue
+        first = next(iter_frames(head, id3_size(head)), None)
+        if first is not None:
+            return silent_frame(head[first[0]:first[0] + 4])
+    bitrate = int(variant.rstrip("k"))
+    return silent_frame(frame_header(settings.station_sample_rate, bitrate, settings.station_channels))
+
+
+def render_hour(d: date, hour: int, variant: str, items: list[dict], fp: str) -> dict:
+    """Write <HH>.mp3 + <HH>.json atomically. Returns the index."""
+    mp3_path, meta_path = block_paths(d, hour, variant)
+    mp3_path.parent.mkdir(parents=True, exist_ok=True)
+    lo = hour * HOUR
+    silence = _silence_for(items, variant)
+    _, samples, rate, _ = parse_frame_header(silence, 0)
+    silence_dur = samples / rate
+    offsets: list[int] = []
+    state = {"cursor": 0.0, "pos": 0}
+    placed = []
+    tmp = mp3_path.with_suffix(".mp3.part")
+
+    with open(tmp, "wb") as out:
+        def emit(frame: bytes, dur: float) -> None:
+            while len(offsets) < HOUR and len(offsets) <= state["cursor"]:
+                offsets.append(state["pos"])
+            out.write(frame)
+            state["pos"] += len(frame)
+            state["cursor"] += dur
+
+        def pad_to(t: float) -> None:
+            while state["cursor"] + silence_dur / 2 <= t:
+                emit(silence, silence_dur)
+
+        for it in items:
+            t0, t1 = max(it["start"], lo) - lo, min(it["end"], lo + HOUR) - lo
+            pad_to(t0)
+            placed.append({"start": round(state["cursor"], 3), "type": it["type"], "id": it["id"]})
+            try:
+                data = Path(it["path"]).read_bytes() if it["path"] else b""
+            except OSError:
+                data = b""
+            skip = max(0, lo - it["start"])  # элемент начался в прошлом часе
+            in_file = 0.0
+            for pos, flen, fsamples, frate, _ in iter_frames(data, id3_size(data)):
+                fdur = fsamples / frate
+                if in_file + fdur / 2 <= skip:
+                    in_file += fdur
+                    continue
+                if state["cursor"] + fdur / 2 > t1:
+                    break
+                emit(data[pos:pos + flen], fdur)
+                in_file += fdur
+            placed[-1]["end"] = round(state["cursor"], 3)
+        pad_to(HOUR)
+    while len(offsets) < HOUR:
+        offsets.append(state["pos"])
+
+    meta = {
+        "date": d.isoformat(),
+        "hour": hour,
+        "variant": variant,
+        "fingerprint": fp,
+        "bytes": state["pos"],
+        "duration": round(state["cursor"], 3),
+        "items": placed,
+        "offsets": offsets,
+        "rendered_at": datetime.utcnow().isoformat(),
+        "aired": not _hour_ended(d, hour),  # False — дорендерен после эфира, а не снимок того, что звучало
+    }
+    tmp.replace(mp3_path)
+    meta_tmp = meta_path.with_suffix(".json.tmp")
+    meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+    meta_tmp.replace(meta_path)
+    return meta
+
+
+def load_meta(d: date, hour: int, variant: str) -> dict | None:
+    mp3_path, meta_path = block_paths(d, hour, variant)
+    if not mp3_path.exists():
+        return None
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_hour(
+    d: date, hour: int, variant: str, items: list[dict] | None = None, partial: bool = False,
+) -> tuple[Path, dict | None, bool]:
+    """Block of an hour, rendering it if missing or stale (stale — только пока час не начался).
+    Час, где у части файлов нет варианта битрейта, не рендерится (index None) — кроме partial=True:
+    слушателю блок нужен сейчас, такие элементы звучат тишиной и час перерендерится, когда
+    варианты появятся (если ещё не начался). Returns (mp3 path, index, rendered)."""
+    with _render_lock(d, hour, variant):
+        meta = load_meta(d, hour, variant)
+        if meta is not None and _hour_started(d, hour):
+            return block_paths(d, hour, variant)[0], meta, False
+        if items is None:
+            db = SessionLocal()
+            try:
+                items = day_items(db, d, variant)
+            finally:
+                db.close()
+        selected = hour_items(items, hour)
+        if not partial and any(it.get("pending") for it in selected):
+            return block_paths(d, hour, variant)[0], meta, False
+        fp = fingerprint(selected)
+        if meta is not None and meta.get("fingerprint") == fp:
+            return block_paths(d, hour, variant)[0], meta, False
+        return block_paths(d, hour, variant)[0], render_hour(d, hour, variant, selected, fp), True
+
+
+def open_hour(d: date, hour: int, variant: str) -> tuple[Path, dict]:
+    """Block for a listener: the existing file as is; rendered here only if it is missing."""
+    meta = load_meta(d, hour, variant)
+    if meta is not None:
+        return block_paths(d, hour, variant)[0], meta
+    path, meta, _ = ensure_hour(d, hour, variant, partial=True)
+    return path, meta
+
+
+def render_day(d: date, variant: str, until: datetime | None = None) -> list[int]:
+    """Re-render stale hours of a day that have not aired yet (только начинающиеся раньше until).
+    Returns rendered hours."""
+    hours = [
+        h for h in range(24)
+        if not _hour_ended(d, h) and (until is None or datetime.combine(d, dtime(h), MOSCOW_TZ) < until)
+    ]
+    if not hours:
+        return []
+    db = SessionLocal()
+    try:
+        items = day_items(db, d, variant)
+    finally:
+        db.close()
+    if not items:
+        return []
+    return [h for h in hours if ensure_hour(d, h, variant, items)[2]]
+
+
+def archive_block(d: date, hour: int, variant: str) -> tuple[Path, dict] | None:
+    """Block of an hour that has already aired, if it is still in the archive."""
+    if not 0 <= hour < 24 or not _hour_ended(d, hour):
+        return None
+    meta = load_meta(d, hour, variant)
+    return (block_paths(d, hour, variant)[0], meta) if meta else None
+
+
+def archived_hours(d: date, variant: str) -> list[dict]:
+    """Aired hours of a day available in the archive, without the byte index."""
+    result = []
+    for hour in range(24):
+        found = archive_block(d, hour, variant)
+        if found:
+            meta = found[1]
+            result.append({k: meta.get(k) for k in ("hour", "duration", "bytes", "items", "aired")})
+    return result
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def pinned_bytes() -> int:
+    """Upper bound of blocks prune_blocks may not delete: весь сегодняшний день и
+    render_ahead_hours часов завтра во всех битрейтах."""
+    kbps = sum(int(v.rstrip("k")) for v in all_variants())
+    return (24 + max(0, settings.render_ahead_hours)) * HOUR * kbps * 125
+
+
+def check_archive_budget() -> None:
+    """Warn if ARCHIVE_MAX_GB cannot hold even the blocks that are never pruned."""
+    max_bytes = int(settings.archive_max_gb * 1024 ** 3)
+    need = pinned_bytes()
+    if 0 < max_bytes < need:
+        logging.warning(
+            f"ARCHIVE_MAX_GB={settings.archive_max_gb} is below what today's and pre-rendered blocks need "
+            f"(up to {need / 1024 ** 3:.1f} GB): the cap will be exceeded and no past days will be kept"
+        )
+
+
+def prune_blocks(keep_days: int, max_bytes: int = 0) -> int:
+    """Delete block directories older than keep_days, then the oldest past days while the total
+    exceeds max_bytes. Сегодня и будущие дни не трогаем: прошлым дням остаётся max_bytes минус их
+    размер. Returns removed days."""
+    root = Path(settings.upload_dir) / HOURS_DIR
+    if not root.is_dir():
+        return 0
+    today = _moscow_now().date()
+    cutoff = today - timedelta(days=keep_days)
+    days: list[tuple[date, Path]] = []
+    for day_dir in root.iterdir():
+        try:
+            days.append((date.fromisoformat(day_dir.name), day_dir))
+        except ValueError:
+            continue
+    days.sort()
+    removed = 0
+    kept = []
+    for d, day_dir in days:
+        if d < cutoff:
+            shutil.rmtree(day_dir, ignore_errors=True)
+            removed += 1
+        else:
+            kept.append((d, day_dir))
+    if max_bytes > 0:
+        past = [(d, day_dir, _dir_size(day_dir)) for d, day_dir in kept if d < today]
+        pinned = sum(_dir_size(day_dir) for d, day_dir in kept if d >= today)
+        budget = max_bytes - pinned
+        if budget < 0:
+            logging.warning(
+                f"Hour blocks of today and later take {pinned / 1024 ** 3:.1f} GB, "
+                f"more than ARCHIVE_MAX_GB={settings.archive_max_gb}"
+            )
+        total = sum(size for _, _, size in past)
+        for d, day_dir, size in past:
+            if total <= budget:
+                break
+            shutil.rmtree(day_dir, ignore_errors=True)
+            total -= size
+            removed += 1
+            cutoff = d + timedelta(days=1)
+    with _locks_guard:
+        for key in [k for k in _render_locks if k[0] < cutoff]:
+            del _render_locks[key]
+    return removed
+
+
+@job_handler("hour_render")
+async def hour_render(ctx: JobContext, params: dict) -> dict:
+    now = _moscow_now()
+    until = None
+    if params.get("date"):
+        dates = [date.fromisoformat(params["date"])]
+    else:
+        # только ближайшие render_ahead_hours часов: остальное дорендерится следующими проходами
+        until = now + timedelta(hours=max(1, settings.render_ahead_hours))
+        dates = [now.date() + timedelta(days=i) for i in range((until.date() - now.date()).days + 1)]
+    variants = [params["variant"]] if params.get("variant") else all_variants()
+    rendered = {}
+    for i, d in enumerate(dates):
+        for v in variants:
+            hours = await asyncio.to_thread(render_day, d, v, until)
+            if hours:
+                rendered[f"{d.isoformat()}/{v}"] = hours
+        ctx.progress((i + 1) / len(dates) * 100, f"{d.isoformat()}: готово")
+    removed = await asyncio.to_thread(prune_blocks, settings.archive_days, int(settings.archive_max_gb * 1024 ** 3))
+    return {"rendered": rendered, "pruned_days": removed}
+
+
+def schedule_hour_render(d: date | None = None) -> Job | None:
+    """Enqueue a render pass (next render_ahead_hours hours, or one whole date) unless one is already queued or running."""
+    db = SessionLocal()
+    try:
+        if db.query(Job).filter(Job.kind == "hour_render", Job.status.in_(["queued", "running"])).count():
+            return None
+        return enqueue_job(db, "hour_render", {"date": d.isoformat()} if d else {})
+    finally:
+        db.close()
+
+
+async def stream_hour_blocks(d: date, variant: str, sync_to_moscow: bool = True, start_sec: int | None = None):
+    """Async generator: MP3 bytes from hour blocks, seeking via the index; rolls over to the next day.
+    start_sec — секунда дня d, с которой начать (time-shift из архива)."""
+    day, hour, sec = d, 0, 0
+    if start_sec is not None:
+        hour, sec = divmod(max(0, min(start_sec, 24 * HOUR - 1)), HOUR)
+    elif sync_to_moscow:
+        now = _moscow_now()
+        hour, sec = now.hour, now.minute * 60 + now.second
+    while True:
+        try:
+            path, meta = await asyncio.to_thread(open_hour, day, hour, variant)
+        except Exception as e:
+            logging.warning(f"Hour block {day} {hour:02d} ({variant}) failed: {e}")
+            return
+        f = await asyncio.to_thread(open, path, "rb")  # диск — в потоке, не в event loop
+        try:
+            await asyncio.to_thread(f.seek, meta["offsets"][sec] if sec else 0)
+            while data := await asyncio.to_thread(f.read, _READ_AHEAD * CHUNK_SIZE):
+                for i in range(0, len(data), CHUNK_SIZE):
+                    yield data[i:i + CHUNK_SIZE]
+        finally:
+            f.close()
+        sec = 0
+        hour += 1
+        if hour == 24:
+            day, hour = day + timedelta(days=1), 0
+
+
+async def _render_loop() -> None:
+    while True:
+        try:
+            schedule_hour_render()
+        except Exception as e:
+            logging.warning(f"Hour render scheduling failed: {e}")
+        await asyncio.sleep(max(60.0, settings.hour_render_interval))
+
+
+def start_hour_renderer() -> None:
+    """Start periodic pre-rendering in hours mode (call from app lifespan)."""
+    global _render_task
+    if settings.stream_mode != "hours" or settings.hour_render_interval <= 0:
+        return
+    if _render_task and not _render_task.done():
+        return
+    check_archive_budget()
+    _render_task = asyncio.create_task(_render_loop())
+
+
+async def stop_hour_renderer() -> None:
+    global _render_task
+    if _render_task:
+        _render_task.cancel()
+        await asyncio.gather(_render_task, return_exceptions=True)
+        _render_task = None
@@ -0,0 +1,183 @@
+"""
+Icecast/SHOUTcast source-client output (settings.icecast_url).
+Эфир кодируется/читается один раз и отправляется на mount Icecast (HTTP PUT, Icecast ≥ 2.4.0,
+или устаревший SOURCE); раздачей слушателям занимается Icecast. Название трека — из таймлайна
+по позиции отправленного аудио, при смене уходит в /admin/metadata?mode=updinfo.
+Обрыв — переподключение с экспоненциальной паузой до icecast_reconnect_max и новым стартом
+с живого края. При нескольких воркерах uvicorn источник держит только один (flock icecast.lock).
+"""
+import asyncio
+import base64
+import logging
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+from services.icy import schedule_title
+from services.listener_buffer import _FramePacer, paced
+from services.live_ring import host_lock, live_source, release_host_lock
+from services.streamer_service import _moscow_now
+
+_CONNECT_TIMEOUT = 10.0
+_STABLE_SECONDS = 60.0  # соединение прожило столько — пауза переподключения сбрасывается
+_LOCK_RETRY = 5.0
+
+_task: asyncio.Task | None = None
+_state = {"connected": False, "title": "", "last_error": ""}
+_stats = Counter(connects=0, failures=0, bytes=0, metadata_updates=0)
+
+
+class IcecastError(RuntimeError):
+    pass
+
+
+def _target() -> tuple[str, int, str, bool]:
+    url = urlsplit(settings.icecast_url)
+    if url.scheme not in ("http", "https") or not url.hostname or not url.path.strip("/"):
+        raise ValueError(f"ICECAST_URL должен быть вида http://host:8000/mount.mp3: {settings.icecast_url!r}")
+    secure = url.scheme == "https"
+    return url.hostname, url.port or (443 if secure else 80), url.path, secure
+
+
+def _auth() -> str:
+    raw = f"{settings.icecast_user}:{settings.icecast_password}".encode()
+    return "Basic " + base64.b64encode(raw).decode()
+
+
+def _request(host: str, port: int, mount: str) -> bytes:
+    put = settings.icecast_protocol != "source"
+    lines = [
+        f"PUT {mount} HTTP/1.1" if put else f"SOURCE {mount} HTTP/1.0",
+        f"Host: {host}:{port}",
+        f"Authorization: {_auth()}",
+        "User-Agent: NAVO-Radio/1.0",
+        "Content-Type: audio/mpeg",
+        f"Ice-Name: {settings.station_name}",
+        f"Ice-Bitrate: {settings.station_bitrate.rstrip('k')}",
+        f"Ice-Public: {1 if settings.icecast_public else 0}",
+        f"Ice-Audio-Info: bitrate={settings.station_bitrate.rstrip('k')};samplerate={settings.station_sample_rate};"
+        f"channels={settings.station_channels}",
+    ]
+    if put:
+        lines.append("Expect: 100-continue")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+async def _handshake(reader: asyncio.StreamReader) -> None:
+    """Read the server's answer to the source request: 100 Continue / 200 OK, иначе IcecastError."""
+    status = await asyncio.wait_for(reader.readline(), _CONNECT_TIMEOUT)
+    while (await asyncio.wait_for(reader.readline(), _CONNECT_TIMEOUT)).strip():
+        pass  # заголовки ответа
+    parts = status.decode("latin-1").split(None, 2)
+    code = parts[1] if len(parts) > 1 else ""
+    if code not in ("100", "200"):
+        raise IcecastError(f"Icecast отказал: {status.decode('latin-1').strip() or 'нет ответа'}")
+
+
+async def _update_metadata(client: httpx.AsyncClient, host: str, port: int, mount: str, secure: bool, title: str) -> None:
+    scheme = "https" if secure else "http"
+    try:
+        resp = await client.get(
+            f"{scheme}://{host}:{port}/admin/metadata",
+            params={"mount": mount, "mode": "updinfo", "song": title, "charset": "UTF-8"},
+            headers={"Authorization": _auth()},
+        )
+        resp.raise_for_status()
+        _stats["metadata_updates"] += 1
+    except Exception as e:
+        logging.warning(f"Icecast metadata update failed: {e}")
+
+
+async def _push_once() -> None:
+    """One source connection: handshake, then paced live audio until an error."""
+    host, port, mount, secure = _target()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port, ssl=secure or None), _CONNECT_TIMEOUT
+    )
+    source = None
+    try:
+        writer.write(_request(host, port, mount))
+        await writer.drain()
+        await _handshake(reader)
+        _state.update(connected=True, title="")  # у нового подключения mount без названия
+        _stats["connects"] += 1
+        logging.info(f"Icecast source connected: {settings.icecast_url}")
+
+        now = _moscow_now()
+        today, start_sec = now.date(), now.hour * 3600 + now.minute * 60 + now.second
+        pacer = _FramePacer()
+        played = 0.0
+        metadata: asyncio.Task | None = None
+        source = paced(live_source(settings.station_bitrate))
+        async with httpx.AsyncClient(timeout=_CONNECT_TIMEOUT) as client:
+            try:
+                async for chunk in source:
+                    title = await schedule_title(today, start_sec + played)
+                    if title != _state["title"] and (metadata is None or metadata.done()):
+                        _state["title"] = title  # в фоне — медленный /admin/metadata не задерживает аудио
+                        metadata = asyncio.create_task(_update_metadata(client, host, port, mount, secure, title))
+                    writer.write(chunk)
+                    await asyncio.wait_for(writer.drain(), settings.icecast_send_timeout)
+                    played += pacer.feed(chunk)
+                    _stats["bytes"] += len(chunk)
+            finally:
+                if metadata is not None:
+                    metadata.cancel()
+                    await asyncio.gather(metadata, return_exceptions=True)
+        raise IcecastError("Источник эфира закончился (нет сетки?)")
+    finally:
+        _state["connected"] = False
+        if source is not None:
+            await source.aclose()
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), _CONNECT_TIMEOUT)
+        except Exception:
+            pass
+
+
+async def _output_loop() -> None:
+    while (fd := host_lock("icecast")) is None:
+        await asyncio.sleep(_LOCK_RETRY)  # источник уже держит другой воркер
+    delay = 1.0
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                await _push_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _state["last_error"] = str(e)
+                _stats["failures"] += 1
+                logging.warning(f"Icecast source: {e}")
+            if time.monotonic() - started > _STABLE_SECONDS:
+                delay = 1.0
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.icecast_reconnect_max)
+    finally:
+        release_host_lock(fd)
+
+
+def icecast_stats() -> dict:
+    return {"url": settings.icecast_url, "running": bool(_task and not _task.done()), **_state, **_stats}
+
+
+def start_icecast_output() -> None:
+    """Start pushing the broadcast to Icecast if ICECAST_URL is set (call from app lifespan)."""
+    global _task
+    if not settings.icecast_url or (_task and not _task.done()):
+        return
+    _target()  # неверный URL — ошибка при старте, а не в цикле переподключений
+    _task = asyncio.create_task(_output_loop())
+
+
+async def stop_icecast_output() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,77 @@
+"""
+In-band ICY metadata (SHOUTcast/Icecast): клиент шлёт Icy-MetaData: 1, сервер после каждых
+icy_metaint байт аудио вставляет блок StreamTitle='...';.
+Позиция в эфире считается по длительности отданных MP3-фреймов от секунды старта, название —
+из кэшированного таймлайна (services.timeline) или из апстрима в режиме ретранслятора, так что смена трека доходит до плеера
+внутри потока, без опросов /broadcast/now-playing и без запросов к БД на слушателя.
+"""
+import asyncio
+from datetime import date, timedelta
+
+from fastapi import Request
+
+from config import settings
+from services.listener_buffer import _FramePacer
+from services.timeline import is_compiled, item_at, timeline
+
+DAY = 24 * 3600
+_EMPTY_BLOCK = b"\x00"
+
+
+def wants_icy(request: Request) -> bool:
+    return request.headers.get("icy-metadata", "").strip() == "1" and settings.icy_metaint > 0
+
+
+def icy_headers(variant: str | None = None) -> dict:
+    return {
+        "icy-metaint": str(settings.icy_metaint),
+        "icy-name": settings.station_name,
+        "icy-br": (variant or settings.station_bitrate).rstrip("k"),
+        "icy-pub": "0",
+    }
+
+
+def icy_block(title: str) -> bytes:
+    """Metadata block: length byte (×16) + StreamTitle padded with zeros."""
+    room = 255 * 16 - len("StreamTitle='';")
+    # обрезка по байтам, но без половины многобайтного символа
+    title = title.replace(chr(39), "’").encode("utf-8")[:room].decode("utf-8", "ignore")
+    text = f"StreamTitle='{title}';".encode("utf-8")
+    padded = text + b"\x00" * (-len(text) % 16)
+    return bytes([len(padded) // 16]) + padded
+
+
+async def schedule_title(d: date, sec: float) -> str:
+    """Title airing at second sec of day d by the grid (sec может выходить за сутки)."""
+    d, sec = d + timedelta(days=int(sec // DAY)), int(sec % DAY)
+    if not is_compiled(d):
+        await asyncio.to_thread(timeline, d)  # сборка из БД — вне event loop
+    item = item_at(d, sec)
+    return item["title"] if item else ""
+
+
+async def icy_stream(body, title_at):
+    """Async generator: body bytes with a metadata block after every icy_metaint bytes.
+    title_at(seconds played) -> title: по сетке (schedule_title) или из ретранслируемого потока.
+    Блок с текстом — только когда название сменилось, иначе пустой (один нулевой байт)."""
+    metaint = settings.icy_metaint
+    pacer = _FramePacer()
+    played = 0.0
+    sent_title = None
+    left = metaint
+    try:
+        async for chunk in body:
+            out = []
+            while chunk:
+                part, chunk = chunk[:left], chunk[left:]
+                out.append(part)
+                played += pacer.feed(part)
+                left -= len(part)
+                if left == 0:
+                    title = await title_at(played)
+                    out.append(_EMPTY_BLOCK if title == sent_title else icy_block(title))
+                    sent_title = title
+                    left = metaint
+            yield b"".join(out)
+    finally:
+        await body.aclose()
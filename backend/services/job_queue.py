@@ -0,0 +1,335 @@
+"""
+Persistent background job queue (SQLite, таблица jobs) with an in-process worker pool.
+Задачи переживают рестарт: running-задача арендована процессом (owner + heartbeat_at); если
+владелец не продлевал аренду job_lease_seconds, задачу возвращает в очередь любой процесс —
+API-воркеры, worker.py и соседние uvicorn-воркеры не перехватывают чужие живые задачи.
+Handlers register with @job_handler("kind") and receive (ctx, params).
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import update
+
+from config import settings
+from database import SessionLocal
+from models import Job
+
+FINAL_STATUSES = {"done", "failed", "cancelled"}
+
+_handlers: dict[str, Callable[["JobContext", dict], Awaitable[dict | None]]] = {}
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_workers: list[asyncio.Task] = []
+_running: dict[int, asyncio.Task] = {}  # job_id -> задача, которая его выполняет
+_background: set[asyncio.Task] = set()  # запись прогресса в потоке
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _call_in_loop(fn) -> None:
+    """Routes run in the threadpool — asyncio objects are touched only via the workers' loop."""
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(fn)
+
+
+class JobContext:
+    """Passed to handlers: progress reporting and cooperative cancellation."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._lock = threading.Lock()
+        self._pending: tuple[float | None, str] | None = None  # ещё не записанный прогресс
+        self._flushing = False
+        self._cancelled = False
+
+    def progress(self, percent: float | None, message: str = "") -> None:
+        """Save progress (None — keep percent); raises JobCancelled if cancellation was requested.
+        Из event loop запись в БД уходит в поток (отмена видна со следующего вызова), из потока — сразу."""
+        if self._cancelled:
+            raise JobCancelled()
+        try:
+            asyncio.get_running_loop()
+            in_loop = True
+        except RuntimeError:
+            in_loop = False
+        with self._lock:
+            old_percent, old_message = self._pending or (None, "")
+            self._pending = (old_percent if percent is None else percent, message or old_message)
+            if in_loop and self._flushing:
+                return  # идущая запись подхватит и это значение
+            self._flushing = True
+        if in_loop:
+            task = asyncio.create_task(asyncio.to_thread(self._flush))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+            return
+        self._flush()
+        if self._cancelled:
+            raise JobCancelled()
+
+    def _flush(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    pending, self._pending = self._pending, None
+                    if pending is None:
+                        self._flushing = False
+                        return
+                self._write(*pending)
+        except Exception as e:
+            with self._lock:
+                self._flushing = False
+            logging.warning(f"Job {self.job_id} progress save failed: {e}")
+
+    def _write(self, percent: float | None, message: str) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(Job).get(self.job_id)
+            if job is None or job.cancel_requested:
+                self._cancelled = True
+                return
+            if job.status != "running" or job.owner != _owner():
+                return  # уже завершена (или аренду забрал другой процесс)
+            if percent is not None:
+                job.progress = max(0.0, min(100.0, float(percent)))
+            if message:
+                job.message = message[:512]
+            db.commit()
+        finally:
+            db.close()
+
+
+def job_handler(kind: str):
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": json.loads(job.params_json or "{}"),
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "result": json.loads(job.result_json) if job.result_json else None,
+        "error": job.error or None,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def enqueue_job(db, kind: str, params: dict | None = None) -> Job:
+    """Insert a queued job and wake a worker. Raises ValueError for unknown kind."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(kind=kind, params_json=json.dumps(params or {}, ensure_ascii=False, default=str))
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if _wakeup is not None:
+        _call_in_loop(_wakeup.set)
+    return job
+
+
+def cancel_job(db, job_id: int) -> Job | None:
+    """Queued → cancelled at once; running → flag + task cancel."""
+    job = db.query(Job).get(job_id)
+    if job is None or job.status in FINAL_STATUSES:
+        return job
+    job.cancel_requested = 1
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+    task = _running.get(job_id)
+    if task is not None:
+        _call_in_loop(task.cancel)
+    db.refresh(job)
+    return job
+
+
+def _claim_next() -> int | None:
+    """Atomically move the oldest queued job to running under this process's lease. Safe across processes."""
+    db = SessionLocal()
+    try:
+        while True:
+            job = db.query(Job).filter(Job.status == "queued").order_by(Job.id).first()
+            if job is None:
+                return None
+            now = datetime.utcnow()
+            res = db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == "queued")
+                .values(
+                    status="running", started_at=now, attempts=Job.attempts + 1, owner=_owner(), heartbeat_at=now,
+                )
+            )
+            db.commit()
+            if res.rowcount == 1:
+                return job.id
+    finally:
+        db.close()
+
+
+def _finish(job_id: int, status: str, result: dict | None = None, error: str = "") -> None:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).get(job_id)
+        if job is None or job.owner != _owner():
+            return  # аренда истекла и задачу забрал другой процесс
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        if status == "done":
+            job.progress = 100
+        if result is not None:
+            job.result_json = json.dumps(result, ensure_ascii=False, default=str)
+        job.error = error
+        db.commit()
+    finally:
+        db.close()
+
+
+def _load_job(job_id: int) -> tuple[str, dict]:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).get(job_id)
+        return job.kind, json.loads(job.params_json or "{}")
+    finally:
+        db.close()
+
+
+async def _run_job(job_id: int) -> None:
+    kind, params = await asyncio.to_thread(_load_job, job_id)
+    handler = _handlers.get(kind)
+    if handler is None:
+        await asyncio.to_thread(_finish, job_id, "failed", error=f"Unknown job kind: {kind}")
+        return
+    try:
+        result = await handler(JobContext(job_id), params)
+        status, error = "done", ""
+    except (JobCancelled, asyncio.CancelledError):
+        result, status, error = None, "cancelled", ""
+    except Exception as e:
+        logging.exception(f"Job {job_id} ({kind}) failed")
+        result, status, error = None, "failed", str(e)
+    if status == "cancelled":
+        _finish(job_id, status)  # без await: повторная отмена задачи не должна пропустить запись статуса
+    else:
+        await asyncio.to_thread(_finish, job_id, status, result, error)
+
+
+async def _worker_loop() -> None:
+    while True:
+        job_id = await asyncio.to_thread(_claim_next)  # запись в SQLite — не в event loop
+        if job_id is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.job_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = asyncio.create_task(_run_job(job_id))
+        _running[job_id] = task
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Останавливается сам воркер (shutdown) — задачу оставляем для resume
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            _requeue(job_id)
+            raise
+        finally:
+            _running.pop(job_id, None)
+
+
+def _requeue(job_id: int) -> None:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).get(job_id)
+        if job is not None and job.owner == _owner() and not job.cancel_requested:
+            job.status = "queued"
+            job.finished_at = None
+            job.owner = ""
+            db.commit()
+    finally:
+        db.close()
+
+
+def _renew_leases(job_ids: list[int]) -> None:
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id.in_(job_ids), Job.owner == _owner(), Job.status == "running").update(
+            {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _recover_expired() -> int:
+    """Running jobs whose owner stopped renewing the lease (процесс упал) go back to the queue."""
+    expired = datetime.utcnow() - timedelta(seconds=settings.job_lease_seconds)
+    db = SessionLocal()
+    try:
+        count = (
+            db.query(Job)
+            .filter(Job.status == "running", (Job.heartbeat_at.is_(None)) | (Job.heartbeat_at < expired))
+            .update({Job.status: "queued", Job.started_at: None, Job.owner: ""}, synchronize_session=False)
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+async def _lease_loop() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(_renew_leases, list(_running))
+            if await asyncio.to_thread(_recover_expired):
+                _wakeup.set()
+        except Exception as e:
+            logging.warning(f"Job lease renewal failed: {e}")
+        await asyncio.sleep(settings.job_lease_seconds / 3)
+
+
+def start_job_workers() -> None:
+    """Start the worker pool (call from app lifespan)."""
+    global _loop, _wakeup
+    if _workers or settings.job_workers <= 0:
+        return
+    import services.jobs  # noqa: F401 — регистрирует обработчики
+
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _workers.append(asyncio.create_task(_lease_loop()))  # первым проходом вернёт задачи упавших процессов
+    for _ in range(settings.job_workers):
+        _workers.append(asyncio.create_task(_worker_loop()))
+
+
+async def stop_job_workers() -> None:
+    global _loop
+    for w in _workers:
+        w.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _loop = None
@@ -0,0 +1,128 @@
+"""
+Background job handlers. Each gets (ctx, params) and returns a JSON-able result.
+"""
+import asyncio
+from datetime import date
+
+from database import SessionLocal
+from models import Song, News, Weather
+from services.jamendo import JamendoService
+from services.job_queue import job_handler, JobContext
+from services import production
+from services.media_store import migrate_legacy_media
+from services.tts_service import DEFAULT_VOICE
+import services.scheduler  # noqa: F401 — регистрирует daily_production
+import services.dj_voicing  # noqa: F401 — регистрирует dj_lookahead
+import services.media_gc  # noqa: F401 — регистрирует media_gc
+import services.library_import  # noqa: F401 — регистрирует library_import
+import services.normalizer  # noqa: F401 — регистрирует media_normalize
+import services.hour_blocks  # noqa: F401 — регистрирует hour_render
+
+
+def _parse_date(value: str | None) -> date | None:
+    return date.fromisoformat(value) if value else None
+
+
+@job_handler("jamendo_import")
+async def jamendo_import(ctx: JobContext, params: dict) -> dict:
+    tracks = await JamendoService.search_and_get_tracks(limit_per_query=int(params.get("limit_per_query", 20)))
+    if not tracks:
+        raise ValueError("Jamendo API не вернул треки. Проверьте запрос или попробуйте позже.")
+    created = []
+    db = SessionLocal()
+    try:
+        for i, t in enumerate(tracks):
+            song = await production.import_jamendo_track(db, t)
+            if song:
+                created.append({"id": song.id, "title": song.title, "artist": song.artist})
+            ctx.progress((i + 1) / len(tracks) * 100, f"{i + 1}/{len(tracks)}, создано {len(created)}")
+    finally:
+        db.close()
+    return {"created": len(created), "songs": created}
+
+
+@job_handler("dj_batch")
+async def dj_batch(ctx: JobContext, params: dict) -> dict:
+    """DJ text for song_ids; with voice — also TTS."""
+    song_ids = [int(x) for x in params.get("song_ids", [])]
+    voice = params.get("voice")
+    results = []
+    db = SessionLocal()
+    try:
+        for i, sid in enumerate(song_ids):
+            song = db.query(Song).get(sid)
+            if song:
+                try:
+                    text = await production.write_dj_text(db, song)
+                    rec = {"id": sid, "dj_text": text}
+                    if voice:
+                        rec["audio_path"] = await production.voice_dj(db, song, voice)
+                    results.append(rec)
+                except Exception as e:
+                    results.append({"id": sid, "error": str(e)})
+            ctx.progress((i + 1) / len(song_ids) * 100, f"{i + 1}/{len(song_ids)}")
+    finally:
+        db.close()
+    return {"results": results}
+
+
+@job_handler("tts")
+async def tts(ctx: JobContext, params: dict) -> dict:
+    """Voice an existing text: entity_type = dj | news | weather."""
+    entity_type = params.get("entity_type")
+    entity_id = int(params.get("entity_id", 0))
+    voice = params.get("voice") or DEFAULT_VOICE
+    db = SessionLocal()
+    try:
+        if entity_type == "dj":
+            song = db.query(Song).get(entity_id)
+            if not song or not song.dj_text:
+                raise ValueError("Song or DJ text not found")
+            path = await production.voice_dj(db, song, voice)
+        elif entity_type == "news":
+            n = db.query(News).get(entity_id)
+            if not n or not n.text:
+                raise ValueError("News or text not found")
+            path = await production.voice_news(db, n, voice)
+        elif entity_type == "weather":
+            w = db.query(Weather).get(entity_id)
+            if not w or not w.text:
+                raise ValueError("Weather or text not found")
+            path = await production.voice_weather(db, w, voice)
+        else:
+            raise ValueError(f"Unknown entity type: {entity_type}")
+    finally:
+        db.close()
+    return {"audio_path": path}
+
+
+@job_handler("news_generate")
+async def news_generate(ctx: JobContext, params: dict) -> dict:
+    db = SessionLocal()
+    try:
+        n = await production.produce_news(db, _parse_date(params.get("date")), params.get("voice"))
+        return {"id": n.id, "audio_path": n.audio_path}
+    finally:
+        db.close()
+
+
+@job_handler("weather_generate")
+async def weather_generate(ctx: JobContext, params: dict) -> dict:
+    db = SessionLocal()
+    try:
+        w = await production.produce_weather(db, _parse_date(params.get("date")), params.get("voice"))
+        return {"id": w.id, "audio_path": w.audio_path}
+    finally:
+        db.close()
+
+
+@job_handler("media_migrate")
+async def media_migrate(ctx: JobContext, params: dict) -> dict:
+    """Перенос старых файлов (uploads/songs, dj, ...) в content-addressed хранилище.
+    sha256 и копирование всей библиотеки — в потоке, не в event loop."""
+
+    def run() -> dict:
+        with SessionLocal() as db:
+            return migrate_legacy_media(db, ctx.progress)
+
+    return await asyncio.to_thread(run)
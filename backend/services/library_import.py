@@ -0,0 +1,128 @@
+"""
+Bulk import of a local MP3 library.
+Теги (ID3 title/artist/album), длительность и sha256 читаются в пуле процессов,
+песни вставляются пачками по library_import_batch, файлы уходят в media store.
+Уже импортированные файлы (тот же sha256) пропускаются — импорт можно перезапускать.
+С move=True исходник удаляется только после commit пачки, где создана его песня: отмена или
+ошибка посреди пачки оставляет исходники на месте (скопированные в store файлы без строк уберёт GC).
+"""
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from config import settings
+from database import SessionLocal
+from models import Song
+from services.audio_probe import scan_file
+from services.job_queue import job_handler, JobContext
+from services.media_store import assign_media, digest_from_path, store_file
+
+AUDIO_EXTS = {".mp3"}
+
+
+def find_audio_files(directory: Path) -> list[str]:
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if Path(name).suffix.lower() in AUDIO_EXTS:
+                files.append(os.path.join(root, name))
+    files.sort()
+    return files
+
+
+def _scan(pool: ProcessPoolExecutor, files: list[str], window: int):
+    """scan_file results in order, with at most window files submitted ahead (отмена не ждёт всю библиотеку)."""
+    queued: deque = deque()
+    it = iter(files)
+    for path in it:
+        queued.append(pool.submit(scan_file, path))
+        if len(queued) >= window:
+            break
+    while queued:
+        info = queued.popleft().result()
+        for path in it:
+            queued.append(pool.submit(scan_file, path))
+            break
+        yield info
+
+
+def _title_artist(info: dict) -> tuple[str, str]:
+    """Tags first; otherwise «Artist - Title» from the file name."""
+    tags = info.get("tags") or {}
+    stem = Path(info["path"]).stem
+    artist, sep, title = stem.partition(" - ")
+    if not sep:
+        artist, title = "", stem
+    return (tags.get("title") or title.strip())[:512], (tags.get("artist") or artist.strip() or "Unknown")[:512]
+
+
+def import_library(directory: Path, move: bool = False, ctx: JobContext | None = None) -> dict:
+    files = find_audio_files(directory)
+    total = len(files)
+    if ctx:
+        ctx.progress(0, f"Найдено файлов: {total}")
+    workers = settings.library_scan_workers or os.cpu_count() or 1
+    batch = max(1, settings.library_import_batch)
+    created, skipped, errors = 0, 0, []
+
+    db = SessionLocal()
+    try:
+        known = {d for (p,) in db.query(Song.file_path).all() if (d := digest_from_path(p))}
+        pending: list[Song] = []
+        sources: list[Path] = []  # исходники пачки — удаляются после её commit при move=True
+        # spawn: fork из многопоточного процесса API небезопасен
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            for i, info in enumerate(_scan(pool, files, workers * 4), 1):
+                stored = ""
+                if info.get("error") or not info.get("duration"):
+                    errors.append({"path": info["path"], "error": info.get("error") or "не MP3 или пустой файл"})
+                elif info["sha256"] in known:
+                    skipped += 1
+                else:
+                    try:
+                        stored = store_file(db, Path(info["path"]), move=False, digest=info["sha256"])
+                    except OSError as e:
+                        errors.append({"path": info["path"], "error": str(e)})
+                if stored:
+                    known.add(info["sha256"])
+                    title, artist = _title_artist(info)
+                    song = Song(
+                        title=title,
+                        artist=artist,
+                        album=(info["tags"].get("album") or "")[:512],
+                        file_path="",
+                        duration_seconds=info["duration"],
+                    )
+                    assign_media(db, song, "file_path", stored)
+                    pending.append(song)
+                    sources.append(Path(info["path"]))
+                if len(pending) >= batch or (pending and i == total):
+                    db.add_all(pending)
+                    db.commit()
+                    created += len(pending)
+                    pending = []
+                    if move:
+                        for src in sources:
+                            src.unlink(missing_ok=True)
+                    sources = []
+                if ctx and (i % batch == 0 or i == total):
+                    ctx.progress(i / total * 100, f"{i}/{total}, создано {created}, пропущено {skipped}")
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)  # отмена / ошибка — недоставленные файлы не сканируем
+            raise
+        pool.shutdown()
+    finally:
+        db.close()
+    return {"found": total, "created": created, "skipped": skipped, "failed": len(errors), "errors": errors[:100]}
+
+
+@job_handler("library_import")
+async def library_import(ctx: JobContext, params: dict) -> dict:
+    directory = Path(params.get("directory") or "")
+    if not directory.is_dir():
+        raise ValueError(f"Каталог не найден: {directory}")
+    return await asyncio.to_thread(import_library, directory, bool(params.get("move")), ctx)
@@ -0,0 +1,138 @@
+"""
+Bounded per-listener buffer between the broadcast source and the HTTP response.
+Источник читается в темпе эфира (по длительности MP3-фреймов, с предбуфером
+stream_prebuffer_seconds) в очередь на stream_buffer_seconds. Если слушатель не успевает:
+  skip     — старые куски выбрасываются, слушатель догоняет живой эфир;
+  throttle — источник ждёт слушателя (отстаёт от эфира, память та же);
+  drop     — слушатель отключается, если очередь непрерывно полна дольше stream_stall_timeout
+             (отставание считается по самому слушателю — медленный источник его не вызывает).
+При любой политике источник (файл / ffmpeg) закрывается, если слушатель не забирал данные
+stream_stall_timeout секунд, — зависший клиент не держит ресурсы и никого не тормозит.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+
+from config import settings
+from services.audio_probe import parse_frame_header
+from services.streamer_service import CHUNK_SIZE
+
+POLICIES = ("skip", "throttle", "drop")
+
+_stats = Counter(skipped_bytes=0, dropped=0, stalled=0)
+_END = None
+
+
+class _FramePacer:
+    """Counts seconds of audio in a byte stream of MP3 frames (остаток неполного фрейма переносится)."""
+
+    def __init__(self):
+        self._rest = b""
+
+    def feed(self, chunk: bytes) -> float:
+        buf = self._rest + chunk
+        pos, n, seconds = 0, len(buf), 0.0
+        while pos + 4 <= n:
+            hdr = parse_frame_header(buf, pos)
+            if hdr is None or hdr[0] <= 0:
+                pos += 1
+                continue
+            if pos + hdr[0] > n:
+                break
+            seconds += hdr[1] / hdr[2]
+            pos += hdr[0]
+        self._rest = buf[pos:]
+        return seconds
+
+
+async def paced(source, lead: float = 0.0):
+    """Async generator: source bytes released no faster than real time (+ lead seconds ahead)."""
+    pacer = _FramePacer()
+    started = time.monotonic()
+    sent = 0.0
+    try:
+        async for chunk in source:
+            yield chunk
+            sent += pacer.feed(chunk)
+            ahead = sent - (time.monotonic() - started) - lead
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+    finally:
+        await source.aclose()
+
+
+def _queue_chunks(variant: str | None = None) -> int:
+    byterate = int((variant or settings.station_bitrate).rstrip("k")) * 125
+    return max(2, math.ceil(settings.stream_buffer_seconds * byterate / CHUNK_SIZE))
+
+
+async def buffered_stream(source, policy: str | None = None, variant: str | None = None):
+    """Async generator: source bytes paced to real time through a bounded queue.
+    variant — битрейт потока слушателя: от него зависит, сколько кусков вмещают stream_buffer_seconds."""
+    policy = policy if policy in POLICIES else settings.stream_slow_policy
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_queue_chunks(variant))
+    state = {"busy_since": None}  # когда слушатель взял кусок и ещё не вернулся за следующим
+    full_since = None  # с какого момента очередь полна без перерыва — слушатель не успевает
+
+    async def produce() -> None:
+        nonlocal full_since
+        pacer = _FramePacer()
+        started = time.monotonic()
+        sent = 0.0
+        try:
+            async for chunk in source:
+                sent += pacer.feed(chunk)
+                ahead = sent - (time.monotonic() - started) - settings.stream_prebuffer_seconds
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+                if policy == "skip":
+                    while queue.full():
+                        _stats["skipped_bytes"] += len(queue.get_nowait())
+                    queue.put_nowait(chunk)
+                else:
+                    if not queue.full():
+                        full_since = None
+                    elif full_since is None:
+                        full_since = time.monotonic()
+                    try:
+                        await asyncio.wait_for(queue.put(chunk), settings.stream_stall_timeout)
+                    except asyncio.TimeoutError:
+                        _stats["stalled"] += 1
+                        return
+                    if policy == "drop" and full_since is not None and time.monotonic() - full_since > settings.stream_stall_timeout:
+                        _stats["dropped"] += 1
+                        return
+                busy = state["busy_since"]
+                if busy is not None and time.monotonic() - busy > settings.stream_stall_timeout:
+                    _stats["stalled"] += 1
+                    return  # слушатель ничего не забирает — источник закрываем
+        except Exception as e:
+            logging.warning(f"Stream source failed: {e}")
+        finally:
+            await source.aclose()
+            while queue.full():
+                queue.get_nowait()  # место для маркера конца
+            queue.put_nowait(_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _END:
+                break
+            state["busy_since"] = time.monotonic()
+            yield chunk
+            state["busy_since"] = None
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def buffer_stats() -> dict:
+    return {
+        "slow_policy": settings.stream_slow_policy,
+        "buffer_seconds": settings.stream_buffer_seconds,
+        **_stats,
+    }
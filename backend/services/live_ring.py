@@ -0,0 +1,277 @@
+"""
+Shared live stream for multi-worker deployments (uvicorn --workers N, settings.live_ring).
+Живой эфир производится один раз на хост: воркер, взявший flock на live.lock, читает источник
+(часовые блоки или ffmpeg по файлам) в темпе эфира и пишет байты в кольцевой буфер —
+mmap-файл на каждый битрейт в live_ring_dir (по умолчанию /dev/shm). Остальные воркеры только
+читают кольцо: слушатель начинает с головы минус stream_prebuffer_seconds и забирает всё,
+что записано после его позиции. Заголовок: magic, ёмкость, счётчик записанных байт (seq),
+heartbeat и pid производителя. Если производитель умер, lock берёт другой воркер и продолжает seq.
+"""
+import asyncio
+import fcntl
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from config import settings
+from services.audio_probe import frame_sync
+from services.hour_blocks import all_variants, stream_hour_blocks
+from services.listener_buffer import paced
+from services.streamer_service import CHUNK_SIZE, _moscow_now, stream_broadcast_ffmpeg
+from services.timeline import day_playlist
+
+MAGIC = b"NAVORNG1"
+_HEADER = struct.Struct("<8sIIQdI")  # magic, version(резерв), capacity, seq, heartbeat, pid
+_SEQ_OFFSET = 16
+_SEQ = struct.Struct("<Q")
+_HB = struct.Struct("<d")
+HEADER_SIZE = 64
+
+_POLL = 0.05
+_LOCK_RETRY = 1.0
+_RESTART_DELAY = 5.0
+
+_task: asyncio.Task | None = None
+_producing: set[str] = set()
+
+
+def ring_dir() -> Path:
+    if settings.live_ring_dir:
+        return Path(settings.live_ring_dir)
+    shm = Path("/dev/shm")
+    return shm / "navo" if shm.is_dir() else Path(settings.cache_dir) / "live"
+
+
+def ring_path(variant: str) -> Path:
+    return ring_dir() / f"live-{variant}.ring"
+
+
+def _byterate(variant: str) -> int:
+    return int(variant.rstrip("k")) * 125
+
+
+def ring_capacity(variant: str) -> int:
+    return max(4 * CHUNK_SIZE, math.ceil(settings.live_ring_seconds * _byterate(variant) / CHUNK_SIZE) * CHUNK_SIZE)
+
+
+# --- производитель ---
+
+class RingWriter:
+    def __init__(self, variant: str):
+        path = ring_path(variant)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.capacity = ring_capacity(variant)
+        size = HEADER_SIZE + self.capacity
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        seq = 0
+        if os.fstat(self._fd).st_size == size:
+            with mmap.mmap(self._fd, HEADER_SIZE) as head:
+                magic, _, capacity, old_seq, _, _ = _HEADER.unpack_from(head, 0)
+                if magic == MAGIC and capacity == self.capacity:
+                    seq = old_seq  # продолжаем счёт предыдущего производителя — позиции читателей остаются валидны
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        _HEADER.pack_into(self._map, 0, MAGIC, 1, self.capacity, seq, time.time(), os.getpid())
+        self.seq = seq
+
+    def write(self, data: bytes) -> None:
+        for i in range(0, len(data), self.capacity):
+            part = data[i:i + self.capacity]
+            at = self.seq % self.capacity
+            first = min(len(part), self.capacity - at)
+            self._map[HEADER_SIZE + at:HEADER_SIZE + at + first] = part[:first]
+            if first < len(part):
+                self._map[HEADER_SIZE:HEADER_SIZE + len(part) - first] = part[first:]
+            self.seq += len(part)
+            _SEQ.pack_into(self._map, _SEQ_OFFSET, self.seq)  # после данных: читатель видит только записанное
+        self.beat()
+
+    def beat(self) -> None:
+        _HB.pack_into(self._map, _SEQ_OFFSET + 8, time.time())
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+async def live_source(variant: str):
+    """The broadcast as one listener at the live edge would get it (по Москве, с переходом через полночь)."""
+    today = _moscow_now().date()
+    if settings.stream_mode == "hours":
+        source = stream_hour_blocks(today, variant)
+    else:
+        playlist = await asyncio.to_thread(day_playlist, today, variant)  # сетка дня из БД — не в event loop
+        source = stream_broadcast_ffmpeg(playlist, d=today, load_day=lambda day: day_playlist(day, variant))
+    try:
+        async for chunk in source:
+            yield chunk
+    finally:
+        await source.aclose()
+
+
+async def _produce(variant: str) -> None:
+    """Write the live stream of one bitrate into its ring at broadcast pace; restart on errors."""
+    writer = RingWriter(variant)
+    _producing.add(variant)
+    try:
+        while True:
+            source = paced(live_source(variant))
+            try:
+                async for chunk in source:
+                    writer.write(chunk)
+            except Exception as e:
+                logging.warning(f"Live ring {variant}: source failed: {e}")
+            finally:
+                await source.aclose()
+            await asyncio.sleep(_RESTART_DELAY)  # нет сетки / источник оборвался
+            writer.beat()
+    finally:
+        _producing.discard(variant)
+        writer.close()
+
+
+def host_lock(name: str) -> int | None:
+    """Non-blocking flock on <ring_dir>/<name>.lock — «один на хост» среди воркеров. Returns fd or None."""
+    ring_dir().mkdir(parents=True, exist_ok=True)
+    fd = os.open(ring_dir() / f"{name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def release_host_lock(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+async def _elect_loop(variants: list[str]) -> None:
+    while (fd := host_lock("live")) is None:
+        await asyncio.sleep(_LOCK_RETRY)  # производитель — другой воркер; ждём, вдруг он умрёт
+    logging.info(f"Live ring producer: pid {os.getpid()}, {', '.join(variants)}")
+    tasks = [asyncio.create_task(_produce(v)) for v in variants]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        release_host_lock(fd)
+
+
+# --- читатель ---
+
+class RingReader:
+    def __init__(self, variant: str):
+        path = ring_path(variant)
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(self._fd, 0, prot=mmap.PROT_READ)
+        except Exception:
+            os.close(self._fd)
+            raise
+        magic, _, self.capacity, _, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER_SIZE + self.capacity:
+            self.close()
+            raise ValueError(f"Not a live ring: {path}")
+
+    def seq(self) -> int:
+        while True:  # 8 байт читаются не атомарно — повторяем до совпадения
+            a = _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]
+            if a == _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]:
+                return a
+
+    def heartbeat(self) -> float:
+        return _HB.unpack_from(self._map, _SEQ_OFFSET + 8)[0]
+
+    def read(self, pos: int, end: int) -> bytes | None:
+        """Bytes [pos, end) or None if the writer has already overwritten them."""
+        at, n = pos % self.capacity, end - pos
+        first = min(n, self.capacity - at)
+        data = self._map[HEADER_SIZE + at:HEADER_SIZE + at + first]
+        if first < n:
+            data += self._map[HEADER_SIZE:HEADER_SIZE + n - first]
+        if self.seq() - self.capacity > pos:
+            return None
+        return data
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+async def ring_stream(variant: str):
+    """Async generator: live bytes from the shared ring, starting stream_prebuffer_seconds behind the head."""
+    deadline = time.monotonic() + settings.live_ring_wait
+    while True:
+        try:
+            reader = RingReader(variant)
+            break
+        except (OSError, ValueError):
+            if time.monotonic() > deadline:
+                logging.warning(f"Live ring {variant} is not available")
+                return
+            await asyncio.sleep(_LOCK_RETRY)
+    backlog = min(reader.capacity - CHUNK_SIZE, int(settings.stream_prebuffer_seconds * _byterate(variant)))
+    try:
+        pos = max(0, reader.seq() - backlog)
+        aligned = False
+        while True:
+            head = reader.seq()
+            if head - reader.capacity + CHUNK_SIZE > pos:
+                pos, aligned = head - backlog, False  # отстали на всё кольцо — к живому краю
+            if head <= pos:
+                await asyncio.sleep(_POLL)
+                continue
+            data = reader.read(pos, min(head, pos + CHUNK_SIZE))
+            if data is None:
+                aligned = False
+                continue
+            pos += len(data)
+            if not aligned:
+                data = data[frame_sync(data):]
+                aligned = bool(data)
+            if data:
+                yield data
+    finally:
+        reader.close()
+
+
+def live_ring_stats() -> dict:
+    result = {"enabled": settings.live_ring, "producer": bool(_producing), "rings": {}}
+    for variant in all_variants():
+        try:
+            reader = RingReader(variant)
+        except (OSError, ValueError):
+            continue
+        try:
+            result["rings"][variant] = {
+                "bytes_written": reader.seq(),
+                "capacity": reader.capacity,
+                "heartbeat_age": round(time.time() - reader.heartbeat(), 1),
+            }
+        finally:
+            reader.close()
+    return result
+
+
+def start_live_ring() -> None:
+    """Join the producer election (call from app lifespan of every worker)."""
+    global _task
+    if not settings.live_ring or (_task and not _task.done()):
+        return
+    _task = asyncio.create_task(_elect_loop(all_variants()))
+
+
+async def stop_live_ring() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
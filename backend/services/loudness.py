@@ -0,0 +1,51 @@
+"""
+One-time loudness analysis (EBU R128: integrated LUFS + true peak) via ffmpeg's ebur128 filter.
+Результат хранится в MediaBlob, усиление применяется при нормализации — в эфире фильтров нет.
+"""
+import asyncio
+import math
+import re
+from pathlib import Path
+
+from config import settings
+from services.process_supervisor import supervised_process
+
+_INTEGRATED = re.compile(r"I:\s+(-?[\d.]+|-inf)\s+LUFS")
+_TRUE_PEAK = re.compile(r"Peak:\s+(-?[\d.]+|-inf)\s+dBFS")
+
+
+def _last_float(pattern: re.Pattern, text: str) -> float | None:
+    found = pattern.findall(text)
+    if not found:
+        return None
+    return -math.inf if found[-1] == "-inf" else float(found[-1])
+
+
+async def analyze_loudness(path: Path) -> tuple[float, float]:
+    """(integrated LUFS, true peak dBTP) of a file. Raises RuntimeError if ffmpeg fails."""
+    async with supervised_process(
+        "ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-loglevel", "info",
+        "-i", str(path),
+        "-map", "0:a:0", "-af", "ebur128=peak=true:framelog=verbose",
+        "-f", "null", "-",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        purpose="loudness",
+    ) as proc:
+        _, err = await proc.communicate()
+    text = err.decode(errors="replace")
+    lufs, peak = _last_float(_INTEGRATED, text), _last_float(_TRUE_PEAK, text)
+    if proc.returncode != 0 or lufs is None or peak is None:
+        raise RuntimeError(text.strip()[-500:] or f"ffmpeg exited with {proc.returncode}")
+    return lufs, peak
+
+
+def gain_for(lufs: float, peak: float) -> float:
+    """Gain (dB) that brings lufs to loudness_target_lufs without pushing the true peak over loudness_true_peak."""
+    if not settings.loudness_target_lufs or not math.isfinite(lufs):
+        return 0.0  # выключено или тишина
+    gain = settings.loudness_target_lufs - lufs
+    if math.isfinite(peak):
+        gain = min(gain, settings.loudness_true_peak - peak)
+    limit = settings.loudness_max_gain_db
+    return round(max(-limit, min(limit, gain)), 2)
@@ -0,0 +1,174 @@
+"""
+Shared audio delivery for the per-entity /audio routes.
+Путь к файлу кэшируется, ETag строится из размера и mtime, поддерживаются
+If-None-Match → 304 и Range → 206. Ссылки с ?v=<etag> отдаются как immutable.
+MEDIA_OFFLOAD=x-accel|x-sendfile: байты отдаёт nginx/Apache, Python только находит файл.
+"""
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Song, News, Weather, Podcast, Intro
+from services.streamer_service import _resolve_path
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# entity_type -> (model, column with the file path)
+MEDIA_SOURCES = {
+    "song": (Song, "file_path"),
+    "dj": (Song, "dj_audio_path"),
+    "news": (News, "audio_path"),
+    "weather": (Weather, "audio_path"),
+    "podcast": (Podcast, "file_path"),
+    "intro": (Intro, "file_path"),
+}
+
+# (entity_type, entity_id, путь из БД) -> найденный файл. Перепроверяется stat'ом при каждом запросе.
+_path_cache: dict[tuple[str, int, str], Path] = {}
+_PATH_CACHE_MAX = 4096
+
+
+def resolve_cached(raw: str, entity_type: str = "", entity_id: int = 0) -> Path | None:
+    """_resolve_path with memoization; stale entries (file gone) are re-resolved."""
+    key = (entity_type, entity_id, raw)
+    hit = _path_cache.get(key)
+    if hit is not None and hit.is_file():
+        return hit
+    found = _resolve_path(Path(raw), entity_type, entity_id)
+    if found is None:
+        _path_cache.pop(key, None)
+        return None
+    if len(_path_cache) >= _PATH_CACHE_MAX:
+        _path_cache.clear()
+    _path_cache[key] = found
+    return found
+
+
+def get_media_path(db: Session, entity_type: str, entity_id: int) -> Path | None:
+    source = MEDIA_SOURCES.get(entity_type)
+    if source is None:
+        return None
+    model, attr = source
+    row = db.query(model).get(entity_id)
+    raw = getattr(row, attr, "") if row else ""
+    if not raw:
+        return None
+    return resolve_cached(raw, entity_type, entity_id)
+
+
+def etag_for(st: os.stat_result) -> str:
+    """Strong validator from size + mtime (без чтения файла)."""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def media_version(path: Path) -> str:
+    """Value for the ?v= query parameter of versioned (immutable) URLs."""
+    return etag_for(path.stat()).strip('"')
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Single 'bytes=a-b' range → (start, end inclusive). None — ignore header; ValueError — unsatisfiable."""
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[6:].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start_s == "":
+        if length <= 0:
+            raise ValueError("unsatisfiable")  # bytes=-0
+        return max(0, size - length), size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable")
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload_response(path: Path, media_type: str, headers: dict) -> Response | None:
+    """X-Accel-Redirect / X-Sendfile response, or None if offload is off or path is outside the root."""
+    mode = settings.media_offload
+    if not mode:
+        return None
+    resolved = path.resolve()
+    if mode == "x-sendfile":
+        return Response(media_type=media_type, headers={**headers, "X-Sendfile": str(resolved)})
+    root = Path(settings.media_offload_root or settings.upload_dir).resolve()
+    try:
+        rel = resolved.relative_to(root)
+    except ValueError:
+        return None
+    # Accept-Ranges/Content-Length выставит nginx — он же обрабатывает Range
+    headers = {k: v for k, v in headers.items() if k not in ("Accept-Ranges", "Content-Length")}
+    # nginx декодирует URI X-Accel-Redirect — пробелы и не-ASCII в именах файлов кодируем
+    uri = settings.media_offload_prefix.rstrip("/") + "/" + quote(rel.as_posix())
+    return Response(media_type=media_type, headers={**headers, "X-Accel-Redirect": uri})
+
+
+def media_response(request: Request, path: Path, media_type: str = "audio/mpeg") -> Response:
+    """200 / 206 / 304 / 416 for a local file with validators and cache headers."""
+    try:
+        st = path.stat()
+    except OSError:
+        raise HTTPException(404, "File not found")
+    etag = etag_for(st)
+    versioned = request.query_params.get("v") == etag.strip('"')
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE,
+    }
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    offloaded = _offload_response(path, media_type, headers)
+    if offloaded is not None:
+        return offloaded
+
+    size = st.st_size
+    rng = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and size > 0 and (not if_range or if_range.strip() == etag):  # у пустого файла диапазонов нет
+        try:
+            rng = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if rng is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = rng, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(_iter_file(path, start, length), status_code=status, media_type=media_type, headers=headers)
+
+
+def entity_media_response(request: Request, db: Session, entity_type: str, entity_id: int) -> Response:
+    path = get_media_path(db, entity_type, entity_id)
+    if path is None:
+        raise HTTPException(404, "Audio not found")
+    return media_response(request, path)
@@ -0,0 +1,221 @@
+"""
+Incremental garbage collector for orphaned media under upload_dir.
+За один проход просматривается не больше gc_batch_size файлов после сохранённого курсора
+(cache_dir/media_gc.json); дойдя до конца дерева, курсор сбрасывается. Файлы, на которые
+не ссылается ни одна строка, удаляются или переносятся в карантин (gc_mode).
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import or_
+
+from config import settings
+from database import SessionLocal
+from models import Job, MediaBlob
+from services.job_queue import job_handler, enqueue_job, JobContext
+from services.hour_blocks import HOURS_DIR
+from services.media_store import MEDIA_ATTRS, digest_from_path
+from services.normalizer import VARIANTS_DIR, stream_variants, variant_path
+from services.streamer_service import _resolve_path
+
+QUARANTINE_DIR = ".quarantine"
+# Каталоги внутри upload_dir, которые GC не трогает (служебные данные других подсистем)
+EXCLUDED_DIRS = {QUARANTINE_DIR, HOURS_DIR}
+
+_gc_task: asyncio.Task | None = None
+
+
+def _state_path() -> Path:
+    return Path(settings.cache_dir) / "media_gc.json"
+
+
+def load_gc_state() -> dict:
+    try:
+        return json.loads(_state_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"cursor": [], "total_reclaimed_bytes": 0, "total_orphans": 0, "last_run": None, "last_result": None}
+
+
+def _save_state(state: dict) -> None:
+    path = _state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, default=str), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _referenced_paths(db) -> set[Path]:
+    refs: set[Path] = set()
+    for model, attrs in MEDIA_ATTRS.items():
+        cols = [getattr(model, a) for a in attrs]
+        for row in db.query(model.id, *cols).filter(or_(*[c != "" for c in cols])).all():
+            for attr, raw in zip(attrs, row[1:]):
+                if not raw:
+                    continue
+                p = _resolve_path(Path(raw), "dj" if attr == "dj_audio_path" else "", row[0])
+                if p is not None:
+                    refs.add(p.resolve())
+                digest = digest_from_path(raw)
+                if digest:
+                    refs.update(variant_path(digest, v).resolve() for v in stream_variants())
+    return refs
+
+
+def _walk_after(root: Path, cursor: tuple[str, ...], parts: tuple[str, ...] = ()):
+    """Yield relative path parts of files in component-wise sorted order, strictly after cursor.
+    Каталоги, целиком лежащие до курсора, не открываются."""
+    try:
+        entries = sorted(os.scandir(root / Path(*parts)) if parts else os.scandir(root), key=lambda e: e.name)
+    except OSError:
+        return
+    for e in entries:
+        child = parts + (e.name,)
+        if e.is_dir(follow_symlinks=False):
+            if not parts and e.name in EXCLUDED_DIRS:
+                continue
+            if child < cursor[: len(child)]:
+                continue
+            yield from _walk_after(root, cursor, child)
+        elif e.is_file(follow_symlinks=False) and child > cursor:
+            yield child
+
+
+def _dispose(root: Path, rel: tuple[str, ...], mode: str) -> None:
+    src = root / Path(*rel)
+    if mode == "delete":
+        src.unlink(missing_ok=True)
+        return
+    dst = root / QUARANTINE_DIR / date.today().isoformat() / Path(*rel)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(src), str(dst))
+
+
+def _purge_quarantine(root: Path) -> int:
+    """Delete quarantine days older than gc_quarantine_days. Returns freed bytes."""
+    qroot = root / QUARANTINE_DIR
+    if not qroot.is_dir():
+        return 0
+    freed = 0
+    cutoff = date.today().toordinal() - settings.gc_quarantine_days
+    for day_dir in qroot.iterdir():
+        try:
+            if date.fromisoformat(day_dir.name).toordinal() >= cutoff:
+                continue
+        except ValueError:
+            continue
+        for f in day_dir.rglob("*"):
+            if f.is_file():
+                freed += f.stat().st_size
+        shutil.rmtree(day_dir, ignore_errors=True)
+    return freed
+
+
+def run_gc_pass(batch_size: int | None = None, mode: str | None = None) -> dict:
+    """One incremental pass. Returns stats for this pass."""
+    root = Path(settings.upload_dir).resolve()
+    mode = mode or settings.gc_mode
+    batch_size = batch_size or settings.gc_batch_size
+    state = load_gc_state()
+    cursor = tuple(state.get("cursor") or ())
+    min_mtime = time.time() - settings.gc_min_age_seconds
+
+    db = SessionLocal()
+    try:
+        refs = _referenced_paths(db)
+        scanned, orphans, reclaimed, quarantined = 0, 0, 0, 0
+        last = cursor
+        wrapped = True
+        for rel in _walk_after(root, cursor):
+            if scanned >= batch_size:
+                wrapped = False
+                break
+            scanned += 1
+            last = rel
+            path = root / Path(*rel)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_mtime > min_mtime or path in refs:
+                continue
+            try:
+                _dispose(root, rel, mode)
+            except OSError as e:
+                logging.warning(f"Media GC: cannot {mode} {path}: {e}")
+                continue
+            digest = digest_from_path("/".join(rel)) if rel[0] != VARIANTS_DIR else None
+            if digest:
+                db.query(MediaBlob).filter(MediaBlob.digest == digest).delete()
+            orphans += 1
+            if mode == "delete":
+                reclaimed += st.st_size
+            else:
+                quarantined += st.st_size
+        db.commit()
+    finally:
+        db.close()
+
+    if wrapped:
+        reclaimed += _purge_quarantine(root)
+    result = {
+        "scanned": scanned,
+        "orphans": orphans,
+        "mode": mode,
+        "reclaimed_bytes": reclaimed,
+        "quarantined_bytes": quarantined,
+        "cursor": "/".join(() if wrapped else last),
+        "wrapped": wrapped,
+    }
+    state["cursor"] = [] if wrapped else list(last)
+    state["total_reclaimed_bytes"] = state.get("total_reclaimed_bytes", 0) + reclaimed
+    state["total_orphans"] = state.get("total_orphans", 0) + orphans
+    state["last_run"] = time.time()
+    state["last_result"] = result
+    _save_state(state)
+    return result
+
+
+@job_handler("media_gc")
+async def media_gc(ctx: JobContext, params: dict) -> dict:
+    return await asyncio.to_thread(run_gc_pass, params.get("batch_size"), params.get("mode"))
+
+
+def schedule_media_gc() -> Job | None:
+    db = SessionLocal()
+    try:
+        if db.query(Job).filter(Job.kind == "media_gc", Job.status.in_(["queued", "running"])).count():
+            return None
+        return enqueue_job(db, "media_gc", {})
+    finally:
+        db.close()
+
+
+async def _gc_loop() -> None:
+    while True:
+        await asyncio.sleep(max(60.0, settings.gc_interval))
+        try:
+            schedule_media_gc()
+        except Exception as e:
+            logging.warning(f"Media GC scheduling failed: {e}")
+
+
+def start_media_gc() -> None:
+    """Start periodic GC passes (call from app lifespan)."""
+    global _gc_task
+    if settings.gc_interval <= 0 or (_gc_task and not _gc_task.done()):
+        return
+    _gc_task = asyncio.create_task(_gc_loop())
+
+
+async def stop_media_gc() -> None:
+    global _gc_task
+    if _gc_task:
+        _gc_task.cancel()
+        await asyncio.gather(_gc_task, return_exceptions=True)
+        _gc_task = None
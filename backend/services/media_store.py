@@ -0,0 +1,184 @@
+"""
+Content-addressed media store: uploads/media/<aa>/<bb>/<sha256><ext>.
+Одинаковые файлы хранятся один раз; строки Song/Podcast/Intro/News/Weather держат
+ссылки (MediaBlob.ref_count), файл удаляется, когда ссылок не осталось — после commit
+транзакции, которая сняла последнюю ссылку (при rollback файл остаётся на месте).
+Пути в БД остаются строками вида uploads/media/..., как и раньше.
+"""
+import hashlib
+import logging
+import shutil
+import uuid
+from pathlib import Path
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import MediaBlob, Song, News, Weather, Podcast, Intro
+
+# Колонки с путями к медиа для каждой модели
+MEDIA_ATTRS = {
+    Song: ("file_path", "dj_audio_path"),
+    News: ("audio_path",),
+    Weather: ("audio_path",),
+    Podcast: ("file_path",),
+    Intro: ("file_path",),
+}
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def store_root() -> Path:
+    return Path(settings.upload_dir) / "media"
+
+
+def blob_path(digest: str, ext: str = ".mp3") -> Path:
+    return store_root() / digest[:2] / digest[2:4] / f"{digest}{ext}"
+
+
+def digest_from_path(path: str) -> str | None:
+    """sha256 if path points into the store, else None (legacy flat uploads)."""
+    if not path:
+        return None
+    p = Path(path.replace("\\", "/"))
+    stem = p.stem
+    if len(stem) != 64 or p.parent.name != stem[2:4] or p.parent.parent.name != stem[:2]:
+        return None
+    try:
+        int(stem, 16)
+    except ValueError:
+        return None
+    return stem
+
+
+def new_temp_path(ext: str = ".mp3") -> Path:
+    """Scratch file inside upload_dir (same filesystem → rename into the store is atomic)."""
+    tmp_dir = Path(settings.upload_dir) / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tmp_dir / f"{uuid.uuid4().hex}{ext}"
+
+
+def _released(db: Session) -> list[str]:
+    return db.info.setdefault("media_unlink", [])
+
+
+def _register(db: Session, digest: str, path: Path, size: int) -> str:
+    if str(path) in _released(db):
+        _released(db).remove(str(path))  # файл снова нужен в этой же транзакции
+    blob = db.query(MediaBlob).get(digest)
+    if blob is not None and blob in db.deleted:
+        db.flush()  # последняя ссылка снята в этой же транзакции — удаляем строку и создаём заново
+        blob = None
+    if blob is None:
+        db.add(MediaBlob(digest=digest, path=str(path), size=size, ref_count=0))
+        db.flush()
+    return str(path)
+
+
+def store_bytes(db: Session, data: bytes, ext: str = ".mp3") -> str:
+    """Put bytes into the store (dedup by sha256). Returns the stored path."""
+    digest = hashlib.sha256(data).hexdigest()
+    target = blob_path(digest, ext)
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = new_temp_path(ext)
+        tmp.write_bytes(data)
+        tmp.replace(target)
+    return _register(db, digest, target, len(data))
+
+
+def store_file(db: Session, src: Path, ext: str | None = None, move: bool = True, digest: str | None = None) -> str:
+    """Put a file into the store. With move=True the source is consumed. Returns the stored path.
+    digest — уже посчитанный sha256 (импорт библиотеки), чтобы не читать файл второй раз."""
+    src = Path(src)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(src, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK):
+                h.update(chunk)
+        digest = h.hexdigest()
+    target = blob_path(digest, ext or src.suffix or ".mp3")
+    size = src.stat().st_size
+    if target.exists():
+        if move:
+            src.unlink(missing_ok=True)
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            shutil.move(str(src), str(target))
+        else:
+            shutil.copyfile(src, target)
+    return _register(db, digest, target, size)
+
+
+def _adjust(db: Session, path: str, delta: int) -> None:
+    digest = digest_from_path(path)
+    if digest is None:
+        return
+    db.execute(update(MediaBlob).where(MediaBlob.digest == digest).values(ref_count=MediaBlob.ref_count + delta))
+    if delta < 0:
+        blob = db.query(MediaBlob).populate_existing().get(digest)
+        if blob is not None and blob.ref_count <= 0:
+            _released(db).append(blob.path)
+            db.delete(blob)
+
+
+@event.listens_for(Session, "after_commit")
+def _unlink_released(session: Session) -> None:
+    for path in session.info.pop("media_unlink", []):
+        try:
+            Path(path).unlink(missing_ok=True)
+        except OSError as e:
+            logging.warning(f"Media store: cannot delete {path}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_released(session: Session) -> None:
+    session.info.pop("media_unlink", None)
+
+
+def assign_media(db: Session, row, attr: str, new_path: str) -> None:
+    """Point row.attr at new_path, moving the reference from the old file. Caller commits."""
+    old = getattr(row, attr) or ""
+    if old == new_path:
+        return
+    _adjust(db, new_path, +1)
+    setattr(row, attr, new_path)
+    _adjust(db, old, -1)
+
+
+def release_row_media(db: Session, row) -> None:
+    """Drop all media references of a row that is about to be deleted. Caller commits."""
+    for attr in MEDIA_ATTRS.get(type(row), ()):
+        _adjust(db, getattr(row, attr) or "", -1)
+
+
+def migrate_legacy_media(db: Session, progress=None) -> dict:
+    """Move files referenced from flat upload dirs into the store (dedup), rewrite rows, delete originals.
+    progress(percent, message) — после каждой модели (JobContext.progress: исключение прерывает перенос)."""
+    from services.streamer_service import _resolve_path
+
+    moved, missing = 0, 0
+    originals: set[Path] = set()
+    for i, (model, attrs) in enumerate(MEDIA_ATTRS.items()):
+        if progress:
+            progress(i / len(MEDIA_ATTRS) * 90, f"{model.__tablename__}: перенесено {moved}")
+        for row in db.query(model).all():
+            for attr in attrs:
+                raw = getattr(row, attr) or ""
+                if not raw or digest_from_path(raw):
+                    continue
+                src = _resolve_path(Path(raw))
+                if src is None:
+                    missing += 1
+                    continue
+                assign_media(db, row, attr, store_file(db, src, move=False))
+                originals.add(src.resolve())
+                moved += 1
+        db.commit()
+    if progress:
+        progress(90, f"Удаление оригиналов: {len(originals)}")
+    for src in originals:
+        src.unlink(missing_ok=True)
+    return {"migrated": moved, "missing": missing, "files_removed": len(originals)}
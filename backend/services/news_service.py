@@ -1,6 +1,12 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
 import feedparser
 import httpx
-from datetime import datetime
+from config import settings
 
 # RSS sources: Таджикистан + общие русскоязычные (fallback)
 NEWS_RSS_SOURCES = [
@@ -13,39 +19,122 @@ NEWS_RSS_SOURCES = [
     "https://ria.ru/export/rss2/index.xml",
 ]
 
+ENTRIES_PER_FEED = 5
+
+# Кэш лент: url -> {etag, last_modified, source, entries, fetched_at}. Хранится на диске между рестартами.
+_feed_cache: dict[str, dict] | None = None
+_cache_lock = asyncio.Lock()
+
+
+def _cache_path() -> Path:
+    return Path(settings.cache_dir) / "rss_feeds.json"
+
+
+def _load_cache() -> dict[str, dict]:
+    global _feed_cache
+    if _feed_cache is None:
+        try:
+            _feed_cache = json.loads(_cache_path().read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _feed_cache = {}
+    return _feed_cache
+
+
+def _save_cache(cache: dict[str, dict]) -> None:
+    path = _cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as e:
+        logging.warning(f"RSS cache save failed: {e}")
+
+
+def _parse_feed(content: bytes, url: str) -> tuple[str, list[dict]]:
+    """Parse feed bytes (CPU-bound, runs in a thread). Returns (source title, entries)."""
+    feed = feedparser.parse(content)
+    entries = []
+    for entry in feed.entries[:ENTRIES_PER_FEED]:
+        title = (entry.get("title") or "").strip()
+        if not title:
+            continue
+        raw = (
+            entry.get("summary", "")
+            or entry.get("description", "")
+            or (entry.get("content", [{}])[0].get("value", "") if entry.get("content") else "")
+        )
+        entries.append({
+            "title": title,
+            "link": entry.get("link", ""),
+            "summary": (raw or "")[:400].strip(),
+        })
+    return feed.feed.get("title", url), entries
+
+
+async def _fetch_feed(client: httpx.AsyncClient, url: str, cached: dict | None) -> dict | None:
+    """Conditional GET for one feed. Returns cache record, or None on failure."""
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    r = await client.get(url, headers=headers)
+    if r.status_code == 304 and cached:
+        return {**cached, "fetched_at": time.time()}
+    r.raise_for_status()
+    source, entries = await asyncio.to_thread(_parse_feed, r.content, url)
+    return {
+        "etag": r.headers.get("etag", ""),
+        "last_modified": r.headers.get("last-modified", ""),
+        "source": source,
+        "entries": entries,
+        "fetched_at": time.time(),
+    }
+
 
 async def fetch_news_from_rss(limit: int = 15) -> list[dict]:
-    """Fetch news from RSS feeds. Returns list of {title, link, summary, source}."""
+    """Fetch news from RSS feeds. Returns list of {title, link, summary, source}.
+    Все ленты запрашиваются параллельно с общим дедлайном; неизменившиеся (304)
+    берутся из кэша без повторного парсинга, недоступные — из кэша, если он
+    не старше RSS_CACHE_MAX_AGE (мёртвая лента не крутится в эфире вечно)."""
+    async with _cache_lock:
+        cache = _load_cache()
+        async with httpx.AsyncClient(
+            timeout=settings.rss_feed_timeout,
+            follow_redirects=True,
+            headers={"User-Agent": "NAVO-Radio/1.0"},
+        ) as client:
+            tasks = {url: asyncio.create_task(_fetch_feed(client, url, cache.get(url))) for url in NEWS_RSS_SOURCES}
+            _, pending = await asyncio.wait(tasks.values(), timeout=settings.rss_deadline_seconds)
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        changed = False
+        for url, task in tasks.items():
+            if task.cancelled() or task.exception() is not None:
+                continue
+            record = task.result()
+            if record is not None:
+                cache[url] = record
+                changed = True
+        if changed:
+            _save_cache(cache)
+
     all_news = []
     seen_titles = set()
-
+    oldest = time.time() - settings.rss_cache_max_age
     for url in NEWS_RSS_SOURCES:
-        try:
-            async with httpx.AsyncClient() as client:
-                r = await client.get(url, timeout=15.0)
-                r.raise_for_status()
-                feed = feedparser.parse(r.content)
-
-            for entry in feed.entries[:5]:
-                title = (entry.get("title") or "").strip()
-                if not title or title in seen_titles:
-                    continue
-                seen_titles.add(title)
-                raw = (
-                    entry.get("summary", "")
-                    or entry.get("description", "")
-                    or (entry.get("content", [{}])[0].get("value", "") if entry.get("content") else "")
-                )
-                summary = (raw or "")[:400].strip()
-                all_news.append({
-                    "title": title,
-                    "link": entry.get("link", ""),
-                    "summary": summary,
-                    "source": feed.feed.get("title", url),
-                })
-                if len(all_news) >= limit:
-                    return all_news
-        except Exception:
+        record = cache.get(url)
+        if not record or record.get("fetched_at", 0) < oldest:
             continue
-
-    return all_news[:limit]
+        for entry in record["entries"]:
+            if entry["title"] in seen_titles:
+                continue
+            seen_titles.add(entry["title"])
+            all_news.append({**entry, "source": record.get("source", url)})
+            if len(all_news) >= limit:
+                return all_news
+    return all_news
@@ -0,0 +1,296 @@
+"""
+Ingest-time normalization to the station profile (station_sample_rate / station_bitrate / station_channels).
+Каждый файл один раз анализируется (EBU R128), выравнивается к loudness_target_lufs и
+перекодируется ffmpeg'ом в CBR MP3 без ID3/Xing, копия кладётся в media store,
+строки переводятся на неё, а MediaBlob.profile помечает готовые файлы. Неудачи тоже запоминаются —
+у файлов store в MediaBlob.profile (FAILED_MARK), у старых путей вне store в cache_dir/normalize_failed.json, —
+чтобы проход не повторялся каждые normalize_interval. Эфир (-c copy) дальше
+склеивает однородные потоки без перекодирования.
+Для /stream?bitrate= из нормализованных файлов один раз делаются варианты (stream_variants):
+uploads/variants/<битрейт>/aa/bb/<sha256>.mp3 — путь выводится из digest, таблица не нужна.
+"""
+import asyncio
+import json
+import logging
+import math
+import shutil
+from pathlib import Path
+
+from config import settings
+from database import SessionLocal
+from models import Job, MediaBlob
+from services.audio_probe import probe_duration
+from services.job_queue import job_handler, enqueue_job, JobContext
+from services.loudness import analyze_loudness, gain_for
+from services.media_store import MEDIA_ATTRS, assign_media, digest_from_path, new_temp_path, store_file
+from services.process_supervisor import supervised_process
+from services.streamer_service import _resolve_path
+
+VARIANTS_DIR = "variants"
+FAILED_MARK = "!"  # profile = "!<профиль>" — ffmpeg не справился, повторно не пытаемся
+
+_normalize_task: asyncio.Task | None = None
+
+
+def station_profile() -> str:
+    profile = f"mp3-{settings.station_sample_rate}-{settings.station_bitrate}-{settings.station_channels}"
+    if settings.loudness_target_lufs:
+        profile += f"-lufs{settings.loudness_target_lufs:g}"
+    return profile
+
+
+def stream_variants() -> list[str]:
+    """Extra bitrates rendered besides the station one, e.g. ["64k"]."""
+    return [v.strip() for v in settings.stream_variants.split(",") if v.strip() and v.strip() != settings.station_bitrate]
+
+
+def variant_path(digest: str, variant: str) -> Path:
+    return Path(settings.upload_dir) / VARIANTS_DIR / variant / digest[:2] / digest[2:4] / f"{digest}.mp3"
+
+
+def variant_for(path: Path, variant: str) -> Path | None:
+    """Variant file of a stored media path; the path itself for the station bitrate (и для старых файлов
+    вне хранилища). None — вариант ещё не отрендерен: файл станции в поток другого битрейта не подставляем."""
+    digest = digest_from_path(str(path))
+    if variant == settings.station_bitrate or digest is None:
+        return path
+    alt = variant_path(digest, variant)
+    return alt if alt.exists() else None
+
+
+def pending_variants(db) -> list[tuple[str, str, str]]:
+    """(digest, stored path, variant) for normalized blobs whose variant file is missing."""
+    variants = stream_variants()
+    if not variants:
+        return []
+    rows = db.query(MediaBlob.digest, MediaBlob.path).filter(MediaBlob.profile == station_profile(), MediaBlob.ref_count > 0)
+    return [(d, p, v) for d, p in rows.all() for v in variants if not variant_path(d, v).exists()]
+
+
+def _failed_path() -> Path:
+    return Path(settings.cache_dir) / "normalize_failed.json"
+
+
+def load_failed() -> set[str]:
+    """Paths without a MediaBlob that failed for the current profile (другой профиль — пробуем заново)."""
+    try:
+        state = json.loads(_failed_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return set()
+    return set(state.get("paths") or []) if state.get("profile") == station_profile() else set()
+
+
+def _save_failed(paths: set[str]) -> None:
+    path = _failed_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"profile": station_profile(), "paths": sorted(paths)}, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _duration_attr(attr: str) -> str:
+    return "dj_duration_seconds" if attr == "dj_audio_path" else "duration_seconds"
+
+
+def pending_media(db) -> dict[str, list[tuple]]:
+    """Paths not yet in the station profile → [(model, row id, attr), ...]."""
+    profile = station_profile()
+    marks = (profile, FAILED_MARK + profile)
+    done = {d for (d,) in db.query(MediaBlob.digest).filter(MediaBlob.profile.in_(marks)).all()}
+    failed = load_failed()
+    pending: dict[str, list[tuple]] = {}
+    for model, attrs in MEDIA_ATTRS.items():
+        for attr in attrs:
+            col = getattr(model, attr)
+            for row_id, raw in db.query(model.id, col).filter(col != "").all():
+                if digest_from_path(raw) not in done and raw not in failed:
+                    pending.setdefault(raw, []).append((model, row_id, attr))
+    return pending
+
+
+async def transcode(src: Path, dst: Path, gain_db: float = 0.0, bitrate: str | None = None) -> None:
+    """src → dst in the station profile (or another bitrate). Raises RuntimeError with ffmpeg's stderr on failure."""
+    volume = ["-af", f"volume={gain_db}dB"] if gain_db else []
+    async with supervised_process(
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+        "-i", str(src),
+        "-map", "0:a:0", "-map_metadata", "-1", "-vn", *volume,
+        "-ar", str(settings.station_sample_rate), "-ac", str(settings.station_channels),
+        "-c:a", "libmp3lame", "-b:a", bitrate or settings.station_bitrate,
+        "-write_xing", "0", "-id3v2_version", "0", "-write_id3v1", "0",
+        "-f", "mp3", str(dst),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        purpose="transcode",
+    ) as proc:
+        _, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(err.decode(errors="replace").strip()[-500:] or f"ffmpeg exited with {proc.returncode}")
+
+
+def _finite(value: float) -> float | None:
+    return round(value, 2) if math.isfinite(value) else None
+
+
+def _apply(raw: str, refs: list[tuple], tmp: Path, lufs: float, peak: float, gain: float) -> int:
+    """Store the normalized file with its loudness and move all rows still pointing at raw onto it.
+    Runs in a thread with its own session (sha256 и копирование в store не блокируют event loop)."""
+    with SessionLocal() as db:
+        return _apply_in(db, raw, refs, tmp, lufs, peak, gain)
+
+
+def _apply_in(db, raw: str, refs: list[tuple], tmp: Path, lufs: float, peak: float, gain: float) -> int:
+    duration = probe_duration(tmp)
+    stored = store_file(db, tmp)
+    blob = db.query(MediaBlob).get(digest_from_path(stored))
+    if blob is not None:
+        blob.profile = station_profile()
+        blob.loudness_lufs = _finite(lufs + gain)
+        blob.true_peak_db = _finite(peak + gain)
+        blob.gain_db = gain
+    moved = 0
+    for model, row_id, attr in refs:
+        row = db.query(model).get(row_id)
+        if row is None or getattr(row, attr) != raw:
+            continue  # строку удалили или заменили файл, пока шло перекодирование
+        assign_media(db, row, attr, stored)
+        if duration:
+            setattr(row, _duration_attr(attr), duration)
+        moved += 1
+    db.commit()
+    return moved
+
+
+def _mark_failed(raw: str, failed: set[str]) -> None:
+    """Remember a failure: FAILED_MARK on the blob, or the path in the failed set for non-store files."""
+    with SessionLocal() as db:
+        blob = db.query(MediaBlob).get(digest_from_path(raw) or "")
+        if blob is None:
+            failed.add(raw)
+            return
+        blob.profile = FAILED_MARK + station_profile()
+        db.commit()
+
+
+@job_handler("media_normalize")
+async def media_normalize(ctx: JobContext, params: dict) -> dict:
+    if not shutil.which("ffmpeg"):
+        raise ValueError("FFmpeg не установлен — нормализация недоступна")
+    db = SessionLocal()
+    try:
+        pending = pending_media(db)
+        limit = int(params.get("limit") or 0)
+        items = list(pending.items())[: limit or None]
+        total = len(items)
+        sem = asyncio.Semaphore(max(1, settings.normalize_workers))
+        lock = asyncio.Lock()  # записи в БД по очереди
+        stats = {"files": total, "normalized": 0, "rows": 0, "failed": []}
+        failed = load_failed()
+
+        async def fail(raw: str, error: str) -> None:
+            stats["failed"].append({"path": raw, "error": error})
+            async with lock:
+                await asyncio.to_thread(_mark_failed, raw, failed)
+
+        async def one(raw: str, refs: list[tuple]) -> None:
+            src = _resolve_path(Path(raw), "dj" if refs[0][2] == "dj_audio_path" else "", refs[0][1])
+            if src is None:
+                await fail(raw, "file not found")
+            else:
+                tmp = new_temp_path()
+                try:
+                    async with sem:
+                        lufs, peak = await analyze_loudness(src)
+                        gain = gain_for(lufs, peak)
+                        await transcode(src, tmp, gain)
+                    async with lock:
+                        stats["rows"] += await asyncio.to_thread(_apply, raw, refs, tmp, lufs, peak, gain)
+                        stats["normalized"] += 1
+                except (RuntimeError, OSError) as e:  # ffmpeg; диск заполнен / нет прав при записи в store
+                    await fail(raw, str(e))
+                finally:
+                    tmp.unlink(missing_ok=True)
+            done = stats["normalized"] + len(stats["failed"])
+            ctx.progress(done / total * 100, f"{done}/{total}")
+
+        try:
+            await _run_all([one(raw, refs) for raw, refs in items])
+        finally:
+            _save_failed(failed)
+
+        variants = pending_variants(db)[: limit or None]
+        stats["variants"], stats["variants_rendered"] = len(variants), 0
+
+        async def render(digest: str, stored: str, variant: str) -> None:
+            tmp = new_temp_path()
+            try:
+                async with sem:
+                    await transcode(Path(stored), tmp, bitrate=variant)
+                target = variant_path(digest, variant)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp.replace(target)
+                stats["variants_rendered"] += 1
+            except (RuntimeError, OSError) as e:
+                stats["failed"].append({"path": stored, "variant": variant, "error": str(e)})
+            finally:
+                tmp.unlink(missing_ok=True)
+            ctx.progress(None, f"Варианты: {stats['variants_rendered']}/{len(variants)}")
+
+        await _run_all([render(*v) for v in variants])
+        stats["failed"] = stats["failed"][:100]
+        return stats
+    finally:
+        db.close()
+
+
+async def _run_all(coros: list) -> None:
+    """gather; on error or cancellation cancel the rest before re-raising."""
+    tasks = [asyncio.create_task(c) for c in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def schedule_media_normalize() -> Job | None:
+    """Enqueue a normalization pass unless one is already queued or running."""
+    db = SessionLocal()
+    try:
+        if db.query(Job).filter(Job.kind == "media_normalize", Job.status.in_(["queued", "running"])).count():
+            return None
+        if not pending_media(db) and not pending_variants(db):
+            return None
+        return enqueue_job(db, "media_normalize", {})
+    finally:
+        db.close()
+
+
+async def _normalize_loop() -> None:
+    while True:
+        try:
+            schedule_media_normalize()
+        except Exception as e:
+            logging.warning(f"Media normalization scheduling failed: {e}")
+        await asyncio.sleep(max(60.0, settings.normalize_interval))
+
+
+def start_media_normalizer() -> None:
+    """Start periodic normalization passes (call from app lifespan). Needs ffmpeg."""
+    global _normalize_task
+    if settings.normalize_interval <= 0 or (_normalize_task and not _normalize_task.done()):
+        return
+    if not shutil.which("ffmpeg"):
+        logging.warning("FFmpeg не найден — нормализация медиа отключена")
+        return
+    _normalize_task = asyncio.create_task(_normalize_loop())
+
+
+async def stop_media_normalizer() -> None:
+    global _normalize_task
+    if _normalize_task:
+        _normalize_task.cancel()
+        await asyncio.gather(_normalize_task, return_exceptions=True)
+        _normalize_task = None
@@ -0,0 +1,80 @@
+"""
+Supervisor for ffmpeg child processes.
+Каждый процесс учитывается; при выходе из контекста — в том числе при отмене задачи или
+отключении слушателя — он убивается и дожидается (reap). Одновременно живёт не больше
+ffmpeg_max_processes процессов, так что штормы переподключений не раздувают таблицу процессов и fd.
+"""
+import asyncio
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from config import settings
+
+_REAP_TIMEOUT = 5.0
+
+_active: dict[int, tuple[asyncio.subprocess.Process, str]] = {}
+_stats = Counter(spawned=0, killed=0, rejected=0)
+_slots: asyncio.Semaphore | None = None
+
+
+class ProcessCapacityError(RuntimeError):
+    """All ffmpeg slots are busy and the caller asked not to wait."""
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, settings.ffmpeg_max_processes))
+    return _slots
+
+
+def at_capacity() -> bool:
+    return _semaphore().locked()
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+            _stats["killed"] += 1
+        except ProcessLookupError:
+            pass
+    try:
+        await asyncio.wait_for(proc.wait(), _REAP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning(f"ffmpeg pid {proc.pid} did not exit after SIGKILL")
+
+
+@asynccontextmanager
+async def supervised_process(*args, purpose: str = "", wait: bool = True, **kwargs):
+    """create_subprocess_exec under a global cap; the process is killed and reaped on exit.
+    wait=False — не ждать свободного слота, а сразу ProcessCapacityError."""
+    slots = _semaphore()
+    if not wait and slots.locked():
+        _stats["rejected"] += 1
+        raise ProcessCapacityError("Too many ffmpeg processes")
+    await slots.acquire()
+    proc = None
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, **kwargs)
+        _stats["spawned"] += 1
+        _active[proc.pid] = (proc, purpose)
+        yield proc
+    finally:
+        try:
+            if proc is not None:
+                await _terminate(proc)
+        finally:
+            if proc is not None:
+                _active.pop(proc.pid, None)
+            slots.release()
+
+
+def process_stats() -> dict:
+    return {
+        "active": len(_active),
+        "max": settings.ffmpeg_max_processes,
+        "by_purpose": dict(Counter(purpose for _, purpose in _active.values())),
+        **_stats,
+    }
@@ -0,0 +1,126 @@
+"""
+Production steps shared by HTTP routes, background jobs and the scheduler:
+RSS/LLM text, TTS and Jamendo ingest. Ошибки — ValueError с текстом для оператора.
+"""
+import logging
+import random
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from models import Song, News, Weather
+from services.audio_probe import probe_duration
+from services.jamendo import download_track
+from services.media_store import assign_media, new_temp_path, store_file
+from services.news_service import fetch_news_from_rss
+from services.weather_service import fetch_weather_forecast
+from services.groq_service import generate_news_text, generate_weather_text, generate_dj_text
+from services.tts_service import text_to_speech, DEFAULT_VOICE
+
+
+async def generate_news_script(limit: int = 15) -> str:
+    """RSS → LLM. Raises ValueError if there is nothing to retell."""
+    items = await fetch_news_from_rss(limit=limit)
+    if not items:
+        raise ValueError("Не удалось получить новости из RSS. Проверьте доступность источников.")
+    news_texts = [f"{x['title']}. {x['summary']}" for x in items]
+    return await generate_news_text(news_texts)
+
+
+async def generate_weather_script() -> str:
+    raw = await fetch_weather_forecast()
+    return await generate_weather_text(raw)
+
+
+async def _render_tts(db: Session, text: str, voice: str) -> tuple[str, float]:
+    """TTS into a scratch file, then into the media store. Returns (stored path, duration)."""
+    tmp = new_temp_path()
+    try:
+        await text_to_speech(text, tmp, voice)
+        duration = probe_duration(tmp)
+        return store_file(db, tmp), duration
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def voice_news(db: Session, n: News, voice: str = DEFAULT_VOICE) -> str:
+    path, n.duration_seconds = await _render_tts(db, n.text, voice)
+    assign_media(db, n, "audio_path", path)
+    db.commit()
+    return n.audio_path
+
+
+async def voice_weather(db: Session, w: Weather, voice: str = DEFAULT_VOICE) -> str:
+    path, w.duration_seconds = await _render_tts(db, w.text, voice)
+    assign_media(db, w, "audio_path", path)
+    db.commit()
+    return w.audio_path
+
+
+async def _save_voiced(db: Session, row, voice: str | None):
+    """Add a News/Weather row; with voice — only together with its audio (сбой TTS не оставляет строку без звука)."""
+    if voice:
+        try:
+            path, row.duration_seconds = await _render_tts(db, row.text, voice)
+        except Exception:
+            db.rollback()
+            raise
+        assign_media(db, row, "audio_path", path)
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+async def produce_news(db: Session, broadcast_date: date | None, voice: str | None = None) -> News:
+    """Create a News row for broadcast_date; voice it too if voice is given."""
+    text = await generate_news_script()
+    return await _save_voiced(db, News(text=text, broadcast_date=broadcast_date), voice)
+
+
+async def produce_weather(db: Session, broadcast_date: date | None, voice: str | None = None) -> Weather:
+    """Create a Weather row for broadcast_date; voice it too if voice is given."""
+    text = await generate_weather_script()
+    return await _save_voiced(db, Weather(text=text, broadcast_date=broadcast_date), voice)
+
+
+async def write_dj_text(db: Session, song: Song) -> str:
+    greeting_allowed = random.random() < 0.1
+    text = await generate_dj_text(song.artist, song.title, song.album, greeting_allowed)
+    song.dj_text = text
+    assign_media(db, song, "dj_audio_path", "")  # сброс озвучки при смене текста
+    db.commit()
+    return text
+
+
+async def voice_dj(db: Session, song: Song, voice: str = DEFAULT_VOICE) -> str:
+    path, song.dj_duration_seconds = await _render_tts(db, song.dj_text, voice)
+    assign_media(db, song, "dj_audio_path", path)
+    db.commit()
+    return song.dj_audio_path
+
+
+async def import_jamendo_track(db: Session, t: dict) -> Song | None:
+    """Download one Jamendo track and create its Song. Returns None on failure."""
+    tid = t.get("id")
+    if not tid:
+        return None
+    tid = str(tid)
+    url = t.get("audiodownload") or t.get("audio") or f"https://prod-1.storage.jamendo.com/download/track/{tid}/mp32/"
+    song = Song(title=t.get("name", "Unknown"), artist=t.get("artist_name", "Unknown"), album=t.get("album_name", ""), file_path="")
+    db.add(song)
+    db.commit()
+    db.refresh(song)
+    tmp = new_temp_path()
+    try:
+        await download_track(url, tmp)
+        song.duration_seconds = float(t.get("duration", 0)) or probe_duration(tmp)
+        assign_media(db, song, "file_path", store_file(db, tmp))
+        db.commit()
+        return song
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        db.delete(song)
+        db.commit()
+        logging.warning(f"Jamendo download failed for {tid}: {e}")
+        return None
@@ -0,0 +1,213 @@
+"""
+Relay mode for edge nodes (settings.relay_upstream): этот backend не читает БД и медиатеку, а тянет
+живой эфир с /stream вышестоящего NAVO и раздаёт его своим слушателям.
+Одно подключение к апстриму на битрейт (с Icy-MetaData: 1 — названия треков приходят в потоке),
+общий буфер на relay_buffer_seconds в памяти; слушатель стартует с stream_prebuffer_seconds
+до живого края. Обрыв апстрима — переподключение с экспоненциальной паузой до relay_reconnect_max,
+слушатели тем временем ждут и продолжают из буфера.
+"""
+import asyncio
+import logging
+from collections import Counter, deque
+
+import httpx
+
+from config import settings
+from services.audio_probe import frame_sync
+from services.listener_buffer import _FramePacer
+
+_TITLES_KEEP = 64
+
+_relays: dict[str, "Relay"] = {}
+
+
+class _IcyReader:
+    """Splits an ICY-interleaved byte stream into audio and StreamTitle values."""
+
+    def __init__(self, metaint: int):
+        self.metaint = metaint
+        self._left = metaint  # аудио до следующего блока метаданных
+        self._meta = b""
+        self._meta_len: int | None = None
+
+    def feed(self, data: bytes) -> tuple[bytes, list[str]]:
+        if not self.metaint:
+            return data, []
+        audio, titles, pos = [], [], 0
+        while pos < len(data):
+            if self._left:
+                part = data[pos:pos + self._left]
+                audio.append(part)
+                self._left -= len(part)
+                pos += len(part)
+            elif self._meta_len is None:
+                self._meta_len = data[pos] * 16
+                pos += 1
+            else:
+                need = self._meta_len - len(self._meta)
+                self._meta += data[pos:pos + need]
+                pos += need
+            if self._meta_len is not None and len(self._meta) >= self._meta_len:
+                if self._meta_len:
+                    titles.append(_stream_title(self._meta))
+                self._meta, self._meta_len, self._left = b"", None, self.metaint
+        return b"".join(audio), titles
+
+
+def _stream_title(block: bytes) -> str:
+    text = block.rstrip(b"\x00").decode("utf-8", errors="replace")
+    start = text.find("StreamTitle='")
+    if start < 0:
+        return ""
+    start += len("StreamTitle='")
+    end = text.find("';", start)
+    return text[start:end if end >= 0 else len(text)]
+
+
+class Relay:
+    """One upstream connection of a bitrate and the in-memory buffer its listeners share."""
+
+    def __init__(self, variant: str):
+        self.variant = variant
+        self.chunks: deque[tuple[int, float, bytes]] = deque()  # (номер, секунда потока, байты)
+        self.next_seq = 0
+        self.seconds = 0.0
+        self.size = 0
+        self.titles: deque[tuple[float, str]] = deque(maxlen=_TITLES_KEEP)
+        self.connected = False
+        self.stats = Counter(connects=0, failures=0, bytes=0)
+        self._pacer = _FramePacer()
+        self._new = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def _capacity(self) -> int:
+        return int(settings.relay_buffer_seconds * int(self.variant.rstrip("k")) * 125)
+
+    def _push(self, data: bytes) -> None:
+        self.chunks.append((self.next_seq, self.seconds, data))
+        self.next_seq += 1
+        self.seconds += self._pacer.feed(data)
+        self.size += len(data)
+        self.stats["bytes"] += len(data)
+        while len(self.chunks) > 1 and self.size - len(self.chunks[0][2]) >= self._capacity():
+            self.size -= len(self.chunks.popleft()[2])
+        self._new.set()
+        self._new = asyncio.Event()
+
+    async def _run(self) -> None:
+        delay = 1.0
+        timeout = httpx.Timeout(10.0, read=settings.relay_read_timeout)
+        while True:
+            try:
+                async with httpx.AsyncClient(timeout=timeout) as client:
+                    async with client.stream(
+                        "GET",
+                        settings.relay_upstream,
+                        params={"bitrate": self.variant.rstrip("k")},
+                        headers={"Icy-MetaData": "1"},
+                    ) as resp:
+                        resp.raise_for_status()
+                        reader = _IcyReader(int(resp.headers.get("icy-metaint") or 0))
+                        self.connected = True
+                        self.stats["connects"] += 1
+                        delay = 1.0
+                        async for raw in resp.aiter_raw():
+                            audio, titles = reader.feed(raw)
+                            for title in titles:
+                                self.titles.append((self.seconds, title))
+                            if audio:
+                                self._push(audio)
+                logging.warning(f"Relay {self.variant}: upstream closed the stream")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Relay {self.variant}: {e}")
+            self.connected = False
+            self.stats["failures"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.relay_reconnect_max)
+
+    def title_at(self, sec: float) -> str:
+        title = ""
+        for start, t in self.titles:
+            if start > sec:
+                break
+            title = t
+        return title
+
+    def start_seq(self) -> int:
+        """First chunk to give a new listener: stream_prebuffer_seconds before the live edge."""
+        edge = self.seconds - settings.stream_prebuffer_seconds
+        for seq, sec, _ in self.chunks:
+            if sec >= edge:
+                return seq
+        return self.next_seq
+
+    async def close(self) -> None:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _relay(variant: str) -> Relay:
+    relay = _relays.get(variant)
+    if relay is None:
+        relay = _relays[variant] = Relay(variant)
+    return relay
+
+
+def relay_listener(variant: str):
+    """(body, title_at) for one listener: async generator of live bytes and the ICY title lookup."""
+    relay = _relay(variant)
+    start = {"sec": None}
+
+    async def body():
+        seq = relay.start_seq()
+        aligned = False
+        while True:
+            oldest = relay.chunks[0][0] if relay.chunks else relay.next_seq
+            if seq < oldest:
+                seq, aligned = relay.start_seq(), False  # отстали больше чем на буфер — к живому краю
+            if seq >= relay.next_seq:
+                await relay._new.wait()
+                continue
+            _, sec, data = relay.chunks[seq - oldest]
+            seq += 1
+            if not aligned:
+                data = data[frame_sync(data):]
+                aligned = bool(data)
+            if data:
+                if start["sec"] is None:
+                    start["sec"] = sec
+                yield data
+
+    async def title_at(played: float) -> str:
+        return relay.title_at((start["sec"] or 0.0) + played)
+
+    return body(), title_at
+
+
+def relay_stats() -> dict:
+    return {
+        "upstream": settings.relay_upstream,
+        "relays": {
+            v: {
+                "connected": r.connected,
+                "buffered_bytes": r.size,
+                "title": r.title_at(r.seconds),
+                **r.stats,
+            }
+            for v, r in _relays.items()
+        },
+    }
+
+
+def start_relay() -> None:
+    """Connect the station bitrate upstream right away (call from app lifespan in relay mode)."""
+    if settings.relay_upstream:
+        _relay(settings.station_bitrate)
+
+
+async def stop_relay() -> None:
+    for relay in list(_relays.values()):
+        await relay.close()
+    _relays.clear()
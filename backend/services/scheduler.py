@@ -0,0 +1,178 @@
+"""
+Ahead-of-time daily production (Москва UTC+3).
+В settings.production_time ставит в очередь задачу daily_production на завтра:
+RSS → LLM → TTS новостей и погоды, замер длительностей, генерация сетки.
+Шаги идемпотентны — повтор после сбоя или рестарта доделывает только недостающее.
+"""
+import asyncio
+import json
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy import or_
+
+from config import settings
+from database import SessionLocal
+from models import Job, Song, News, Weather, Podcast, Intro, BroadcastItem
+from services.audio_probe import probe_duration
+from services.broadcast_generator import generate_broadcast
+from services.dj_voicing import schedule_dj_lookahead
+from services.job_queue import job_handler, enqueue_job, JobContext
+from services import production
+from services.streamer_service import _moscow_now, _resolve_path
+from services.tts_service import DEFAULT_VOICE
+
+_scheduler_task: asyncio.Task | None = None
+
+
+async def _with_retries(ctx: JobContext, step: str, fn):
+    """Run an async step with settings.production_retries attempts."""
+    attempts = max(1, settings.production_retries)
+    for attempt in range(1, attempts + 1):
+        try:
+            return await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Daily production: {step} failed (attempt {attempt}/{attempts}): {e}")
+            if attempt == attempts:
+                raise
+            ctx.progress(None, f"{step}: повтор {attempt}/{attempts - 1}")
+            await asyncio.sleep(settings.production_retry_delay)
+
+
+def probe_missing_durations() -> int:
+    """Fill zero durations from the actual files. Returns number of rows updated."""
+    db = SessionLocal()
+    try:
+        return _probe_missing_durations(db)
+    finally:
+        db.close()
+
+
+def _probe_missing_durations(db) -> int:
+    updated = 0
+    for model, path_attr, dur_attr, entity_type in (
+        (Song, "file_path", "duration_seconds", "song"),
+        (Song, "dj_audio_path", "dj_duration_seconds", "dj"),
+        (News, "audio_path", "duration_seconds", "news"),
+        (Weather, "audio_path", "duration_seconds", "weather"),
+        (Podcast, "file_path", "duration_seconds", "podcast"),
+        (Intro, "file_path", "duration_seconds", "intro"),
+    ):
+        col = getattr(model, dur_attr)
+        rows = db.query(model).filter(getattr(model, path_attr) != "", or_(col == 0, col.is_(None))).all()
+        for row in rows:
+            path = _resolve_path(getattr(row, path_attr), entity_type, row.id)
+            dur = probe_duration(path) if path else 0.0
+            if dur > 0:
+                setattr(row, dur_attr, dur)
+                updated += 1
+    db.commit()
+    return updated
+
+
+@job_handler("daily_production")
+async def daily_production(ctx: JobContext, params: dict) -> dict:
+    target = date.fromisoformat(params["date"])
+    voice = params.get("voice") or DEFAULT_VOICE
+    db = SessionLocal()
+    try:
+        result = {"date": str(target)}
+
+        ctx.progress(5, "Новости")
+        news = (
+            db.query(News)
+            .filter(News.broadcast_date == target, News.audio_path != "")
+            .count()
+        )
+        for _ in range(max(0, settings.production_news_count - news)):
+            n = await _with_retries(ctx, "news", lambda: production.produce_news(db, target, voice))
+            result.setdefault("news", []).append(n.id)
+
+        ctx.progress(35, "Погода")
+        weather = (
+            db.query(Weather)
+            .filter(Weather.broadcast_date == target, Weather.audio_path != "")
+            .count()
+        )
+        for _ in range(max(0, settings.production_weather_count - weather)):
+            w = await _with_retries(ctx, "weather", lambda: production.produce_weather(db, target, voice))
+            result.setdefault("weather", []).append(w.id)
+
+        ctx.progress(65, "Длительности")
+        result["durations_probed"] = await asyncio.to_thread(probe_missing_durations)
+
+        ctx.progress(80, "Сетка эфира")
+        exists = db.query(BroadcastItem).filter(BroadcastItem.broadcast_date == target).count()
+        if exists:
+            result["grid"] = "kept"  # сетку, уже правленную оператором, не трогаем
+        else:
+            items = generate_broadcast(db, target)
+            for item in items:
+                db.add(item)
+            db.commit()
+            result["grid"] = len(items)
+        if settings.dj_mode == "lazy":
+            schedule_dj_lookahead()
+        ctx.progress(100, "Готово")
+        return result
+    finally:
+        db.close()
+
+
+def _parse_hhmm(value: str) -> tuple[int, int]:
+    h, m = value.strip().split(":")
+    return int(h), int(m)
+
+
+def _already_scheduled(db, target: date) -> bool:
+    jobs = (
+        db.query(Job)
+        .filter(Job.kind == "daily_production", Job.status.in_(["queued", "running", "done"]))
+        .all()
+    )
+    return any(json.loads(j.params_json or "{}").get("date") == str(target) for j in jobs)
+
+
+def schedule_daily_production(target: date, force: bool = False) -> Job | None:
+    """Enqueue production for target unless already queued/running/done."""
+    db = SessionLocal()
+    try:
+        if not force and _already_scheduled(db, target):
+            return None
+        return enqueue_job(db, "daily_production", {"date": str(target)})
+    finally:
+        db.close()
+
+
+async def _scheduler_loop() -> None:
+    hour, minute = _parse_hhmm(settings.production_time)
+    while True:
+        now = _moscow_now()
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now >= run_at:
+            # Время сегодня прошло — завтрашний день должен быть в работе. Проверяем каждый час:
+            # догоняем после рестарта и перезапускаем упавшую задачу до полуночи.
+            try:
+                schedule_daily_production(now.date() + timedelta(days=1))
+            except Exception as e:
+                logging.warning(f"Daily production scheduling failed: {e}")
+            run_at += timedelta(days=1)
+        await asyncio.sleep(max(1.0, min(3600.0, (run_at - _moscow_now()).total_seconds())))
+
+
+def start_scheduler() -> None:
+    """Start the daily production scheduler (call from app lifespan)."""
+    global _scheduler_task
+    if not settings.production_time or (_scheduler_task and not _scheduler_task.done()):
+        return
+    _scheduler_task = asyncio.create_task(_scheduler_loop())
+
+
+async def stop_scheduler() -> None:
+    global _scheduler_task
+    if _scheduler_task:
+        _scheduler_task.cancel()
+        await asyncio.gather(_scheduler_task, return_exceptions=True)
+        _scheduler_task = None
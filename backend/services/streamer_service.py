@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 
 from config import settings
 from models import BroadcastItem, Song, News, Weather, Podcast, Intro
+from services.process_supervisor import supervised_process
 
 # Москва UTC+3 (без перехода на летнее время с 2011)
 MOSCOW_TZ = timezone(timedelta(hours=3))
@@ -121,6 +122,25 @@ def _get_audio_path(db: Session, entity_type: str, entity_id: int) -> Path | Non
 
 
 CHUNK_SIZE = 32 * 1024  # 32 KB
+FLOWING_TYPES = ("song", "dj")  # идут подряд; остальное (новости, погода, подкаст, заставка) — по времени сетки
+
+
+def collapse_silent_dj(items: list[BroadcastItem], silent_dj: set[int]) -> list[tuple[BroadcastItem, int]]:
+    """Drop DJ slots without audio (lazy-режим, озвучка не успела) and move the following
+    songs/DJ up to fill them, until the next fixed-time item. Returns [(item, start_sec)]."""
+    result = []
+    shift = 0
+    for item in items:
+        start = _parse_time(item.start_time)
+        if item.entity_type == "dj" and item.entity_id in silent_dj:
+            shift += int(item.duration_seconds or 0)
+            continue
+        if item.entity_type in FLOWING_TYPES:
+            start -= shift
+        else:
+            shift = 0
+        result.append((item, start))
+    return result
 
 
 def get_playlist_with_times(db: Session, broadcast_date: date) -> list[tuple[Path, int, float, str]]:
@@ -137,11 +157,12 @@ def get_playlist_with_times(db: Session, broadcast_date: date) -> list[tuple[Pat
         .order_by(BroadcastItem.sort_order)
         .all()
     )
+    paths = {id(item): _get_audio_path(db, item.entity_type, item.entity_id) for item in items}
+    silent_dj = {item.entity_id for item in items if item.entity_type == "dj" and paths[id(item)] is None}
     result = []
-    for item in items:
-        p = _get_audio_path(db, item.entity_type, item.entity_id)
+    for item, start_sec in collapse_silent_dj(items, silent_dj):
+        p = paths[id(item)]
         if p:
-            start_sec = _parse_time(item.start_time)
             dur = float(item.duration_seconds or 0)
             result.append((p, start_sec, dur, item.entity_type))
     return result
@@ -152,7 +173,7 @@ def _find_current_position(playlist: list[tuple], now_sec: int) -> tuple[int, in
     Find (playlist_index, seek_sec) for current Moscow time.
     seek_sec = seconds to skip within the current file (0 if at start).
     """
-    for i, (_, start_sec, dur) in enumerate(playlist):
+    for i, (_, start_sec, dur, *_rest) in enumerate(playlist):
         end_sec = start_sec + int(dur)
         if start_sec <= now_sec < end_sec:
             seek_sec = now_sec - start_sec
@@ -223,11 +244,18 @@ def stream_broadcast(playlist: list[tuple], sync_to_moscow: bool = True):
             first_round = False
 
 
-async def stream_broadcast_ffmpeg(playlist: list[tuple], sync_to_moscow: bool = True):
+async def stream_broadcast_ffmpeg(
+    playlist: list[tuple],
+    sync_to_moscow: bool = True,
+    d: date | None = None,
+    load_day=None,
+):
     """
     Async generator: streams MP3 через FFmpeg subprocess.
     Жёсткая привязка к таймингам эфирной сетки (Москва UTC+3).
     FFmpeg надёжно обрабатывает chunked encoding.
+    d + load_day(date) -> playlist: на последнем элементе дня заранее подгружается сетка следующего
+    дня, и поток после полуночи продолжается по ней (без сетки на завтра — снова с начала дня d).
     """
     if not playlist:
         return
@@ -240,41 +268,57 @@ async def stream_broadcast_ffmpeg(playlist: list[tuple], sync_to_moscow: bool =
     idx = start_idx
     first_round = True
     chunk_size = 32 * 1024
-    while True:
-        try:
-            item = playlist[idx]
-            path = item[0]
-            duration_sec = item[2]
-            skip = 0
-            if first_round and idx == start_idx and seek_sec > 0:
-                skip = min(int(seek_sec), int(duration_sec) - 1)
-                skip = max(0, skip)
-            if not path.exists():
-                idx = (idx + 1) % len(playlist)
-                if idx == 0:
-                    first_round = False
-                continue
-            args = [
-                "ffmpeg", "-y", "-loglevel", "error",
-                "-ss", str(skip),
-                "-i", str(path.resolve()),
-                "-c", "copy", "-f", "mp3", "pipe:1",
-            ]
-            proc = await asyncio.create_subprocess_exec(
-                *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.DEVNULL,
-            )
-            while True:
-                chunk = await proc.stdout.read(chunk_size)
-                if not chunk:
-                    break
-                yield chunk
-            await proc.wait()
-        except (GeneratorExit, asyncio.CancelledError):
-            raise
-        except Exception:
-            pass
-        idx = (idx + 1) % len(playlist)
-        if idx == 0:
-            first_round = False
+    next_day: asyncio.Task | None = None
+    try:
+        while True:
+            if idx == len(playlist) - 1 and d is not None and load_day is not None and next_day is None:
+                next_day = asyncio.create_task(asyncio.to_thread(load_day, d + timedelta(days=1)))
+            try:
+                item = playlist[idx]
+                path = item[0]
+                duration_sec = item[2]
+                skip = 0
+                if first_round and idx == start_idx and seek_sec > 0:
+                    skip = min(int(seek_sec), int(duration_sec) - 1)
+                    skip = max(0, skip)
+                if path.exists():
+                    transcode = item[4] if len(item) > 4 else None  # варианта битрейта нет — кодируем на лету
+                    codec = ["-c:a", "libmp3lame", "-b:a", transcode] if transcode else ["-c", "copy"]
+                    args = [
+                        "ffmpeg", "-y", "-loglevel", "error",
+                        "-ss", str(skip),
+                        "-i", str(path.resolve()),
+                        *codec, "-f", "mp3", "pipe:1",
+                    ]
+                    # при отключении клиента (GeneratorExit/CancelledError) супервизор убивает и дожидается ffmpeg
+                    async with supervised_process(
+                        *args,
+                        purpose="stream",
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.DEVNULL,
+                    ) as proc:
+                        while True:
+                            chunk = await proc.stdout.read(chunk_size)
+                            if not chunk:
+                                break
+                            yield chunk
+                        await proc.wait()
+            except (GeneratorExit, asyncio.CancelledError):
+                raise
+            except Exception:
+                pass
+            idx += 1
+            if idx >= len(playlist):
+                idx = 0
+                first_round = False
+                if next_day is not None:
+                    try:
+                        upcoming = await next_day
+                    except Exception:
+                        upcoming = []
+                    next_day = None
+                    if upcoming:
+                        playlist, d = upcoming, d + timedelta(days=1)
+    finally:
+        if next_day is not None:
+            next_day.cancel()
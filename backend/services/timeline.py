@@ -0,0 +1,193 @@
+"""
+Compiled in-memory timeline of the broadcast day: что звучит в какую секунду.
+Сетка дня читается из БД один раз на процесс и кэшируется; любой commit, меняющий
+BroadcastItem (редактор, генерация, планировщик, погода, DJ), сбрасывает кэш этой даты.
+Поиск элемента по секунде — bisect, без запросов к БД: ICY-метаданные и now-playing
+не зависят от числа слушателей и частоты опроса.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import BroadcastItem, Song
+from services.normalizer import variant_for
+from services.streamer_service import _moscow_now, collapse_silent_dj, get_playlist_with_times
+
+ALL_DATES = "*"
+
+_lock = threading.Lock()
+_listeners: list = []  # callback(dates) после commit'а, изменившего сетку
+_cache: dict[date, tuple[float, list[dict], list[int]]] = {}  # дата -> (собрано, элементы, их start)
+_playlist_lock = threading.Lock()
+_playlists: dict[tuple[date, str], tuple[list[dict], list[tuple]]] = {}  # (дата, битрейт) -> (таймлайн, плейлист)
+
+
+def _title(item: BroadcastItem) -> str:
+    try:
+        title = json.loads(item.metadata_json or "{}").get("title") or ""
+    except (ValueError, AttributeError):
+        title = ""
+    return "" if title == "—" else str(title)
+
+
+def compile_timeline(db: Session, d: date) -> list[dict]:
+    """Grid items of a day as [{start, end, type, id, title}], end clipped to the next item's start."""
+    rows = (
+        db.query(BroadcastItem)
+        .filter(BroadcastItem.broadcast_date == d, BroadcastItem.entity_type != "empty")
+        .order_by(BroadcastItem.sort_order)
+        .all()
+    )
+    dj_ids = {it.entity_id for it in rows if it.entity_type == "dj"}
+    voiced = {
+        s.id for s in db.query(Song.id).filter(Song.id.in_(dj_ids), Song.dj_audio_path != "").all()
+    } if dj_ids else set()
+    items = []
+    for it, start in collapse_silent_dj(rows, dj_ids - voiced):  # как в эфире: без неозвученных DJ
+        items.append({
+            "start": start,
+            "end": start + int(it.duration_seconds or 0),
+            "type": it.entity_type,
+            "id": it.entity_id,
+            "title": _title(it),
+        })
+    items.sort(key=lambda x: x["start"])
+    for cur, nxt in zip(items, items[1:]):
+        cur["end"] = min(cur["end"], max(cur["start"], nxt["start"]))
+    return items
+
+
+def _fresh(d: date) -> tuple[float, list[dict], list[int]] | None:
+    with _lock:
+        cached = _cache.get(d)
+    if cached and (settings.timeline_ttl <= 0 or time.monotonic() - cached[0] < settings.timeline_ttl):
+        return cached
+    return None
+
+
+def is_compiled(d: date) -> bool:
+    """True if the day is in the cache (lookup will not touch the DB)."""
+    return _fresh(d) is not None
+
+
+def _entry(d: date) -> tuple[list[dict], list[int]]:
+    cached = _fresh(d)
+    if cached:
+        return cached[1], cached[2]
+    db = SessionLocal()
+    try:
+        items = compile_timeline(db, d)
+    finally:
+        db.close()
+    starts = [it["start"] for it in items]
+    with _lock:
+        _cache[d] = (time.monotonic(), items, starts)
+    return items, starts
+
+
+def timeline(d: date) -> list[dict]:
+    """Cached timeline of a day (собирается из БД только при первом обращении или после правки)."""
+    return _entry(d)[0]
+
+
+def item_at(d: date, sec: int) -> dict | None:
+    """Item airing at second sec of day d, or None (пауза / нет сетки)."""
+    items, starts = _entry(d)
+    i = bisect_right(starts, sec) - 1
+    if i >= 0 and items[i]["start"] <= sec < items[i]["end"]:
+        return items[i]
+    return None
+
+
+def playlist_ready(d: date, variant: str) -> bool:
+    """True if day_playlist(d, variant) will answer from the cache (без БД и stat файлов)."""
+    source = _fresh(d)
+    cached = _playlists.get((d, variant))
+    return source is not None and cached is not None and cached[0] is source[1]
+
+
+def day_playlist(d: date, variant: str) -> list[tuple]:
+    """Files-mode playlist [(path, start_sec, duration, type, transcode)] of a day with the bitrate variant
+    resolved; transcode — битрейт, в который ffmpeg перекодирует файл станции, если варианта ещё нет.
+    Собирается один раз на процесс (а не на слушателя) и пересобирается вместе с таймлайном дня."""
+    source = timeline(d)
+    with _playlist_lock:
+        cached = _playlists.get((d, variant))
+        if cached and cached[0] is source:
+            return cached[1]
+        db = SessionLocal()
+        try:
+            playlist = []
+            for p, *rest in get_playlist_with_times(db, d):
+                alt = variant_for(p, variant)
+                playlist.append((alt or p, *rest, None if alt else variant))
+        finally:
+            db.close()
+        stale = _moscow_now().date() - timedelta(days=1)
+        for key in [k for k in _playlists if k[0] < stale]:
+            del _playlists[key]
+        _playlists[(d, variant)] = (source, playlist)
+        return playlist
+
+
+def invalidate_timeline(d: date | None = None) -> None:
+    with _lock:
+        if d is None:
+            _cache.clear()
+        else:
+            _cache.pop(d, None)
+
+
+def on_grid_change(callback) -> None:
+    """Register callback(dates: set) run after a commit that changed the grid.
+    Вызывается в потоке commit'а; dates может содержать "*" — «неизвестно какие даты»."""
+    _listeners.append(callback)
+
+
+# --- сброс кэша по commit'ам, меняющим сетку ---
+
+def _touched(session: Session) -> set:
+    return session.info.setdefault("timeline_dates", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dates(session: Session, _ctx) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, BroadcastItem) and obj.broadcast_date is not None:
+            _touched(session).add(obj.broadcast_date)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(state) -> None:
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is BroadcastItem:
+        _touched(state.session).add(ALL_DATES)  # query(...).delete() — даты не видны, сбрасываем всё
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    dates = session.info.pop("timeline_dates", None)
+    if not dates:
+        return
+    if ALL_DATES in dates:
+        invalidate_timeline()
+    else:
+        for d in dates:
+            invalidate_timeline(d)
+    for callback in _listeners:
+        try:
+            callback(dates)
+        except Exception as e:
+            logging.warning(f"Grid change listener failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("timeline_dates", None)
@@ -1,8 +1,11 @@
 import asyncio
+import re
 import edge_tts
 from pathlib import Path
 from config import settings
 
+DEFAULT_VOICE = "ru-RU-DmitryNeural"
+
 # Edge TTS Russian voices (can be extended)
 RUSSIAN_VOICES = [
     ("ru-RU-DmitryNeural", "Дмитрий (мужской)"),
@@ -10,6 +13,10 @@ RUSSIAN_VOICES = [
 ]
 
 
+# Граница предложения: . ! ? … (в т.ч. с закрывающими кавычками/скобками) + пробел
+_SENTENCE_END = re.compile(r"([.!?…]+[»\"')\]]*)\s+")
+
+
 async def list_voices() -> list[tuple[str, str]]:
     """Return available Russian voices for selection."""
     return RUSSIAN_VOICES.copy()
@@ -18,7 +25,7 @@ async def list_voices() -> list[tuple[str, str]]:
 async def text_to_speech(
     text: str,
     output_path: Path,
-    voice: str = "ru-RU-DmitryNeural",
+    voice: str = DEFAULT_VOICE,
     rate: str | None = None,
     volume: str | None = None,
     pitch: str | None = None,
@@ -34,12 +41,74 @@ async def text_to_speech(
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    communicate = edge_tts.Communicate(
-        text,
-        voice,
-        rate=rate or getattr(settings, "tts_rate", "+0%"),
-        volume=volume or getattr(settings, "tts_volume", "+0%"),
-        pitch=pitch or getattr(settings, "tts_pitch", "+0Hz"),
-    )
-    await communicate.save(str(output_path))
+    opts = {
+        "rate": rate or getattr(settings, "tts_rate", "+0%"),
+        "volume": volume or getattr(settings, "tts_volume", "+0%"),
+        "pitch": pitch or getattr(settings, "tts_pitch", "+0Hz"),
+    }
+    chunks = split_sentences(text, settings.tts_chunk_chars)
+    if len(chunks) <= 1:
+        communicate = edge_tts.Communicate(text, voice, **opts)
+        await communicate.save(str(output_path))
+        return output_path
+
+    sem = asyncio.Semaphore(max(1, settings.tts_max_parallel))
+
+    async def _one(part: str) -> bytes:
+        async with sem:
+            return await _synthesize(part, voice, **opts)
+
+    parts = await asyncio.gather(*(_one(c) for c in chunks))
+    # Все части — один голос и одни настройки, поэтому MP3-фреймы совместимы:
+    # склеиваем по границе фреймов, отрезая ID3 и мусор до первого sync.
+    tmp = output_path.with_suffix(output_path.suffix + ".part")
+    with open(tmp, "wb") as f:
+        for data in parts:
+            f.write(data[_first_frame_offset(data):])
+    tmp.replace(output_path)
     return output_path
+
+
+def split_sentences(text: str, max_chars: int) -> list[str]:
+    """Split text at sentence boundaries into chunks of at most ~max_chars.
+    Одно длинное предложение не режется — уходит отдельным куском."""
+    text = (text or "").strip()
+    if not text or max_chars <= 0 or len(text) <= max_chars:
+        return [text] if text else []
+    chunks: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.sub("\\1\0", text).split("\0"):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _synthesize(text: str, voice: str, rate: str, volume: str, pitch: str) -> bytes:
+    """Synthesize one chunk in memory. Returns raw MP3 bytes."""
+    communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume, pitch=pitch)
+    buf = bytearray()
+    async for msg in communicate.stream():
+        if msg.get("type") == "audio":
+            buf.extend(msg["data"])
+    if not buf:
+        raise RuntimeError("edge-tts вернул пустой аудиопоток")
+    return bytes(buf)
+
+
+def _first_frame_offset(data: bytes) -> int:
+    """Byte offset of the first MP3 frame (skips ID3v2 tag if present)."""
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        start = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+    for i in range(start, len(data) - 1):
+        if data[i] == 0xFF and (data[i + 1] & 0xE0) == 0xE0:
+            return i
+    return start
@@ -1,3 +1,9 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
 import httpx
 from config import settings
 
@@ -5,9 +11,32 @@ from config import settings
 DUSHANBE_LAT = 38.5598
 DUSHANBE_LON = 68.7739
 
+# Кэш прогноза: {"fetched_at": unix ts, "data": ответ WeatherAPI}. Хранится на диске между рестартами.
+_forecast_cache: dict | None = None
+_refresh_lock = asyncio.Lock()
+_refresh_task: asyncio.Task | None = None
+_background: set[asyncio.Task] = set()
 
-async def fetch_weather_forecast() -> str:
-    """Fetch weather for Dushanbe, return formatted text for Groq."""
+
+def _cache_path() -> Path:
+    return Path(settings.cache_dir) / "weather_forecast.json"
+
+
+def _load_cache() -> dict | None:
+    global _forecast_cache
+    if _forecast_cache is None:
+        try:
+            _forecast_cache = json.loads(_cache_path().read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _forecast_cache = None
+    return _forecast_cache
+
+
+def _is_fresh(cache: dict | None) -> bool:
+    return bool(cache) and time.time() - cache.get("fetched_at", 0) < settings.weather_cache_ttl
+
+
+async def _download_forecast() -> dict:
     url = "https://api.weatherapi.com/v1/forecast.json"
     async with httpx.AsyncClient() as client:
         r = await client.get(
@@ -20,8 +49,82 @@ async def fetch_weather_forecast() -> str:
             },
         )
         r.raise_for_status()
-        data = r.json()
+        return r.json()
+
+
+async def refresh_weather_cache(force: bool = False) -> dict:
+    """Re-download forecast unless the cached one is still fresh. Returns the cache record."""
+    global _forecast_cache
+    async with _refresh_lock:
+        cache = _load_cache()
+        if not force and _is_fresh(cache):
+            return cache
+        data = await _download_forecast()
+        _forecast_cache = {"fetched_at": time.time(), "data": data}
+        path = _cache_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(_forecast_cache, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            logging.warning(f"Weather cache save failed: {e}")
+        return _forecast_cache
+
+
+async def _refresh_loop() -> None:
+    while True:
+        try:
+            await refresh_weather_cache()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Weather refresh failed: {e}")
+        cache = _load_cache()
+        age = time.time() - cache.get("fetched_at", 0) if cache else settings.weather_cache_ttl
+        # Просыпаемся к моменту устаревания; после ошибки — повтор не раньше чем через минуту
+        await asyncio.sleep(max(60.0, settings.weather_cache_ttl - age))
+
+
+def start_weather_refresher() -> None:
+    """Start background forecast refresh (call from app lifespan)."""
+    global _refresh_task
+    if not settings.weather_api_key or (_refresh_task and not _refresh_task.done()):
+        return
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_weather_refresher() -> None:
+    global _refresh_task
+    if _refresh_task:
+        _refresh_task.cancel()
+        await asyncio.gather(_refresh_task, return_exceptions=True)
+        _refresh_task = None
+
+
+async def fetch_weather_forecast() -> str:
+    """Fetch weather for Dushanbe, return formatted text for Groq.
+    Берёт прогноз из кэша (TTL = weather_cache_ttl); устаревший отдаётся сразу,
+    если есть, а обновление уходит в фон. Кэш старше weather_cache_max_age
+    не используется — прогноз скачивается заново (ошибка API пробрасывается)."""
+    cache = _load_cache()
+    if cache is None or time.time() - cache.get("fetched_at", 0) >= settings.weather_cache_max_age:
+        cache = await refresh_weather_cache()
+    elif not _is_fresh(cache) and not _refresh_lock.locked():
+        task = asyncio.create_task(_refresh_quietly())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    return _format_forecast(cache["data"])
+
+
+async def _refresh_quietly() -> None:
+    try:
+        await refresh_weather_cache()
+    except Exception as e:
+        logging.warning(f"Weather refresh failed: {e}")
+
 
+def _format_forecast(data: dict) -> str:
     lines = []
     current = data.get("current", {})
     loc = data.get("location", {})
@@ -0,0 +1,41 @@
+"""
+Общие фикстуры: отдельная SQLite-база и UPLOAD_DIR во временном каталоге.
+Переменные окружения задаются до импорта config — settings читается один раз.
+"""
+import os
+import shutil
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="navo-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TMP}/navo.db",
+    "UPLOAD_DIR": f"{_TMP}/uploads",
+    "CACHE_DIR": f"{_TMP}/cache",
+    "JOB_WORKERS": "0",
+    "MEDIA_OFFLOAD": "",
+})
+
+import pytest  # noqa: E402
+
+from database import Base, SessionLocal, engine, init_db  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _database():
+    init_db()
+    yield
+    engine.dispose()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    """Session on an empty database (все таблицы очищаются после теста)."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+
+from config import settings
+from services.audio_probe import frame_header, parse_frame_header, silent_frame
+from services.hour_blocks import HOUR, block_paths, ensure_hour, fingerprint, load_meta, render_hour
+
+D = date(2000, 1, 1)  # давно прошедший день: рендер не зависит от текущего времени
+VARIANT = "128k"
+
+
+@pytest.fixture
+def frame() -> bytes:
+    return silent_frame(frame_header(settings.station_sample_rate, 128, settings.station_channels))
+
+
+def _clip(tmp_path, frame: bytes, seconds: float, name: str) -> str:
+    _, samples, rate, _ = parse_frame_header(frame, 0)
+    path = tmp_path / name
+    path.write_bytes(frame * round(seconds * rate / samples))
+    return str(path)
+
+
+def _render(items: list[dict], hour: int = 0) -> dict:
+    return render_hour(D, hour, VARIANT, items, fingerprint(items))
+
+
+def test_index_covers_every_second(tmp_path, frame):
+    items = [{"type": "song", "id": 1, "start": 0, "end": 30, "path": _clip(tmp_path, frame, 30, "a.mp3")}]
+    meta = _render(items)
+    offsets = meta["offsets"]
+    assert len(offsets) == HOUR
+    assert offsets[0] == 0
+    assert offsets == sorted(offsets)
+    assert abs(meta["duration"] - HOUR) < 0.05
+    assert offsets[-1] < meta["bytes"]
+
+
+def test_offsets_follow_constant_bitrate(tmp_path, frame):
+    frame_len, samples, rate, _ = parse_frame_header(frame, 0)
+    items = [{"type": "song", "id": 1, "start": 0, "end": 120, "path": _clip(tmp_path, frame, 120, "a.mp3")}]
+    offsets = _render(items)["offsets"]
+    for sec in (1, 10, 59, 600, 3599):
+        expected = sec * rate / samples * frame_len
+        assert abs(offsets[sec] - expected) <= frame_len  # точность — один фрейм
+
+
+def test_items_placed_at_grid_times_with_silence_between(tmp_path, frame):
+    items = [
+        {"type": "song", "id": 1, "start": 0, "end": 20, "path": _clip(tmp_path, frame, 20, "a.mp3")},
+        {"type": "news", "id": 2, "start": 60, "end": 90, "path": _clip(tmp_path, frame, 30, "b.mp3")},
+    ]
+    placed = _render(items)["items"]
+    assert [p["type"] for p in placed] == ["song", "news"]
+    assert abs(placed[0]["end"] - 20) < 0.05
+    assert abs(placed[1]["start"] - 60) < 0.05
+    assert abs(placed[1]["end"] - 90) < 0.05
+
+
+def test_item_from_previous_hour_is_cut_at_hour_start(tmp_path, frame):
+    path = _clip(tmp_path, frame, 120, "long.mp3")
+    items = [{"type": "podcast", "id": 1, "start": HOUR - 60, "end": HOUR + 60, "path": path}]
+    placed = _render(items, hour=1)["items"]
+    assert placed[0]["start"] == 0
+    assert abs(placed[0]["end"] - 60) < 0.05
+
+
+def test_block_and_index_written_to_disk(tmp_path, frame):
+    items = [{"type": "song", "id": 1, "start": 0, "end": 10, "path": _clip(tmp_path, frame, 10, "a.mp3")}]
+    meta = _render(items, hour=5)
+    mp3_path, _ = block_paths(D, 5, VARIANT)
+    assert mp3_path.stat().st_size == meta["bytes"]
+    assert load_meta(D, 5, VARIANT)["fingerprint"] == meta["fingerprint"]
+
+
+def test_hour_with_missing_variant_waits_unless_listener_needs_it(tmp_path, frame):
+    future = date(2100, 1, 1)
+    items = [
+        {"type": "song", "id": 1, "start": 0, "end": 10, "path": _clip(tmp_path, frame, 10, "a.mp3")},
+        {"type": "song", "id": 2, "start": 10, "end": 20, "path": "", "pending": True},
+    ]
+    _, meta, rendered = ensure_hour(future, 0, "64k", items)
+    assert (meta, rendered) == (None, False)
+    assert not block_paths(future, 0, "64k")[0].exists()
+
+    _, meta, rendered = ensure_hour(future, 0, "64k", items, partial=True)
+    assert rendered
+    assert [p["id"] for p in meta["items"]] == [1, 2]  # без варианта — тишина, не файл станции
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Job
+from services import job_queue
+from services.job_queue import enqueue_job, job_handler
+
+
+@job_handler("test_noop")
+async def _noop(ctx, params):
+    return {}
+
+
+def _job(db, job_id: int) -> Job:
+    db.expire_all()
+    return db.query(Job).get(job_id)
+
+
+def test_claim_takes_oldest_queued_under_own_lease(db):
+    first = enqueue_job(db, "test_noop")
+    second = enqueue_job(db, "test_noop")
+
+    assert job_queue._claim_next() == first.id
+    job = _job(db, first.id)
+    assert job.status == "running"
+    assert job.owner == job_queue._owner()
+    assert job.heartbeat_at is not None
+    assert job.attempts == 1
+
+    assert job_queue._claim_next() == second.id
+    assert job_queue._claim_next() is None
+
+
+def test_claim_skips_running_and_cancelled(db):
+    job = enqueue_job(db, "test_noop")
+    job_queue.cancel_job(db, job.id)
+    assert _job(db, job.id).status == "cancelled"
+    assert job_queue._claim_next() is None
+
+
+def test_recover_expired_requeues_only_stale_leases(db):
+    stale = enqueue_job(db, "test_noop")
+    fresh = enqueue_job(db, "test_noop")
+    job_queue._claim_next()
+    job_queue._claim_next()
+    _job(db, stale.id).heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+    db.commit()
+
+    assert job_queue._recover_expired() == 1
+    assert _job(db, stale.id).status == "queued"
+    assert _job(db, stale.id).owner == ""
+    assert _job(db, fresh.id).status == "running"
+
+
+def test_renew_leases_touches_only_own_jobs(db):
+    own = enqueue_job(db, "test_noop")
+    foreign = enqueue_job(db, "test_noop")
+    job_queue._claim_next()
+    job_queue._claim_next()
+    old = datetime.utcnow() - timedelta(minutes=5)
+    for job_id, owner in ((own.id, job_queue._owner()), (foreign.id, "other-host:1")):
+        job = _job(db, job_id)
+        job.owner, job.heartbeat_at = owner, old
+    db.commit()
+
+    job_queue._renew_leases([own.id, foreign.id])
+    assert _job(db, own.id).heartbeat_at > old
+    assert _job(db, foreign.id).heartbeat_at == old
+
+
+def test_requeue_returns_own_job_unless_cancel_requested(db):
+    kept = enqueue_job(db, "test_noop")
+    cancelled = enqueue_job(db, "test_noop")
+    job_queue._claim_next()
+    job_queue._claim_next()
+    _job(db, cancelled.id).cancel_requested = 1
+    db.commit()
+
+    job_queue._requeue(kept.id)
+    job_queue._requeue(cancelled.id)
+    assert _job(db, kept.id).status == "queued"
+    assert _job(db, cancelled.id).status == "running"
+
+
+def test_finish_ignores_job_taken_over_by_another_process(db):
+    job = enqueue_job(db, "test_noop")
+    job_queue._claim_next()
+    _job(db, job.id).owner = "other-host:1"
+    db.commit()
+
+    job_queue._finish(job.id, "done", result={"ok": True})
+    assert _job(db, job.id).status == "running"
+
+
+def test_progress_from_thread_writes_and_sees_cancel(db):
+    job = enqueue_job(db, "test_noop")
+    job_queue._claim_next()
+    ctx = job_queue.JobContext(job.id)
+
+    ctx.progress(40, "половина")
+    row = _job(db, job.id)
+    assert (row.progress, row.message) == (40, "половина")
+
+    row.cancel_requested = 1
+    db.commit()
+    with pytest.raises(job_queue.JobCancelled):
+        ctx.progress(50)
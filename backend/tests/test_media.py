@@ -0,0 +1,84 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services.media import _parse_range, media_response
+
+DATA = bytes(range(256)) * 4  # 1024 байта
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "clip.mp3"
+    path.write_bytes(DATA)
+    app = FastAPI()
+
+    @app.get("/clip")
+    def clip(request: Request):
+        return media_response(request, path)
+
+    return TestClient(app)
+
+
+def test_full_response_has_validators(client):
+    r = client.get("/clip")
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.headers["etag"]
+    assert r.headers["cache-control"] == "no-cache"
+
+
+def test_versioned_url_is_immutable(client):
+    etag = client.get("/clip").headers["etag"]
+    r = client.get("/clip", params={"v": etag.strip('"')})
+    assert "immutable" in r.headers["cache-control"]
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),
+])
+def test_range_returns_partial_content(client, header, start, end):
+    r = client.get("/clip", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert r.headers["content-length"] == str(end - start + 1)
+    assert r.content == DATA[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=10-5", "bytes=-0"])
+def test_unsatisfiable_range_is_416(client, header):
+    r = client.get("/clip", headers={"Range": header})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-6", "items=0-1", "bytes=a-b"])
+def test_unsupported_range_falls_back_to_full_body(client, header):
+    r = client.get("/clip", headers={"Range": header})
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_if_none_match_gives_304(client):
+    etag = client.get("/clip").headers["etag"]
+    r = client.get("/clip", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+
+def test_stale_if_range_ignores_range(client):
+    r = client.get("/clip", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_parse_range_edge_cases():
+    assert _parse_range("bytes=0-0", 1) == (0, 0)
+    assert _parse_range("bytes=-5000", 100) == (0, 99)
+    with pytest.raises(ValueError):
+        _parse_range("bytes=100-", 100)
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from models import MediaBlob, Song
+from services.media_store import assign_media, digest_from_path, release_row_media, store_bytes
+
+
+def _blob(db, path: str) -> MediaBlob | None:
+    db.expire_all()
+    return db.query(MediaBlob).get(digest_from_path(path))
+
+
+def _song(db, **kw) -> Song:
+    song = Song(title="t", artist="a", file_path="", **kw)
+    db.add(song)
+    db.flush()
+    return song
+
+
+def test_same_bytes_stored_once(db):
+    first = store_bytes(db, b"audio-1")
+    second = store_bytes(db, b"audio-1")
+    db.commit()
+    assert first == second
+    assert digest_from_path(first) is not None
+    assert db.query(MediaBlob).count() == 1
+
+
+def test_ref_count_follows_assignments(db):
+    path = store_bytes(db, b"shared")
+    a, b = _song(db), _song(db)
+    assign_media(db, a, "file_path", path)
+    assign_media(db, b, "file_path", path)
+    db.commit()
+    assert _blob(db, path).ref_count == 2
+
+    release_row_media(db, a)
+    db.delete(a)
+    db.commit()
+    assert _blob(db, path).ref_count == 1
+    assert Path(path).exists()
+
+
+def test_last_reference_deletes_file_after_commit(db):
+    old = store_bytes(db, b"old")
+    song = _song(db)
+    assign_media(db, song, "file_path", old)
+    db.commit()
+
+    assign_media(db, song, "file_path", store_bytes(db, b"new"))
+    assert Path(old).exists()  # до commit файл на месте
+    db.commit()
+    assert not Path(old).exists()
+    assert _blob(db, old) is None
+
+
+def test_rollback_keeps_released_file(db):
+    path = store_bytes(db, b"keep")
+    song = _song(db)
+    assign_media(db, song, "file_path", path)
+    db.commit()
+
+    release_row_media(db, song)
+    db.delete(song)
+    db.rollback()
+    assert Path(path).exists()
+    assert _blob(db, path).ref_count == 1
+
+    db.commit()  # следующий commit не удаляет файл, снятый откаченной транзакцией
+    assert Path(path).exists()
+
+
+def test_reassigning_released_file_in_same_transaction_keeps_it(db):
+    path = store_bytes(db, b"again")
+    song = _song(db)
+    assign_media(db, song, "dj_audio_path", path)
+    db.commit()
+
+    assign_media(db, song, "dj_audio_path", "")
+    assign_media(db, song, "dj_audio_path", store_bytes(db, b"again"))
+    db.commit()
+    assert Path(path).exists()
+    assert _blob(db, path).ref_count == 1
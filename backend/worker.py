@@ -0,0 +1,25 @@
+"""
+Отдельный процесс фоновых задач: python worker.py
+Используйте вместе с JOB_WORKERS=0 у API, чтобы тяжёлая работа не делила процесс с uvicorn.
+"""
+import asyncio
+import logging
+
+from config import settings
+from database import init_db
+from services.job_queue import start_job_workers, stop_job_workers
+
+
+async def main():
+    init_db()
+    settings.job_workers = max(1, settings.job_workers)
+    start_job_workers()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_job_workers()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -268,6 +268,27 @@ export async function getBroadcastNowPlaying(date) {
   return r.json();
 }
 
+/** Push-события эфира (SSE) вместо опроса.
+ * onNowPlaying({ date, entityType, entityId, title, start, end }) — на границах элементов (start/end — секунды дня);
+ * onGrid({ date, upsert, removed }) — правки сетки даты date;
+ * onReconnect() — соединение восстановлено, события могли потеряться (перечитать сетку). */
+export function subscribeBroadcastEvents(date, { onNowPlaying, onGrid, onReconnect } = {}) {
+  const eventSource = new EventSource(`${API}/broadcast/events${date ? `?d=${date}` : ""}`);
+  const parse = (handler) => (e) => {
+    try {
+      handler(JSON.parse(e.data));
+    } catch (_) {}
+  };
+  if (onNowPlaying) eventSource.addEventListener("now-playing", parse(onNowPlaying));
+  if (onGrid) eventSource.addEventListener("grid", parse(onGrid));
+  let opened = false;
+  eventSource.onopen = () => {
+    if (opened && onReconnect) onReconnect();
+    opened = true;
+  };
+  return () => eventSource.close();
+}
+
 export async function generateBroadcast(date) {
   const r = await fetch(`${API}/broadcast/generate?d=${date}`, { method: "POST" });
   return r.json();
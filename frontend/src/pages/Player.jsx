@@ -1,6 +1,6 @@
 import { useState, useRef, useEffect } from "react";
 import { Play, Square } from "lucide-react";
-import { getBroadcastPlaylistUrls, getBroadcastNowPlaying } from "../api";
+import { getBroadcastPlaylistUrls, subscribeBroadcastEvents } from "../api";
 import "./Player.css";
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
@@ -11,6 +11,7 @@ export default function Player() {
   const [playing, setPlaying] = useState(false);
   const [items, setItems] = useState([]);
   const [currentIndex, setCurrentIndex] = useState(0);
+  const currentIndexRef = useRef(0);
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(false);
   const [barHeights, setBarHeights] = useState(() => Array(BAR_COUNT).fill(15));
@@ -22,6 +23,10 @@ export default function Player() {
   const dataArrayRef = useRef(null);
   const rafRef = useRef(null);
 
+  useEffect(() => {
+    currentIndexRef.current = currentIndex;
+  }, [currentIndex]);
+
   const togglePlay = async () => {
     setError(null);
     if (playing) {
@@ -63,31 +68,26 @@ export default function Player() {
 
   useEffect(() => {
     if (!playing || items.length === 0) return;
-    const today = new Date().toISOString().slice(0, 10);
-    const poll = async () => {
-      try {
-        const np = await getBroadcastNowPlaying(today);
-        if (np?.entityType != null && np?.entityId != null) {
-          const idx = items.findIndex(
-            (it) => it.type === np.entityType && it.entity_id === np.entityId
-          );
-          if (idx >= 0 && idx !== currentIndex) {
-            setCurrentIndex(idx);
-            const item = items[idx];
-            const fullUrl = item?.url?.startsWith("http") ? item.url : `${API_BASE}${item?.url || ""}`;
-            if (audioRef.current) {
-              audioRef.current.src = fullUrl;
-              audioRef.current.play().catch(() => {});
-            }
+    return subscribeBroadcastEvents(null, {
+      onNowPlaying: (np) => {
+        if (np?.entityType == null || np?.entityId == null || np?.start == null) return;
+        // одна и та же песня может звучать несколько раз за день — сопоставляем по времени начала
+        const idx = items.findIndex(
+          (it) => it.start === np.start && it.type === np.entityType && it.entity_id === np.entityId
+        );
+        if (idx >= 0 && idx !== currentIndexRef.current) {
+          currentIndexRef.current = idx;
+          setCurrentIndex(idx);
+          const item = items[idx];
+          const fullUrl = item?.url?.startsWith("http") ? item.url : `${API_BASE}${item?.url || ""}`;
+          if (audioRef.current) {
+            audioRef.current.src = fullUrl;
+            audioRef.current.play().catch(() => {});
           }
         }
-      } catch {
-        /* ignore */
-      }
-    };
-    const id = setInterval(poll, 60000);
-    return () => clearInterval(id);
-  }, [playing, items, currentIndex]);
+      },
+    });
+  }, [playing, items]);
 
   useEffect(() => {
     const audio = audioRef.current;
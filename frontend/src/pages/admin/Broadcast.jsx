@@ -3,7 +3,7 @@ import { useOutletContext } from "react-router-dom";
 import { Sparkles, Trash2, Pencil, Play, Square, X, RotateCcw, Save, Volume2, ChevronDown, ChevronUp, Loader2 } from "lucide-react";
 import {
   getBroadcast,
-  getBroadcastNowPlaying,
+  subscribeBroadcastEvents,
   generateBroadcast,
   deleteBroadcast,
   deleteBroadcastItem,
@@ -43,6 +43,15 @@ const TYPE_LABELS = {
   empty: "Пусто",
 };
 
+/** Применить grid-дифф с сервера: заменить/добавить строки upsert, убрать removed. */
+function applyGridDiff(prev, diff) {
+  if (!prev?.items || diff.date !== prev.date) return prev;
+  const removed = new Set(diff.removed);
+  const byId = new Map(prev.items.filter((i) => !removed.has(i.id)).map((i) => [i.id, i]));
+  diff.upsert.forEach((i) => byId.set(i.id, i));
+  return { ...prev, items: [...byId.values()].sort((a, b) => a.sort_order - b.sort_order) };
+}
+
 export default function Broadcast() {
   const { selectedDate } = useOutletContext();
   const [data, setData] = useState(null);
@@ -83,17 +92,13 @@ export default function Broadcast() {
   }, [expandedId]);
 
   useEffect(() => {
-    const today = new Date().toISOString().slice(0, 10);
-    if (selectedDate !== today) {
-      setNowPlaying({ entityType: null, entityId: null });
-      return;
-    }
-    const poll = () => {
-      getBroadcastNowPlaying(selectedDate).then(setNowPlaying).catch(() => {});
-    };
-    poll();
-    const id = setInterval(poll, 5000);
-    return () => clearInterval(id);
+    setNowPlaying({ entityType: null, entityId: null });
+    return subscribeBroadcastEvents(selectedDate, {
+      onNowPlaying: (np) =>
+        setNowPlaying(np.date === selectedDate ? np : { entityType: null, entityId: null }),
+      onGrid: (diff) => setData((prev) => applyGridDiff(prev, diff)),
+      onReconnect: () => getBroadcast(selectedDate).then(setData).catch(() => {}),
+    });
   }, [selectedDate]);
 
   useEffect(() => {